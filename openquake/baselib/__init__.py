@@ -109,7 +109,9 @@ def boolean(flag):
 
 config.read(soft_mem_limit=int, hard_mem_limit=int, port=int,
             multi_user=boolean, multi_node=boolean,
-            serialize_jobs=boolean, strict=boolean, code=exec)
+            serialize_jobs=boolean, persistent_workers=boolean,
+            strict=boolean, code=exec, shuffle=boolean, chunk_size=int,
+            compress_threshold=int, cache_size=int)
 
 if config.directory.custom_tmp:
     os.environ['TMPDIR'] = config.directory.custom_tmp
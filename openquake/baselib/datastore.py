@@ -46,6 +46,49 @@ def get_datadir():
     return datadir
 
 
+def get_cachedir():
+    """
+    :returns: the directory where the parsed input files are cached,
+              i.e. the cache_dir in the configuration file or
+              $OQ_DATADIR/cache, or None if the cache is disabled
+              by setting cache_size = 0
+    """
+    if not config.directory.get('cache_size', 1024):
+        return
+    cachedir = (config.directory.get('cache_dir') or
+                os.path.join(get_datadir(), 'cache'))
+    os.makedirs(cachedir, exist_ok=True)
+    return cachedir
+
+
+def clean_cachedir(cachedir):
+    """
+    Remove the least recently used files in the cache directory, until
+    their total size is below the cache_size (in MB) in the configuration
+    file. The files being written by other jobs (.tmp) are not touched.
+    """
+    maxsize = config.directory.get('cache_size', 1024) * 1024 ** 2
+    files = []  # (mtime, size, path)
+    for fname in os.listdir(cachedir):
+        path = os.path.join(cachedir, fname)
+        if fname.endswith('.tmp'):
+            continue
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:  # removed by another job
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+    size = sum(f[1] for f in files)
+    for mtime, fsize, path in sorted(files):
+        if size <= maxsize:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # removed by another job
+            pass
+        size -= fsize
+
+
 def get_calc_ids(datadir=None):
     """
     Extract the available calculation IDs from the datadir, in order.
@@ -902,16 +902,19 @@ def multi_index(shape, axis=None):
         yield tuple(lst)
 
 
-def fast_agg(indices, values=None, axis=0, factor=None):
+def fast_agg(indices, values=None, axis=0, factor=None, M=None):
     """
     :param indices: N indices in the range 0 ... M - 1 with M < N
     :param values: N values (can be arrays)
+    :param M: the number of groups (by default max(indices) + 1)
     :returns: M aggregated values (can be arrays)
 
     >>> values = numpy.array([[.1, .11], [.2, .22], [.3, .33], [.4, .44]])
     >>> fast_agg([0, 1, 1, 0], values)
     array([[0.5 , 0.55],
            [0.5 , 0.55]])
+    >>> fast_agg([0, 1, 1, 0], values[:, 0], M=3)
+    array([0.5, 0.5, 0. ])
     """
     if values is None:
         values = numpy.ones_like(indices)
@@ -921,14 +924,15 @@ def fast_agg(indices, values=None, axis=0, factor=None):
                          (N, len(indices)))
     shp = values.shape[1:]
     if not shp:
-        return numpy.bincount(indices, values)
-    M = max(indices) + 1
+        return numpy.bincount(indices, values, minlength=M or 0)
+    if M is None:
+        M = max(indices) + 1
     lst = list(shp)
     lst.insert(axis, M)
     res = numpy.zeros(lst, values.dtype)
     for mi in multi_index(shp, axis):
         vals = values[mi] if factor is None else values[mi] * factor
-        res[mi] = numpy.bincount(indices, vals)
+        res[mi] = numpy.bincount(indices, vals, minlength=M)
     return res
 
 
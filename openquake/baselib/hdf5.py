@@ -30,8 +30,12 @@ import collections
 import toml
 import numpy
 import h5py
-from openquake.baselib import InvalidFile
+from openquake.baselib import InvalidFile, config
 from openquake.baselib.python3compat import encode, decode
+try:  # registers the Blosc filter, needed also to read the datasets
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
 
 vbytes = h5py.special_dtype(vlen=bytes)
 vstr = h5py.special_dtype(vlen=str)
@@ -52,6 +56,53 @@ def maybe_encode(value):
     return value
 
 
+COMPRESSIONS = ('none', 'lzf', 'gzip', 'blosc')
+
+
+def get_storage(dtype, shape, compression=None):
+    """
+    Returns the storage options for a dataset, according to the [storage]
+    section of openquake.cfg. When a filter is enabled the dataset is chunked
+    along the first axis, i.e. the axis used by the calculators to write and
+    read the data (sites, events, ruptures, ...), with chunks of around
+    `chunk_size` bytes; otherwise an empty dictionary is returned and the
+    HDF5 defaults are used.
+
+    :param dtype: dtype of the dataset
+    :param shape: shape of the dataset (the first dimension can be None)
+    :param compression: if given, overrides the compression in the config
+    :returns: a dictionary of keyword arguments for h5py.create_dataset
+
+    >>> get_storage(numpy.float32, (None, 4), 'lzf')['chunks']
+    (65536, 4)
+    """
+    storage = config.get('storage', {})
+    if compression is None:
+        compression = storage.get('compression', 'none')
+    if compression not in COMPRESSIONS:
+        raise ValueError('Unknown compression %r, expected one of %s' %
+                         (compression, COMPRESSIONS))
+    dtype = numpy.dtype(dtype)
+    if (compression == 'none' or dtype.hasobject or not shape or
+            0 in shape):  # vlen datasets cannot be compressed efficiently
+        return {}
+    shuffle = storage.get('shuffle', True)
+    row_nbytes = dtype.itemsize * int(numpy.prod(shape[1:]))
+    rows = max(1, storage.get('chunk_size', 1048576) // row_nbytes)
+    if shape[0] is not None:
+        rows = min(rows, shape[0])
+    dic = dict(chunks=(rows,) + tuple(shape[1:]))
+    if compression == 'blosc':
+        if hdf5plugin is None:
+            raise ImportError('The blosc compression requires hdf5plugin')
+        dic.update(hdf5plugin.Blosc(
+            cname='lz4', shuffle=hdf5plugin.Blosc.SHUFFLE if shuffle
+            else hdf5plugin.Blosc.NOSHUFFLE))
+    else:
+        dic.update(compression=compression, shuffle=shuffle)
+    return dic
+
+
 def create(hdf5, name, dtype, shape=(None,), compression=None,
            fillvalue=0, attrs=None):
     """
@@ -59,17 +110,18 @@ def create(hdf5, name, dtype, shape=(None,), compression=None,
     :param name: an hdf5 key string
     :param dtype: dtype of the dataset (usually composite)
     :param shape: shape of the dataset (can be extendable)
-    :param compression: None or 'gzip' are recommended
+    :param compression: None (use the config) or one of COMPRESSIONS
     :param attrs: dictionary of attributes of the dataset
     :returns: a HDF5 dataset
     """
+    storage = get_storage(dtype, shape, compression)
     if shape[0] is None:  # extendable dataset
+        storage.setdefault('chunks', True)
         dset = hdf5.create_dataset(
-            name, (0,) + shape[1:], dtype, chunks=True, maxshape=shape,
-            compression=compression)
+            name, (0,) + shape[1:], dtype, maxshape=shape, **storage)
     else:  # fixed-shape dataset
         dset = hdf5.create_dataset(name, shape, dtype, fillvalue=fillvalue,
-                                   compression=compression)
+                                   **storage)
     if attrs:
         for k, v in attrs.items():
             dset.attrs[k] = maybe_encode(v)
@@ -346,6 +398,12 @@ class File(h5py.File):
 
     def _set(self, path, obj):
         try:
+            if isinstance(obj, numpy.ndarray) and obj.nbytes >= config.get(
+                    'storage', {}).get('chunk_size', 1048576):
+                storage = get_storage(obj.dtype, obj.shape)
+                if storage:  # big array to compress
+                    self.create_dataset(path, data=obj, **storage)
+                    return
             super().__setitem__(path, obj)
         except Exception as exc:
             raise exc.__class__('Could not set %s=%r' % (path, obj))
@@ -807,7 +807,8 @@ def context(fname, node):
 class ValidatingXmlParser(object):
     """
     Validating XML Parser based on Expat. It has two methods `.parse_file`
-    and `.parse_bytes` returning a validated :class:`Node` object.
+    and `.parse_bytes` returning a validated :class:`Node` object and
+    a method `.parse_iter` to parse large files in streaming mode.
 
     :param validators: a dictionary of validation functions
     :param stop: the tag where to stop the parsing (if any)
@@ -815,18 +816,23 @@ class ValidatingXmlParser(object):
     class Exit(Exception):
         """Raised when the parsing is stopped before the end on purpose"""
 
+    BLOCKSIZE = 1024 ** 2  # bytes read at once in streaming mode
+
     def __init__(self, validators, stop=None):
         self.validators = validators
         self.stop = stop
+        self._attr_validators = {}  # (tag, attrname) -> validator key
 
     @contextmanager
-    def _context(self):
+    def _context(self, parents=()):
         self.p = ParserCreate(namespace_separator='}')
         self.p.StartElementHandler = self._start_element
         self.p.EndElementHandler = self._end_element
         self.p.CharacterDataHandler = self._char_data
         self._ancestors = []
         self._root = None
+        self._parents = parents
+        self._streamed = []
         try:
             yield
         except ExpatError as err:
@@ -871,6 +877,31 @@ class ValidatingXmlParser(object):
                     self.p.ParseFile(f)
         return self._root
 
+    def parse_iter(self, fname, parents):
+        """
+        Parse a file in streaming mode. The children of the nodes with tag
+        in `parents` are validated and yielded as soon as they are closed,
+        without attaching them to the parent, so that they can be released.
+        At the end the attribute `.root` contains the rest of the document.
+
+        :param fname: the name of the file to parse
+        :param parents: a tag or a list of tags (without namespace)
+        :yields: pairs (parent node, child node)
+        """
+        if isinstance(parents, str):
+            parents = [parents]
+        with self._context(set(parents)):
+            self.filename = fname
+            with open(fname, 'rb') as f:
+                for block in iter(lambda: f.read(self.BLOCKSIZE), b''):
+                    self.p.Parse(block, False)
+                    yield from self._streamed
+                    del self._streamed[:]
+                self.p.Parse(b'', True)
+                yield from self._streamed
+                del self._streamed[:]
+        self.root = self._root
+
     def _start_element(self, longname, attrs):
         try:
             xmlns, name = longname.split('}')
@@ -890,8 +921,13 @@ class ValidatingXmlParser(object):
         with context(self.filename, node):
             self._root = self._literalnode(node)
         del self._ancestors[-1]
-        if self._ancestors:
-            self._ancestors[-1].append(self._root)
+        if not self._ancestors:
+            return
+        parent = self._ancestors[-1]
+        if self._parents and striptag(parent.tag) in self._parents:
+            self._streamed.append((parent, node))
+        else:
+            parent.append(self._root)
 
     def _char_data(self, data):
         if data:
@@ -931,9 +967,13 @@ class ValidatingXmlParser(object):
 
         # cast the attributes
         for n, v in node.attrib.items():
-            tn = '%s.%s' % (tag, n)
-            if tn in self.validators:
+            try:
+                tn = self._attr_validators[tag, n]
+            except KeyError:  # determine the validator only once per tag
+                tn = '%s.%s' % (tag, n)
+                if tn not in self.validators:
+                    tn = n if n in self.validators else None
+                self._attr_validators[tag, n] = tn
+            if tn:
                 self._set_attrib(node, n, tn, v)
-            elif n in self.validators:
-                self._set_attrib(node, n, n, v)
         return node
@@ -66,7 +66,9 @@ environment variable `OQ_DISTRIBUTE`. Here are the possibilities
 available at the moment:
 
 `OQ_DISTRIBUTE` not set or set to "processpool":
-  use multiprocessing
+  use multiprocessing; when running through the engine, the tasks are sent
+  instead to the long-lived local workers started by the DbServer, unless
+  `persistent_workers` is disabled in openquake.cfg
 `OQ_DISTRIBUTE` set to "no":
   disable the parallelization, useful for debugging
 `OQ_DISTRIBUTE` set to "celery":
@@ -142,11 +144,10 @@ import os
 import re
 import ast
 import sys
-import gzip
 import time
+import zlib
 import socket
 import signal
-import pickle
 import inspect
 import logging
 import operator
@@ -162,7 +163,7 @@ except ImportError:
     def setproctitle(title):
         "Do nothing"
 
-from openquake.baselib import config, hdf5, workerpool
+from openquake.baselib import config, hdf5, workerpool, zeromq
 from openquake.baselib.zeromq import zmq, Socket
 from openquake.baselib.performance import (
     Monitor, memory_rss, init_performance)
@@ -224,13 +225,15 @@ def oq_distribute(task=None):
     return dist
 
 
-if False:  #config.general.compress
-    # must be a global config since every change requires a DbServer restart
-    compress = gzip.compress
-    decompress = gzip.decompress
-else:
-    compress = lambda x: x
-    decompress = lambda x: x
+def compress_threshold(distribute):
+    """
+    :returns: the minimum size in bytes of the pickled task arguments and
+              results to compress, or 0 if the compression is disabled;
+              the compression is never used for local tasks
+    """
+    if distribute in ('no', 'processpool', 'threadpool'):
+        return 0
+    return config.general.get('compress_threshold', 0)
 
 
 class Pickled(object):
@@ -239,17 +242,33 @@ class Pickled(object):
     The reason is that celery does not use the HIGHEST_PROTOCOL,
     so relying on celery is slower. Moreover Pickled instances
     have a nice string representation and length giving the size
-    of the pickled bytestring.
+    of the pickled bytestring. The big numpy arrays are kept out-of-band
+    in the .buffers list, so that they can be sent by zmq without copying
+    them (see :class:`openquake.baselib.zeromq.Pickler`). The data are
+    compressed if their size exceeds the given threshold; since the flag
+    travels with the object, the receiver does not need to know the
+    sender configuration.
 
     :param obj: the object to pickle
+    :param threshold: minimum size to compress (0 means no compression)
     """
-    def __init__(self, obj):
+    compressed = False  # for objects sent by an older DbServer
+    buffers = ()
+
+    def __init__(self, obj, threshold=0):
         self.clsname = obj.__class__.__name__
         self.calc_id = str(getattr(obj, 'calc_id', ''))  # for monitors
         try:
-            self.pik = compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+            self.pik, buffers = zeromq.dumps(obj)
         except TypeError as exc:  # can't pickle, show the obj in the message
             raise TypeError('%s: %s' % (exc, obj))
+        self.rawsize = len(self.pik) + sum(buf.nbytes for buf in buffers)
+        self.compressed = 0 < threshold <= self.rawsize
+        if self.compressed:
+            self.pik = zlib.compress(self.pik, 1)
+            buffers = [numpy.frombuffer(zlib.compress(buf, 1), numpy.uint8)
+                       for buf in buffers]
+        self.buffers = buffers
 
     def __repr__(self):
         """String representation of the pickled object"""
@@ -257,12 +276,15 @@ class Pickled(object):
             self.clsname, self.calc_id, humansize(len(self)))
 
     def __len__(self):
-        """Length of the pickled bytestring"""
-        return len(self.pik)
+        """Length of the pickled data (possibly compressed)"""
+        return len(self.pik) + sum(buf.nbytes for buf in self.buffers)
 
     def unpickle(self):
         """Unpickle the underlying object"""
-        return pickle.loads(decompress(self.pik))
+        if self.compressed:
+            return zeromq.loads(zlib.decompress(self.pik),
+                                [zlib.decompress(buf) for buf in self.buffers])
+        return zeromq.loads(self.pik, self.buffers)
 
 
 def get_pickled_sizes(obj):
@@ -287,7 +309,7 @@ def get_pickled_sizes(obj):
         sizes, key=lambda pair: pair[1], reverse=True)
 
 
-def pickle_sequence(objects):
+def pickle_sequence(objects, threshold=0):
     """
     Convert an iterable of objects into a list of pickled objects.
     If the iterable contains copies, the pickling will be done only once.
@@ -295,6 +317,7 @@ def pickle_sequence(objects):
     pickled again.
 
     :param objects: a sequence of objects to pickle
+    :param threshold: minimum size to compress (0 means no compression)
     """
     cache = {}
     out = []
@@ -304,7 +327,7 @@ def pickle_sequence(objects):
             if isinstance(obj, Pickled):  # already pickled
                 cache[obj_id] = obj
             else:  # pickle the object
-                cache[obj_id] = Pickled(obj)
+                cache[obj_id] = Pickled(obj, threshold)
         out.append(cache[obj_id])
     return out
 
@@ -319,16 +342,17 @@ class Result(object):
     func = None
 
     def __init__(self, val, mon, tb_str='', msg='', count=0):
+        threshold = mon.compress_threshold
         if isinstance(val, dict):
-            self.pik = Pickled(val)
+            self.pik = Pickled(val, threshold)
             self.nbytes = {k: len(Pickled(v)) for k, v in val.items()}
         elif isinstance(val, tuple) and callable(val[0]):
             self.func = val[0]
-            self.pik = pickle_sequence(val[1:])
-            self.nbytes = {'tot': sum(len(p) for p in self.pik)}
+            self.pik = pickle_sequence(val[1:], threshold)
+            self.nbytes = {'tot': sum(p.rawsize for p in self.pik)}
         else:
-            self.pik = Pickled(val)
-            self.nbytes = {'tot': len(self.pik)}
+            self.pik = Pickled(val, threshold)
+            self.nbytes = {'tot': self.pik.rawsize}
         self.mon = mon
         self.tb_str = tb_str
         self.msg = msg
@@ -390,6 +414,58 @@ def check_mem_usage(soft_percent=None, hard_percent=None):
 dummy_mon = Monitor()
 dummy_mon.backurl = None
 
+MAX_CACHED_NAMESPACES = 4
+_cache = collections.OrderedDict()  # namespace -> {key: value}
+
+
+def cached(namespace, key, func, *args):
+    """
+    Return the value associated to the key in the given namespace (usually
+    a calculation), computing it as `func(*args)` the first time. The values
+    are kept in the current process, so that the tasks running in a
+    long-lived worker do not recompute them; only the last
+    MAX_CACHED_NAMESPACES namespaces are kept.
+
+    NB: the zmq workers and the persistent workers used by the engine with
+    OQ_DISTRIBUTE=processpool survive the engine process, so the engine
+    clears the namespace of a calculation on all of them when it ends
+    (see :meth:`openquake.baselib.workerpool.WorkerMaster.clear_cache`);
+    a multiprocessing pool dies with the process that spawned it.
+
+    >>> cached('calc_1', 'x', len, 'abc')
+    3
+    >>> cached('calc_1', 'x', len, 'different')  # taken from the cache
+    3
+    >>> clear_cache('calc_1')
+    >>> cached('calc_1', 'x', len, 'different')
+    9
+    >>> clear_cache('calc_1')
+    """
+    try:
+        dic = _cache[namespace]
+    except KeyError:
+        dic = _cache[namespace] = {}
+        while len(_cache) > MAX_CACHED_NAMESPACES:
+            _cache.popitem(last=False)  # discard the oldest namespace
+    else:
+        _cache.move_to_end(namespace)
+    try:
+        return dic[key]
+    except KeyError:
+        dic[key] = value = func(*args)
+        return value
+
+
+def clear_cache(namespace=None):
+    """
+    Remove the given namespace from the cache of the current process,
+    or all the namespaces if None is passed.
+    """
+    if namespace is None:
+        _cache.clear()
+    else:
+        _cache.pop(namespace, None)
+
 
 def safely_call(func, args, task_no=0, mon=dummy_mon):
     """
@@ -493,9 +569,11 @@ class IterResult(object):
             elif isinstance(result, Result):
                 if result.func:  # result contains subtask arguments
                     self.received.append(sum(len(p) for p in result.pik))
+                    self.uncompressed += sum(p.rawsize for p in result.pik)
                 else:
                     val = result.get()
                     self.received.append(len(result.pik))
+                    self.uncompressed += result.pik.rawsize
                     if hasattr(result, 'nbytes'):
                         self.nbytes += result.nbytes
             else:  # this should never happen
@@ -524,6 +602,7 @@ class IterResult(object):
             return ()
         t0 = time.time()
         self.received = []
+        self.uncompressed = 0
         self.nbytes = AccumDict()
         try:
             yield from self._iter()
@@ -534,6 +613,9 @@ class IterResult(object):
                 'Received %s in %d seconds, biggest '
                 'output=%s', humansize(tot), time.time() - t0,
                 humansize(max_per_output))
+            if self.uncompressed > tot:
+                logging.info('Received %s before compression',
+                             humansize(self.uncompressed))
             if self.nbytes:
                 nb = {k: humansize(v) for k, v in self.nbytes.items()}
                 if len(nb) < 10:
@@ -589,9 +671,13 @@ def getargnames(task_func):
         return inspect.getfullargspec(task_func.__call__).args[1:]
 
 
+HEARTBEAT = 60  # seconds without messages before looking for lost tasks
+
+
 class Starmap(object):
     pids = ()
     running_tasks = []  # currently running tasks
+    max_retries = 2  # how many times a lost task can be resubmitted
     # use only the "visible" cores, not the total system cores
     # if the underlying OS supports it (macOS does not)
     try:
@@ -599,11 +685,15 @@ class Starmap(object):
     except AttributeError:
         num_cores = psutil.cpu_count()
     oversubmit = False
+    persistent = False  # set by the engine when the local workers are up
 
     @classmethod
     def init(cls, poolsize=None, distribute=None):
         cls.distribute = distribute or oq_distribute()
-        if cls.distribute == 'processpool' and not hasattr(cls, 'pool'):
+        if cls.distribute == 'processpool' and cls.persistent:
+            # send the tasks to the long-lived local workers via zmq
+            cls.distribute = 'zmq'
+        elif cls.distribute == 'processpool' and not hasattr(cls, 'pool'):
             # unregister custom handlers before starting the processpool
             term_handler = signal.signal(signal.SIGTERM, signal.SIG_DFL)
             int_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
@@ -686,6 +776,7 @@ class Starmap(object):
             init_performance(h5)
         self.monitor = Monitor(task_func.__name__)
         self.monitor.calc_id = self.calc_id
+        self.monitor.compress_threshold = compress_threshold(self.distribute)
         self.name = self.monitor.operation or task_func.__name__
         self.task_args = task_args
         self.progress = progress
@@ -705,6 +796,27 @@ class Starmap(object):
         self.monitor.backurl = None  # overridden later
         self.tasks = []  # populated by .submit
         self.task_no = 0
+        self.inflight = {}  # task_no -> (func, args, monitor)
+        self.received = collections.Counter()  # task_no -> num results
+        self.retries = collections.Counter()  # task_no -> num resubmissions
+        self.root_retries = collections.Counter()  # root -> resubmissions
+        self.ended = set()  # task numbers ended or discarded
+        self.suspected = set()  # task numbers possibly lost
+        self.handles = {}  # task_no -> celery AsyncResult
+        # with zmq and celery the lost tasks are detected and resubmitted:
+        # the results are held until their top-level task is completed, so
+        # that the partial results of a lost task can be discarded
+        self.hold = self.distribute in ('zmq', 'celery')
+        self.held = collections.defaultdict(list)  # root -> results
+        self.root_args = {}  # root -> (func, args, monitor)
+        # a checkpoint (see openquake.calculators.base.Checkpoint) can be
+        # set to save the results and to replay them when resuming
+        self.checkpoint = None
+        self.num_roots = 0  # number of top-level tasks
+        self.root = {}  # task_no -> top-level task
+        self.subtask_root = {}  # id(subtask args) -> top-level task
+        self.pending = collections.Counter()  # top-level task -> todo
+        self.replayed = []  # results read from the checkpoint
         if self.distribute == 'zmq':  # add a check
             err = workerpool.check_status()
             if err:
@@ -737,6 +849,21 @@ class Starmap(object):
         """
         monitor = monitor or self.monitor
         func = func or self.task_func
+        root = self.subtask_root.pop(id(args), None)
+        toplevel = root is None
+        if toplevel:
+            root = self.num_roots
+            self.num_roots += 1
+            if self.checkpoint:
+                # the task is identified also by its arguments, since the
+                # partition of the work can change between runs
+                root = (root, self.checkpoint.digest(args))
+                results = self.checkpoint.get(self.name, root)
+                if results is not None:  # completed in a previous run
+                    self.replayed.extend(results)
+                    return
+            self.pending[root] += 1
+        self.root[self.task_no] = root
         if not hasattr(self, 'socket'):  # first time
             self.__class__.running_tasks = self.tasks
             self.socket = Socket(self.receiver, zmq.PULL, 'bind').__enter__()
@@ -747,7 +874,8 @@ class Starmap(object):
             pickled = isinstance(args[0], Pickled)
             if not pickled:
                 assert not isinstance(args[-1], Monitor)  # sanity check
-                args = pickle_sequence(args)
+                args = pickle_sequence(
+                    args, self.monitor.compress_threshold)
             if func is None:
                 fname = self.task_func.__name__
                 argnames = self.argnames[:-1]
@@ -755,7 +883,13 @@ class Starmap(object):
                 fname = func.__name__
                 argnames = getargnames(func)[:-1]
             self.sent[fname] += {a: len(p) for a, p in zip(argnames, args)}
+            # keep the pickled arguments to resubmit the task if lost
+            self.inflight[self.task_no] = (func, args, monitor)
+            if toplevel and self.hold:
+                self.root_args[root] = (func, args, monitor)
         res = submit[dist](self, func, args, monitor)
+        if dist == 'celery':
+            self.handles[self.task_no] = res
         self.task_no += 1
         self.tasks.append(res)
 
@@ -784,48 +918,196 @@ class Starmap(object):
         return iter(self.submit_all())
 
     def _submit_many(self, howmany):
-        for _ in range(howmany):
-            if self.task_queue:
-                # remove in LIFO order
-                func, args = self.task_queue[0]
-                del self.task_queue[0]
-                self.submit(args, func=func)
-                self.todo += 1
+        # the tasks replayed from the checkpoint are not submitted
+        submitted = len(self.tasks)
+        while self.task_queue and len(self.tasks) < submitted + howmany:
+            # remove in FIFO order
+            func, args = self.task_queue[0]
+            del self.task_queue[0]
+            self.submit(args, func=func)
+        self.todo += len(self.tasks) - submitted
+
+    def _replay(self):
+        # yield the results read from the checkpoint
+        if self.replayed:
+            logging.info('Replaying %d results from the checkpoint',
+                         len(self.replayed))
+            yield from self.replayed
+            self.replayed.clear()
 
     def _loop(self):
-        if self.task_queue:
-            first_args = self.task_queue[:self.num_cores]
-            self.task_queue[:] = self.task_queue[self.num_cores:]
-            for func, args in first_args:
-                self.submit(args, func=func)
+        self.todo = len(self.tasks)  # tasks submitted directly
+        self._submit_many(self.num_cores)
+        yield from self._replay()
         if not hasattr(self, 'socket'):  # no submit was ever made
             return ()
 
-        isocket = iter(self.socket)
-        self.todo = len(self.tasks)
+        isocket = self._iter_socket()
         while self.todo:
+            yield from self._replay()
             res = next(isocket)
+            if res is None:  # nothing received in the last HEARTBEAT seconds
+                self._check_lost()
+                continue
+            task_no = res.mon.task_no
             if self.calc_id != res.mon.calc_id:
                 logging.warning('Discarding a result from job %s, since this '
                                 'is job %d', res.mon.calc_id, self.calc_id)
+            elif task_no in self.ended:
+                # sent by a task resubmitted while still queued or by
+                # a task discarded together with its lost top-level task
+                logging.warning('Discarding a result from the ended task '
+                                '#%d', task_no)
+            elif res.msg == 'TASK_LOST':
+                self._resubmit(task_no)
             elif res.msg == 'TASK_ENDED':
+                self.ended.add(task_no)
+                self.inflight.pop(task_no, None)
+                self.handles.pop(task_no, None)
+                yield from self._task_ended(task_no)
                 self.todo -= 1
                 self._submit_many(max(self.num_cores - self.todo, 2))
                 logging.debug('%d tasks todo, %d in queue',
                               self.todo, len(self.task_queue))
                 self.log_percent()
             elif res.func:  # add subtask
+                self.received[task_no] += 1
+                root = self.subtask_root[id(res.pik)] = self.root[task_no]
+                self.pending[root] += 1
                 self.task_queue.append((res.func, res.pik))
                 if self.todo < self.num_cores:
                     self._submit_many(self.num_cores - self.todo)
                 elif self.oversubmit:
                     self._submit_many(1)
             else:
+                if not res.msg:  # not a warning
+                    self.received[task_no] += 1
+                    if self.hold and not res.tb_str:
+                        self.held[self.root[task_no]].append(res)
+                        continue
+                    if self.checkpoint and not res.tb_str:
+                        self.checkpoint.save(
+                            self.name, self.root[task_no], res)
                 yield res
+        yield from self._replay()
         self.log_percent()
         self.socket.__exit__(None, None, None)
         self.tasks.clear()
 
+    def _task_ended(self, task_no):
+        # a top-level task is completed when all its subtasks ended;
+        # returns the results held for it
+        root = self.root.pop(task_no)
+        self.pending[root] -= 1
+        if self.pending[root]:
+            return []
+        del self.pending[root]
+        self.root_args.pop(root, None)
+        results = self.held.pop(root, [])
+        if self.checkpoint:
+            for res in results:
+                self.checkpoint.save(self.name, root, res)
+            self.checkpoint.complete(self.name, root)
+        return results
+
+    def _iter_socket(self):
+        # yield the results received by the socket, or None if nothing
+        # was received in the last HEARTBEAT seconds
+        while True:
+            try:
+                if self.socket.zsocket.poll(HEARTBEAT * 1000):
+                    yield zeromq.recv(self.socket.zsocket)
+                else:
+                    yield None
+            except zmq.ZMQError:
+                # sending SIGTERM raises ZMQError
+                break
+
+    def _check_lost(self):
+        # a task not executing in any worker pool, while some workers are
+        # idle and therefore nothing is waiting in the task queue, is lost
+        # (for instance because its worker died before the pool could report
+        # it); to avoid races with tasks dispatched in the meantime, it must
+        # be missing in two checks. If some pool cannot be inspected its
+        # tasks are unknown, so nothing is considered lost
+        if self.distribute == 'celery':
+            # a task killed together with its worker process is marked
+            # as failed (WorkerLostError), the errors being sent via zmq
+            for task_no in sorted(self.handles):
+                if task_no in self.inflight and self.handles[task_no].failed():
+                    self._resubmit(task_no)
+            return
+        if self.distribute != 'zmq' or not self.inflight:
+            return
+        executing, idle, unknown = workerpool.get_executing(self.calc_id)
+        if unknown:
+            logging.debug('Cannot inspect the workerpools on %s', unknown)
+        lost = (set(self.inflight) - executing if idle and not unknown
+                else set())
+        again = lost & self.suspected
+        self.suspected = lost - again
+        for task_no in sorted(again):
+            self._resubmit(task_no)
+
+    def _resubmit(self, task_no):
+        # resubmit a lost task; if it already sent results or subtasks,
+        # its top-level task is resubmitted, since otherwise the results
+        # would be counted twice
+        name = self.task_func.__name__
+        if task_no not in self.inflight:  # discarded in the meantime
+            return
+        if self.received[task_no]:
+            if not self.hold:  # the results were already yielded
+                raise RuntimeError(
+                    'Task %s#%d was lost after sending %d result(s)' %
+                    (name, task_no, self.received[task_no]))
+            self._resubmit_root(self.root[task_no])
+            return
+        self.retries[task_no] += 1
+        if self.retries[task_no] > self.max_retries:
+            raise RuntimeError('Task %s#%d was lost %d times' % (
+                name, task_no, self.retries[task_no]))
+        logging.warning('Task %s#%d was lost, resubmitting it', name, task_no)
+        func, args, monitor = self.inflight[task_no]
+        task_no_, self.task_no = self.task_no, task_no
+        try:
+            res = submit[self.distribute](self, func, args, monitor)
+        finally:
+            self.task_no = task_no_
+        if self.distribute == 'celery':
+            self.handles[task_no] = res
+
+    def _resubmit_root(self, root):
+        # discard the held results, the running tasks and the queued
+        # subtasks of a top-level task and submit it again
+        name = self.task_func.__name__
+        self.root_retries[root] += 1
+        if self.root_retries[root] > self.max_retries:
+            raise RuntimeError('Task %s#%s was lost %d times' % (
+                name, root, self.root_retries[root]))
+        held = self.held.pop(root, [])
+        logging.warning('Task %s#%s was lost, discarding %d partial '
+                        'result(s) and resubmitting it', name, root,
+                        len(held))
+        for task_no in [t for t, r in self.root.items() if r == root]:
+            del self.root[task_no]
+            self.inflight.pop(task_no, None)
+            self.handles.pop(task_no, None)
+            self.ended.add(task_no)  # the next messages will be discarded
+            self.todo -= 1
+        queue = []
+        for func, args in self.task_queue:
+            if self.subtask_root.get(id(args)) == root:
+                del self.subtask_root[id(args)]
+            else:
+                queue.append((func, args))
+        self.task_queue[:] = queue
+        self.pending[root] = 1
+        func, args, monitor = self.root_args[root]
+        self.subtask_root[id(args)] = root
+        self.submit(args, func, monitor)
+        self.todo += 1
+
 
 def sequential_apply(task, args, concurrent_tasks=Starmap.num_cores * 2,
                      weight=lambda item: 1, key=lambda item: 'Unspecified'):
@@ -35,7 +35,8 @@ perf_dt = numpy.dtype([('operation', '<S50'), ('time_sec', float),
 task_info_dt = numpy.dtype(
     [('taskname', '<S50'), ('taskno', numpy.uint32),
      ('weight', numpy.float32), ('duration', numpy.float32),
-     ('received', numpy.int64), ('mem_gb', numpy.float32)])
+     ('received', numpy.int64), ('mem_gb', numpy.float32),
+     ('uncompressed', numpy.int64)])
 
 
 def init_performance(hdf5file, swmr=False):
@@ -107,6 +108,7 @@ class Monitor(object):
     address = None
     authkey = None
     calc_id = None
+    compress_threshold = 0  # see parallel.Pickled
 
     def __init__(self, operation='', measuremem=False, inner_loop=False,
                  h5=None):
@@ -184,7 +186,7 @@ class Monitor(object):
         :param mem_gb: memory consumption at the saving time (optional)
         """
         t = (name, self.task_no, self.weight, self.duration, len(res.pik),
-             mem_gb)
+             mem_gb, res.pik.rawsize)
         data = numpy.array([t], task_info_dt)
         hdf5.extend(h5['task_info'], data)
         h5['task_info'].flush()  # notify the reader
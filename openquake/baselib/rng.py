@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2019 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+"""
+Counter-based random number generation. Contrarily to the global
+numpy generator, the random numbers produced here are a pure function
+of a key (seed, stream) and of a few integer counters (for instance
+rupture ID, site ID, asset ID, event ID). Therefore they do not depend
+on the order in which they are generated, on how the work is split
+in tasks or on the number of threads used. The algorithm is
+Philox4x32-10 (Salmon et al., "Parallel random numbers: as easy as
+1, 2, 3", SC11), implemented with vectorized numpy operations on
+64 bit unsigned integers.
+"""
+import numpy
+
+U64 = numpy.uint64
+MASK32 = U64(0xFFFFFFFF)
+SHIFT32 = U64(32)
+PHILOX_M0 = U64(0xD2511F53)
+PHILOX_M1 = U64(0xCD9E8D57)
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+TWO53 = 9007199254740992.  # 2 ** 53
+TWO26 = 67108864.  # 2 ** 26
+
+# streams used by the engine, so that the same counters produce
+# independent random numbers for different purposes
+GMF_INTRA = 1
+GMF_INTER = 2
+EPSILON = 3
+EPSILON_COMMON = 4
+VULNERABILITY = 5
+
+
+def philox4x32(counter, key, rounds=10):
+    """
+    Apply the Philox4x32 bijection to a counter.
+
+    :param counter: a list of 4 broadcastable arrays of 32 bit integers
+    :param key: a pair of 32 bit integers
+    :param rounds: the number of rounds (default 10)
+    :returns: a list of 4 arrays of uint64 in the range [0, 2**32)
+
+    >>> [hex(int(x)) for x in philox4x32([0, 0, 0, 0], (0, 0))]
+    ['0x6627e8d5', '0xe169c58d', '0xbc57ac4c', '0x9b00dbd8']
+    """
+    c0, c1, c2, c3 = [numpy.asarray(c).astype(U64) & MASK32
+                      for c in counter]
+    k0, k1 = key[0] & 0xFFFFFFFF, key[1] & 0xFFFFFFFF
+    for _ in range(rounds):
+        p0 = PHILOX_M0 * c0
+        p1 = PHILOX_M1 * c2
+        c0, c1, c2, c3 = ((p1 >> SHIFT32) ^ c1 ^ U64(k0), p1 & MASK32,
+                          (p0 >> SHIFT32) ^ c3 ^ U64(k1), p0 & MASK32)
+        k0 = (k0 + PHILOX_W0) & 0xFFFFFFFF
+        k1 = (k1 + PHILOX_W1) & 0xFFFFFFFF
+    return [c0, c1, c2, c3]
+
+
+def _to_double(hi, lo):
+    # build a double in the open interval (0, 1) from 53 random bits
+    return ((hi >> U64(5)) * TWO26 + (lo >> U64(6)) + .5) / TWO53
+
+
+class CounterRNG(object):
+    """
+    A counter-based random number generator. The random numbers are
+    keyed by the seed, the stream and up to 4 integer counters, which
+    are broadcast together like in numpy ufuncs:
+
+    >>> rng = CounterRNG(42)
+    >>> u = rng.uniform([1, 2, 3], 0)
+    >>> (rng.uniform(2, 0) == u[1]).all()  # independent from the chunking
+    True
+
+    :param seed: the master seed
+    :param stream: an integer to distinguish independent sequences
+    """
+    def __init__(self, seed, stream=0):
+        self.seed = int(seed)
+        self.stream = int(stream)
+        self.key = (self.seed & 0xFFFFFFFF,
+                    (self.stream ^ (self.seed >> 32)) & 0xFFFFFFFF)
+
+    def random_raw(self, *counters):
+        """
+        :param counters: up to 4 broadcastable arrays of integers
+        :returns: 4 arrays of uint64 in the range [0, 2**32)
+        """
+        if len(counters) > 4:
+            raise ValueError('At most 4 counters are accepted, got %d' %
+                             len(counters))
+        ctr = numpy.broadcast_arrays(*counters) if counters else []
+        zero = numpy.zeros(ctr[0].shape if ctr else (), U64)
+        ctr = list(ctr) + [zero] * (4 - len(ctr))
+        return philox4x32(ctr, self.key)
+
+    def uniform(self, *counters):
+        """
+        :returns: floats uniformly distributed in the open interval (0, 1)
+        """
+        w0, w1, _w2, _w3 = self.random_raw(*counters)
+        return _to_double(w0, w1)
+
+    def normal(self, *counters):
+        """
+        :returns: floats with a standard normal distribution (Box-Muller)
+        """
+        w0, w1, w2, w3 = self.random_raw(*counters)
+        u1 = _to_double(w0, w1)
+        u2 = _to_double(w2, w3)
+        return numpy.sqrt(-2. * numpy.log(u1)) * numpy.cos(2. * numpy.pi * u2)
+
+    def __repr__(self):
+        return '<%s seed=%d, stream=%d>' % (
+            self.__class__.__name__, self.seed, self.stream)
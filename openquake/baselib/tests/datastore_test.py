@@ -20,9 +20,11 @@ import re
 import os
 import sys
 import unittest
+import unittest.mock as mock
 import tempfile
 import numpy
-from openquake.baselib.datastore import DataStore, read
+from openquake.baselib import config, hdf5
+from openquake.baselib.datastore import DataStore, read, clean_cachedir
 
 
 class DataStoreTestCase(unittest.TestCase):
@@ -61,6 +63,36 @@ class DataStoreTestCase(unittest.TestCase):
         self.dstore['a/b'] = 42
         self.assertTrue('a/b' in self.dstore)
 
+    def test_storage(self):
+        storage = dict(compression='lzf', shuffle=True, chunk_size=1024)
+        with mock.patch.dict(config.storage, storage):
+            # extendable dataset chunked along the first axis
+            dset = self.dstore.create_dset('ext', numpy.float32, (None, 4))
+            self.assertEqual(dset.chunks, (64, 4))
+            self.assertEqual(dset.compression, 'lzf')
+            self.assertTrue(dset.shuffle)
+            # big arrays are compressed, small arrays are not
+            self.dstore['big'] = big = numpy.arange(1000.)
+            self.dstore['small'] = numpy.arange(10.)
+            # vlen datasets are never compressed
+            self.dstore.create_dset('vlen', hdf5.vfloat32)
+        self.assertEqual(self.dstore.hdf5['big'].chunks, (128,))
+        self.assertEqual(self.dstore.hdf5['big'].compression, 'lzf')
+        self.assertIsNone(self.dstore.hdf5['small'].compression)
+        self.assertIsNone(self.dstore.hdf5['vlen'].compression)
+        numpy.testing.assert_equal(self.dstore['big'][()], big)
+
+    def test_clean_cachedir(self):
+        cachedir = tempfile.mkdtemp()
+        for i, name in enumerate(['a', 'b', 'c', 'd.tmp']):
+            fname = os.path.join(cachedir, name)
+            with open(fname, 'wb') as f:
+                f.write(b'x' * 1024 ** 2)
+            os.utime(fname, (i, i))  # 'a' is the least recently used
+        with mock.patch.dict(config.directory, cache_size=2):
+            clean_cachedir(cachedir)
+        self.assertEqual(sorted(os.listdir(cachedir)), ['b', 'c', 'd.tmp'])
+
     def test_export_path(self):
         path = self.dstore.export_path('hello.txt', tempfile.mkdtemp())
         mo = re.search(r'hello_\d+', path)
@@ -22,6 +22,7 @@ import pickle
 import unittest
 
 from openquake.baselib import node as n
+from openquake.baselib.general import gettemp
 
 
 class NodeTestCase(unittest.TestCase):
@@ -190,3 +191,31 @@ param=yyy
     def test_can_pickle(self):
         node = n.Node('tag')
         self.assertEqual(pickle.loads(pickle.dumps(node)), node)
+
+
+class ValidatingXmlParserTestCase(unittest.TestCase):
+    xml = b'''\
+<root>
+<general><a>1</a></general>
+<items>
+<item value="1"/>
+<item value="2"><sub>x</sub></item>
+<item value="3"/>
+</items>
+</root>
+'''
+
+    def test_parse_iter(self):
+        # the streamed children are the same as in the full tree
+        fname = gettemp(self.xml, suffix='.xml')
+        root = n.ValidatingXmlParser({}).parse_file(fname)
+        parser = n.ValidatingXmlParser({})
+        parser.BLOCKSIZE = 10  # to test the nodes spanning several blocks
+        pairs = list(parser.parse_iter(fname, 'items'))
+        self.assertEqual([parent.tag for parent, node in pairs],
+                         ['items'] * 3)
+        self.assertEqual([node for parent, node in pairs],
+                         root.items.nodes)
+        # the streamed nodes are not attached to the rest of the document
+        self.assertEqual(len(parser.root.items), 0)
+        self.assertEqual(parser.root.general, root.general)
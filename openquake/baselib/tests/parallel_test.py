@@ -58,6 +58,10 @@ def supertask(text, monitor):
             yield get_length, k * v
 
 
+def zeros(n, monitor):
+    return numpy.zeros(n)
+
+
 def countletters(text1, text2, monitor):
     for block in general.block_splitter(text1 + text2, 5):
         yield get_length, ''.join(block)
@@ -142,6 +146,30 @@ class StarmapTestCase(unittest.TestCase):
             self.assertGreater(len(h5['task_info']), 0)
         shutil.rmtree(tmpdir)
 
+    def test_compression(self):
+        pik = parallel.Pickled(numpy.zeros(1000), threshold=100)
+        self.assertTrue(pik.compressed)
+        self.assertLess(len(pik), pik.rawsize)
+        numpy.testing.assert_equal(pik.unpickle(), numpy.zeros(1000))
+        self.assertFalse(parallel.Pickled('x', threshold=100).compressed)
+
+        # compress the task arguments and results also for local tasks
+        tmpdir = tempfile.mkdtemp()
+        tmp = os.path.join(tmpdir, 'calc_1.hdf5')
+        performance.init_performance(tmp)
+        with mock.patch('openquake.baselib.parallel.compress_threshold',
+                        lambda distribute: 100):
+            smap = parallel.Starmap(zeros, [(1000,), (2000,)],
+                                    h5=hdf5.File(tmp, 'a'))
+            res = sorted(len(arr) for arr in smap)
+        smap.h5.close()
+        self.assertEqual(res, [1000, 2000])
+        with hdf5.File(tmp, 'r') as h5:
+            info = h5['task_info'][()]
+        self.assertEqual(len(info), 2)
+        self.assertTrue((info['received'] < info['uncompressed']).all())
+        shutil.rmtree(tmpdir)
+
     def test_countletters(self):
         data = [('hello', 'world'), ('ciao', 'mondo')]
         smap = parallel.Starmap(countletters, data)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2019 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import numpy
+from openquake.baselib.rng import philox4x32, CounterRNG
+
+
+class Philox4x32TestCase(unittest.TestCase):
+    # known answer tests from the Random123 distribution
+
+    def test_ones(self):
+        out = philox4x32([0xFFFFFFFF] * 4, (0xFFFFFFFF, 0xFFFFFFFF))
+        self.assertEqual([int(x) for x in out],
+                         [0x408f276d, 0x41c83b0e, 0xa20bc7c6, 0x6d5451fd])
+
+    def test_pi(self):
+        out = philox4x32([0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344],
+                         (0xa4093822, 0x299f31d0))
+        self.assertEqual([int(x) for x in out],
+                         [0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1])
+
+
+class CounterRNGTestCase(unittest.TestCase):
+    def test_chunking(self):
+        rng = CounterRNG(42, stream=1)
+        sids, eids = numpy.arange(10), numpy.arange(100)
+        full = rng.normal(sids[:, None], eids)
+        self.assertEqual(full.shape, (10, 100))
+        # generating the numbers in blocks gives the same result
+        for block in numpy.array_split(eids, 7):
+            numpy.testing.assert_equal(
+                rng.normal(sids[:, None], block), full[:, block])
+        # a different stream gives different numbers
+        other = CounterRNG(42, stream=2).normal(sids[:, None], eids)
+        self.assertFalse((other == full).any())
+
+    def test_statistics(self):
+        rng = CounterRNG(1)
+        counters = numpy.arange(100000)
+        u = rng.uniform(counters)
+        self.assertTrue(0 < u.min() < u.max() < 1)
+        self.assertAlmostEqual(u.mean(), .5, places=2)
+        z = rng.normal(counters, 1)
+        self.assertAlmostEqual(z.mean(), 0, places=2)
+        self.assertAlmostEqual(z.std(), 1, places=2)
+
+    def test_too_many_counters(self):
+        with self.assertRaises(ValueError):
+            CounterRNG(1).uniform(1, 2, 3, 4, 5)
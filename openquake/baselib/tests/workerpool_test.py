@@ -16,10 +16,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import time
 import unittest
+import tempfile
+import unittest.mock as mock
+import numpy
 from openquake.baselib import config
-from openquake.baselib.workerpool import WorkerMaster
+from openquake.baselib.workerpool import (
+    WorkerMaster, get_executing, get_zworkers)
 from openquake.baselib.parallel import Starmap
 from openquake.baselib.general import socket_ready
 
@@ -28,6 +33,23 @@ def double(x):
     return 2 * x
 
 
+def die_once(fname):
+    # kill the worker the first time the task is called
+    if not os.path.exists(fname):
+        open(fname, 'w').close()
+        os._exit(1)
+    return 1
+
+
+def die_after_yield(fname):
+    # kill the worker after sending a partial result, the first time
+    yield 1
+    if not os.path.exists(fname):
+        open(fname, 'w').close()
+        os._exit(1)
+    yield 2
+
+
 class WorkerPoolTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -39,6 +61,7 @@ class WorkerPoolTestCase(unittest.TestCase):
         cls.master = WorkerMaster(
             '127.0.0.1', cls.z['ctrl_port'], host_cores)
         cls.master.start()
+        cls.master.wait()
 
     def test(self):
         iterargs = ((i,) for i in range(10))
@@ -46,11 +69,68 @@ class WorkerPoolTestCase(unittest.TestCase):
         self.assertEqual(sum(res for res in smap), 90)
         # sum[0, 2, 4, 6, 8, 10, 12, 14, 16, 18]
 
+    def test_big_arrays(self):
+        # the arrays are sent as separate zmq frames
+        args = [(numpy.arange(100000.),) for _ in range(3)]
+        smap = Starmap(double, args, distribute='zmq')
+        for arr in smap:
+            arr += 1  # the received arrays are writeable
+            numpy.testing.assert_equal(arr, numpy.arange(1, 200001, 2.))
+
+    def test_lost_task(self):
+        tmpdir = tempfile.mkdtemp()
+        args = [(os.path.join(tmpdir, str(i)),) for i in range(2)]
+        smap = Starmap(die_once, args, distribute='zmq')
+        self.assertEqual(sum(res for res in smap), 2)
+        self.assertEqual(dict(smap.retries), {0: 1, 1: 1})
+
+    def test_lost_task_partial_results(self):
+        # the partial results of the lost tasks are discarded
+        tmpdir = tempfile.mkdtemp()
+        args = [(os.path.join(tmpdir, str(i)),) for i in range(2)]
+        smap = Starmap(die_after_yield, args, distribute='zmq')
+        self.assertEqual(sum(res for res in smap), 6)
+        self.assertEqual(dict(smap.root_retries), {0: 1, 1: 1})
+
+    def test_get_executing_unknown(self):
+        # the workerpool on 127.0.0.3 is not running, so its tasks are unknown
+        executing, idle, unknown = get_executing(
+            1, host_cores='127.0.0.1 4,127.0.0.3 1')
+        self.assertEqual(executing, set())
+        self.assertEqual(unknown, ['127.0.0.3'])
+
     def test_status(self):
         time.sleep(1)  # wait a bit for the workerpool to start
         self.assertEqual(self.master.status(), [('127.0.0.1', 'running')])
 
+    def test_inspect(self):
+        host, stats = self.master.inspect()[0]
+        self.assertEqual(host, '127.0.0.1')
+        self.assertEqual(stats['num_workers'], 4)
+
+    def test_clear_cache(self):
+        msg = self.master.clear_cache('calc_1_tmp.hdf5')
+        self.assertEqual(msg, "cleared calc_1_tmp.hdf5 on ['127.0.0.1']")
+
+    def test_persistent(self):
+        # the processpool tasks are sent to the persistent workers
+        with mock.patch.object(Starmap, 'persistent', True):
+            smap = Starmap(double, [(1,), (2,)], distribute='processpool')
+            self.assertEqual(smap.distribute, 'zmq')
+            self.assertEqual(sum(res for res in smap), 6)
+
     @classmethod
     def tearDownClass(cls):
         cls.master.stop()
         config.zworkers = cls.z
+
+
+class GetZworkersTestCase(unittest.TestCase):
+    def test_persistent_workers(self):
+        # the persistent workers run on localhost on all the cores
+        with mock.patch.dict(os.environ, OQ_DISTRIBUTE='processpool'), \
+                mock.patch.dict(config.distribution, persistent_workers=True):
+            self.assertEqual(get_zworkers()['host_cores'], '127.0.0.1 -1')
+        with mock.patch.dict(os.environ, OQ_DISTRIBUTE='zmq'), \
+                mock.patch.dict(config.zworkers, host_cores='10.0.0.1 8'):
+            self.assertEqual(get_zworkers()['host_cores'], '10.0.0.1 8')
@@ -1,11 +1,14 @@
 import os
 import sys
 import time
+import pickle
 import signal
 import shutil
 import tempfile
 import subprocess
+import collections
 import multiprocessing
+import psutil
 from openquake.baselib import zeromq as z, general, parallel, config
 try:
     from setproctitle import setproctitle
@@ -18,25 +21,76 @@ class TimeoutError(RuntimeError):
     pass
 
 
+LOCAL_HOST_CORES = '127.0.0.1 -1'  # used by the persistent workers
+
+
 def _streamer(host):
     # streamer for zmq workers
     port = int(config.zworkers.ctrl_port)
     task_input_url = 'tcp://127.0.0.1:%d' % (port + 2)
     task_server_url = 'tcp://%s:%s' % (host, port + 1)
     try:
-        z.zmq.proxy(z.bind(task_input_url, z.zmq.PULL),
-                    z.bind(task_server_url, z.zmq.PUSH))
+        _broker(z.bind(task_input_url, z.zmq.PULL),
+                z.bind(task_server_url, z.zmq.ROUTER))
     except (KeyboardInterrupt, z.zmq.ContextTerminated):
         pass  # killed cleanly by SIGINT/SIGTERM
 
 
-def check_status(**kw):
+def _broker(frontend, backend):
+    # send the tasks received by the frontend to the workers asking for
+    # work on the backend, in order of request; a worker asks for a new task
+    # only when it is idle, so that faster hosts get more tasks
+    backend.setsockopt(z.zmq.ROUTER_MANDATORY, 1)  # fail for dead workers
+    tasks = collections.deque()  # task frames, forwarded as they are
+    ready = collections.deque()  # identities of the idle workers
+    poller = z.zmq.Poller()
+    poller.register(backend, z.zmq.POLLIN)
+    poller.register(frontend, z.zmq.POLLIN)
+    while True:
+        socks = dict(poller.poll())
+        if socks.get(backend) == z.zmq.POLLIN:
+            # REQ envelope [identity, empty frame, request]
+            ident, _empty, *_req = backend.recv_multipart()
+            ready.append(ident)
+        if socks.get(frontend) == z.zmq.POLLIN:
+            tasks.append(frontend.recv_multipart(copy=False))
+        while tasks and ready:
+            try:
+                backend.send_multipart(
+                    [ready.popleft(), b''] + tasks[0], copy=False)
+            except z.zmq.ZMQError:  # the worker is not connected anymore
+                continue
+            tasks.popleft()
+
+
+def persistent_workers():
     """
-    :returns: a non-empty error string if the streamer or worker pools are down
+    :returns: True if OQ_DISTRIBUTE=processpool and the tasks are sent to the
+              long-lived workers on localhost started by the DbServer
+    """
+    return (parallel.oq_distribute() == 'processpool' and
+            config.distribution.get('persistent_workers', False))
+
+
+def get_zworkers(**kw):
+    """
+    :returns: the parameters of the WorkerMaster, i.e. the [zworkers]
+              section of openquake.cfg or, in case of persistent workers,
+              a single pool on localhost using all the cores
     """
     c = config.zworkers.copy()
     c['master_host'] = config.dbserver.listen
+    if persistent_workers():
+        c['host_cores'] = LOCAL_HOST_CORES
     c.update(kw)
+    return c
+
+
+def check_status(**kw):
+    """
+    :returns: a non-empty error string if the streamer or worker pools are down
+    """
+    c = get_zworkers(**kw)
     hostport = c['master_host'], int(c['ctrl_port']) + 1
     errors = []
     if not general.socket_ready(hostport):
@@ -47,6 +101,34 @@ def check_status(**kw):
     return '\n'.join(errors)
 
 
+def get_executing(calc_id, **kw):
+    """
+    :param calc_id: a calculation ID
+    :returns: the task numbers of the calculation executing in the running
+              worker pools, a flag True if some worker is asking for tasks
+              and the hosts that cannot be inspected, since their control
+              port is unreachable: their tasks are unknown
+    """
+    c = get_zworkers(**kw)
+    mem_limit = float(config.memory.soft_mem_limit)
+    prefix = '%s-' % calc_id
+    executing = set()
+    idle = False
+    master = WorkerMaster(**c)
+    stats_by_host = master.inspect()
+    inspected = {host for host, stats in stats_by_host}
+    unknown = [host for host, _ in master.host_cores if host not in inspected]
+    for host, stats in stats_by_host:
+        fnames = stats['executing'].split()
+        for fname in fnames:
+            if fname.startswith(prefix):  # calc_id-task_no-pid
+                executing.add(int(fname.split('-')[1]))
+        if not fnames or (len(fnames) < stats['num_workers'] and
+                          stats['mem_percent'] < mem_limit):
+            idle = True
+    return executing, idle, unknown
+
+
 class WorkerMaster(object):
     """
     :param master_host: hostname or IP of the master node
@@ -155,7 +237,25 @@ class WorkerMaster(object):
         self.popens = []
         return 'killed %s' % killed
 
+    def clear_cache(self, namespace):
+        """
+        Remove the given namespace from the cache of all the workers
+        """
+        cleared = []
+        for host, _ in self.host_cores:
+            if self.status(host)[0][1] == 'not-running':
+                continue
+            ctrl_url = 'tcp://%s:%s' % (host, self.ctrl_port)
+            with z.Socket(ctrl_url, z.zmq.REQ, 'connect') as sock:
+                sock.send('clear_cache %s' % namespace)
+                cleared.append(host)
+        return 'cleared %s on %s' % (namespace, cleared)
+
     def inspect(self):
+        """
+        :returns: a list of pairs (hostname, statistics dictionary) with
+                  the tasks executing and the throughput of each host
+        """
         executing = []
         for host, _ in self.host_cores:
             if self.status(host)[0][1] == 'not-running':
@@ -163,8 +263,7 @@ class WorkerMaster(object):
                 continue
             ctrl_url = 'tcp://%s:%s' % (host, self.ctrl_port)
             with z.Socket(ctrl_url, z.zmq.REQ, 'connect') as sock:
-                tasks = sock.send('get_executing')
-                executing.append((host, tasks))
+                executing.append((host, sock.send('get_stats')))
         return executing
 
     def restart(self):
@@ -176,24 +275,56 @@ class WorkerMaster(object):
         return 'restarted'
 
 
-def worker(sock, executing):
+def _admitted(executing, mem_limit):
+    # a worker can ask for a new task if the memory used in the host is
+    # below the limit or if no task is running in the host
+    return (psutil.virtual_memory().percent < mem_limit or
+            not os.listdir(executing))
+
+
+def worker(sock, executing, stats, cleared):
     """
-    :param sock: a zeromq.Socket of kind PULL
+    :param sock: a zeromq.Socket of kind REQ
     :param executing: a path inside /tmp/calc_XXX
+    :param stats: a shared array (number of tasks, busy time)
+    :param cleared: a queue of cache namespaces to clear
     """
     setproctitle('oq-zworker')
+    # a zmq context cannot be shared with the parent process, which is
+    # using it when the dead workers are replaced
+    z.context = z.zmq.Context()
+    mem_limit = float(config.memory.soft_mem_limit)
     with sock:
-        for cmd, args, taskno, mon in sock:
-            fname = os.path.join(executing, str(taskno))
-            open(fname, 'w').close()
+        while True:
+            while not _admitted(executing, mem_limit):
+                time.sleep(1)
+            cmd, args, taskno, mon = sock.send('ready')
+            while not cleared.empty():  # calculations ended
+                parallel.clear_cache(cleared.get())
+            # the monitor is saved so that the master can be notified
+            # if the worker dies while executing the task
+            fname = os.path.join(executing, '%s-%s-%d' % (
+                mon.calc_id, taskno, os.getpid()))
+            with open(fname, 'wb') as f:
+                pickle.dump(mon, f, pickle.HIGHEST_PROTOCOL)
+            t0 = time.time()
             parallel.safely_call(cmd, args, taskno, mon)
             os.remove(fname)
+            with stats.get_lock():
+                stats[0] += 1
+                stats[1] += time.time() - t0
 
 
 class WorkerPool(object):
     """
-    A pool of workers accepting the command 'stop' and 'kill' and reading
-    tasks to perform from the task_server_url.
+    A pool of workers accepting the command 'stop' and 'kill' and asking
+    tasks to perform to the task_server_url when idle. The workers are
+    long-lived and keep a cache for each calculation (see
+    :func:`openquake.baselib.parallel.cached`) which is cleared with the
+    command 'clear_cache <namespace>' at the end of the calculation.
+    A worker dying while executing a task (for instance killed by the
+    OOM killer) is replaced and the master is notified with a TASK_LOST
+    message, so that it can resubmit the task.
 
     :param ctrl_url: zmq address of the control socket
     :param task_server_url: zmq address of the task streamer
@@ -206,25 +337,21 @@ class WorkerPool(object):
                             if num_workers == '-1' else int(num_workers))
         self.executing = tempfile.mkdtemp()
         self.pid = os.getpid()
+        self.stats = multiprocessing.Array('d', 2)  # num_tasks, busy_time
 
     def start(self):
         """
         Start worker processes and a control loop
         """
         setproctitle('oq-zworkerpool %s' % self.ctrl_url[6:])  # strip tcp://
+        self.start_time = time.time()
         # start workers
-        self.workers = []
-        for _ in range(self.num_workers):
-            sock = z.Socket(self.task_server_url, z.zmq.PULL, 'connect')
-            proc = multiprocessing.Process(
-                target=worker, args=(sock, self.executing))
-            proc.start()
-            sock.pid = proc.pid
-            self.workers.append(sock)
+        self.workers = [self._start_worker() for _ in range(self.num_workers)]
 
         # start control loop accepting the commands stop and kill
         with z.Socket(self.ctrl_url, z.zmq.REP, 'bind') as ctrlsock:
-            for cmd in ctrlsock:
+            ctrlsock.timeout = 1000  # check the workers every second
+            for cmd in self._iter_commands(ctrlsock):
                 if cmd in ('stop', 'kill'):
                     msg = getattr(self, cmd)()
                     ctrlsock.send(msg)
@@ -235,8 +362,77 @@ class WorkerPool(object):
                     ctrlsock.send(self.num_workers)
                 elif cmd == 'get_executing':
                     ctrlsock.send(' '.join(sorted(os.listdir(self.executing))))
+                elif cmd == 'get_stats':
+                    ctrlsock.send(self.get_stats())
+                elif cmd.startswith('clear_cache '):
+                    namespace = cmd.split(' ', 1)[1]
+                    for sock in self.workers:
+                        sock.cleared.put(namespace)
+                    ctrlsock.send('cleared %s' % namespace)
         shutil.rmtree(self.executing)
 
+    def _start_worker(self):
+        sock = z.Socket(self.task_server_url, z.zmq.REQ, 'connect')
+        sock.cleared = multiprocessing.Queue()
+        sock.proc = multiprocessing.Process(
+            target=worker,
+            args=(sock, self.executing, self.stats, sock.cleared))
+        sock.proc.start()
+        sock.pid = sock.proc.pid
+        return sock
+
+    def _iter_commands(self, ctrlsock):
+        # yield the received commands; when no command arrives within the
+        # timeout the dead workers are replaced
+        ctrlsock.running = True
+        while ctrlsock.running:
+            try:
+                if ctrlsock.zsocket.poll(ctrlsock.timeout):
+                    yield z.recv(ctrlsock.zsocket)
+                else:
+                    self.replace_dead_workers()
+            except z.zmq.ZMQError:
+                # sending SIGTERM raises ZMQError
+                break
+
+    def replace_dead_workers(self):
+        """
+        Start a new worker for each dead worker and send a TASK_LOST
+        message to the master for the task the dead worker was executing
+        """
+        for i, sock in enumerate(self.workers):
+            if sock.proc.is_alive():
+                continue
+            sock.proc.join()  # avoid zombies
+            suffix = '-%d' % sock.pid
+            for fname in os.listdir(self.executing):
+                if fname.endswith(suffix):
+                    self._task_lost(os.path.join(self.executing, fname))
+            self.workers[i] = self._start_worker()
+
+    def _task_lost(self, fname):
+        with open(fname, 'rb') as f:
+            mon = pickle.load(f)
+        os.remove(fname)
+        mon.task_no = int(os.path.basename(fname).split('-')[1])
+        with z.Socket(mon.backurl, z.zmq.PUSH, 'connect') as sock:
+            sock.send(parallel.Result(None, mon, msg='TASK_LOST'))
+
+    def get_stats(self):
+        """
+        :returns: a dictionary with the executing tasks and the throughput
+        """
+        with self.stats.get_lock():
+            num_tasks, busy_time = self.stats
+        minutes = (time.time() - self.start_time) / 60
+        return dict(executing=' '.join(sorted(os.listdir(self.executing))),
+                    num_workers=self.num_workers,
+                    num_tasks=int(num_tasks),
+                    tasks_per_minute=round(num_tasks / minutes, 2),
+                    busy_percent=round(
+                        busy_time / minutes / .6 / self.num_workers, 1),
+                    mem_percent=psutil.virtual_memory().percent)
+
     def stop(self):
         """
         Send a SIGTERM to all worker processes
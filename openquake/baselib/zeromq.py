@@ -15,11 +15,16 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import io
 import re
-import zmq
+import pickle
+import copyreg
 import logging
+import zmq
+import numpy
 
 context = zmq.Context()
+MIN_BUFFER = 65536  # arrays smaller than this are pickled in-band
 
 # from integer socket_type to string
 SOCKTYPE = {zmq.REQ: 'REQ', zmq.REP: 'REP',
@@ -55,6 +60,101 @@ def connect(end_point, socket_type):
     return sock
 
 
+def _buffer(index, dtype, shape):
+    # placeholder for an out-of-band array, resolved by Unpickler.find_class
+    raise pickle.UnpicklingError('Missing out-of-band buffer #%d' % index)
+
+
+class Pickler(pickle.Pickler):
+    """
+    A pickler storing the big numpy arrays out-of-band, i.e. as separate
+    buffers which are not copied, similarly to the protocol 5 of Python 3.8.
+    Only numpy arrays are affected; the other objects are pickled as usual.
+    """
+    def __init__(self, file, min_buffer=MIN_BUFFER):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.min_buffer = min_buffer
+        self.buffers = []
+        self.dispatch_table = copyreg.dispatch_table.copy()
+        self.dispatch_table[numpy.ndarray] = self.reduce_array
+
+    def reduce_array(self, arr):
+        if arr.nbytes < self.min_buffer or arr.dtype.hasobject:
+            return arr.__reduce__()
+        if not arr.flags.c_contiguous:
+            arr = arr.copy()
+        # a flat view of the array as bytes, which supports the buffer API
+        self.buffers.append(arr.reshape(-1).view(numpy.uint8))
+        return _buffer, (len(self.buffers) - 1, arr.dtype, arr.shape)
+
+
+class Unpickler(pickle.Unpickler):
+    """
+    An unpickler for the data generated by :class:`Pickler`.
+    The arrays are rebuilt on top of the given buffers, without copying
+    them, unless the buffers are read-only (like the zmq frames).
+    """
+    def __init__(self, file, buffers):
+        super().__init__(file)
+        self.buffers = buffers
+
+    def find_class(self, module, name):
+        if module == __name__ and name == '_buffer':
+            return self.get_array
+        return super().find_class(module, name)
+
+    def get_array(self, index, dtype, shape):
+        buf = self.buffers[index]
+        arr = numpy.frombuffer(getattr(buf, 'buffer', buf), dtype)
+        if not arr.flags.writeable:
+            arr = arr.copy()
+        return arr.reshape(shape)
+
+
+def dumps(obj, min_buffer=MIN_BUFFER):
+    """
+    :param obj: object to pickle
+    :param min_buffer: minimum size of the arrays to store out-of-band
+    :returns: a pair (pickled bytestring, list of buffers)
+
+    >>> pik, buffers = dumps(dict(x=numpy.zeros(10)), min_buffer=10)
+    >>> [buf.nbytes for buf in buffers]
+    [80]
+    >>> loads(pik, buffers)
+    {'x': array([0., 0., 0., 0., 0., 0., 0., 0., 0., 0.])}
+    """
+    f = io.BytesIO()
+    pickler = Pickler(f, min_buffer)
+    pickler.dump(obj)
+    return f.getvalue(), pickler.buffers
+
+
+def loads(pik, buffers=()):
+    """
+    :param pik: a pickled bytestring generated by :func:`dumps`
+    :param buffers: the associated buffers
+    :returns: the unpickled object
+    """
+    return Unpickler(io.BytesIO(pik), buffers).load()
+
+
+def send(zsocket, obj):
+    """
+    Send an object as a multipart message, with the big arrays sent
+    without copying them, as separate frames
+    """
+    pik, buffers = dumps(obj)
+    zsocket.send_multipart([pik] + buffers, copy=False)
+
+
+def recv(zsocket):
+    """
+    Receive an object sent with :func:`send`
+    """
+    pik, *buffers = zsocket.recv_multipart(copy=False)
+    return loads(pik.buffer, buffers)
+
+
 class Socket(object):
     """
     A Socket class to be used with code like the following::
@@ -125,7 +225,7 @@ class Socket(object):
         while self.running:
             try:
                 if self.zsocket.poll(self.timeout):
-                    yield self.zsocket.recv_pyobj()
+                    yield recv(self.zsocket)
                 elif self.socket_type == zmq.PULL:
                     logging.debug('Waiting on %s:%d', self, self.port)
             except zmq.ZMQError:
@@ -141,13 +241,13 @@ class Socket(object):
             the Python object to send
         """
         try:
-            self.zsocket.send_pyobj(obj)
+            send(self.zsocket, obj)
         except Exception as exc:
             # usual for objects bigger than 4 GB
             raise exc.__class__('%s: %r' % (exc, obj))
         self.num_sent += 1
         if self.socket_type == zmq.REQ:
-            return self.zsocket.recv_pyobj()
+            return recv(self.zsocket)
 
     def __repr__(self):
         return '<%s %s %s>' % (self.__class__.__name__,
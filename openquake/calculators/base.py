@@ -19,10 +19,13 @@ import os
 import sys
 import abc
 import pdb
+import pickle
+import hashlib
 import logging
 import operator
 import itertools
 import traceback
+import collections
 from datetime import datetime
 from shapely import wkt
 import numpy
@@ -130,6 +133,112 @@ To avoid that, set a proper `region_grid_spacing` so that your exposure
 takes less sites.''' % MAXSITES
 
 
+class Checkpoint(object):
+    """
+    An append-only log of the results of the tasks of a calculation, saved
+    next to the datastore and used by `oq engine --resume` to skip the
+    completed work. The results are grouped by top-level task (a task with
+    all the subtasks it spawned) and only the completed groups are replayed.
+    A top-level task is identified by its submission index and by the digest
+    of its arguments, so that a task is not replayed if the work was split
+    differently (for instance because of a different `concurrent_tasks`).
+    The log is a sequence of pickled headers (name, task, nbytes) followed
+    by the pickled result, with nbytes=0 marking a completed task; a record
+    truncated by a crash is discarded.
+
+    :param fname: path of the log
+    :param checksum: checksum of the input files, to be checked when resuming
+    """
+    def __init__(self, fname, checksum):
+        self.fname = fname
+        self.offsets = collections.defaultdict(list)  # (name, task) -> pos
+        self.done = set()  # pairs (name, task)
+        if os.path.exists(fname) and os.path.getsize(fname):
+            with open(fname, 'rb') as f:
+                size = self._read(f, checksum)
+            os.truncate(fname, size)  # remove a truncated record, if any
+            self.file = open(fname, 'ab')
+        else:
+            self.file = open(fname, 'wb')
+            self._write(('checksum', checksum, 0))
+
+    def _read(self, f, checksum):
+        # read the headers and return the size of the valid part of the log
+        _, checksum_, _ = pickle.load(f)
+        if checksum_ != checksum:
+            raise InvalidFile('The input files changed since the checkpoint '
+                              '%s was saved' % self.fname)
+        size = f.tell()
+        while True:
+            try:
+                name, task, nbytes = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                break
+            pos = f.tell()
+            if nbytes == 0:
+                self.done.add((name, task))
+            elif f.seek(nbytes, 1) > os.fstat(f.fileno()).st_size:
+                break  # truncated result
+            else:
+                self.offsets[name, task].append((pos, nbytes))
+            size = f.tell()
+        return size
+
+    def _write(self, header, data=b''):
+        pickle.dump(header, self.file, pickle.HIGHEST_PROTOCOL)
+        self.file.write(data)
+        self.file.flush()
+
+    @staticmethod
+    def digest(args):
+        """
+        :param args: the arguments of a task, possibly pickled
+        :returns: a digest of the pickled arguments
+        """
+        md5 = hashlib.md5()
+        for arg in args:
+            if hasattr(arg, 'unpickle'):  # Pickled instance
+                md5.update(arg.pik)
+                for buf in arg.buffers:
+                    md5.update(buf)
+            else:
+                md5.update(pickle.dumps(arg, pickle.HIGHEST_PROTOCOL))
+        return md5.hexdigest()
+
+    def get(self, name, task):
+        """
+        :returns: the results of the given top-level task, or None if the
+                  task did not complete
+        """
+        if (name, task) not in self.done:
+            return
+        results = []
+        with open(self.fname, 'rb') as f:
+            for pos, nbytes in self.offsets[name, task]:
+                f.seek(pos)
+                results.append(pickle.loads(f.read(nbytes)))
+        return results
+
+    def save(self, name, task, result):
+        """
+        Save a result of the given top-level task
+        """
+        data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        self._write((name, task, len(data)), data)
+
+    def complete(self, name, task):
+        """
+        Mark the given top-level task (and its subtasks) as completed
+        """
+        self._write((name, task, 0))
+
+    def close(self):
+        """
+        Close the underlying file
+        """
+        self.file.close()
+
+
 class BaseCalculator(metaclass=abc.ABCMeta):
     """
     Abstract base class for all calculators.
@@ -142,6 +251,7 @@ class BaseCalculator(metaclass=abc.ABCMeta):
     accept_precalc = []
     from_engine = False  # set by engine.run_calc
     is_stochastic = False  # True for scenario and event based calculators
+    checkpoint = None  # set in .run if oqparam.checkpoint is true
 
     def __init__(self, oqparam, calc_id=None):
         self.datastore = datastore.DataStore(calc_id)
@@ -215,6 +325,10 @@ class BaseCalculator(metaclass=abc.ABCMeta):
                 # save the used concurrent_tasks
                 self.oqparam.concurrent_tasks = ct
             self.save_params(**kw)
+            if self.oqparam.checkpoint:
+                self.checkpoint = Checkpoint(
+                    self.datastore.filename[:-5] + '.ckpt',
+                    self.datastore['/'].attrs['checksum32'])
             try:
                 if pre_execute:
                     self.pre_execute()
@@ -222,6 +336,8 @@ class BaseCalculator(metaclass=abc.ABCMeta):
                 if self.result is not None:
                     self.post_execute(self.result)
                 self.export(kw.get('exports', ''))
+                if self.checkpoint:  # not needed anymore
+                    os.remove(self.checkpoint.fname)
             except Exception:
                 if kw.get('pdb'):  # post-mortem debug
                     tb = sys.exc_info()[2]
@@ -231,6 +347,8 @@ class BaseCalculator(metaclass=abc.ABCMeta):
                     logging.critical('', exc_info=True)
                     raise
             finally:
+                if self.checkpoint:
+                    self.checkpoint.close()
                 # cleanup globals
                 if ct == 0:  # restore OQ_DISTRIBUTE
                     if oq_distribute is None:  # was not set
@@ -28,7 +28,8 @@ from openquake.baselib import parallel, hdf5
 from openquake.baselib.general import AccumDict, block_splitter
 from openquake.hazardlib import mfd
 from openquake.hazardlib.contexts import (
-    ContextMaker, Effect, get_effect_by_mag, ruptures_by_mag_dist)
+    ContextMaker, Effect, get_effect_by_mag, get_max_ratio_by_mag,
+    get_magdist, ruptures_by_mag_dist)
 from openquake.hazardlib.calc.filters import split_sources, getdefault
 from openquake.hazardlib.calc.hazard_curve import classical
 from openquake.hazardlib.probability_map import ProbabilityMap
@@ -285,8 +286,19 @@ class ClassicalCalculator(base.HazardCalculator):
                             dist_bins[trt],
                             getdefault(oq.pointsource_distance, trt))
                 for t, trt in enumerate(gsims_by_trt)}
+            if oq.truncation_level:  # else keep the maximum distance
+                ratio = parallel.Starmap.apply(
+                    get_max_ratio_by_mag,
+                    (mags, self.sitecol.one(), gsims_by_trt,
+                     oq.maximum_distance, oq.imtls, oq.truncation_level,
+                     mon)).reduce()
+                for t, trt in enumerate(gsims_by_trt):
+                    if trt in oq.maximum_distance.magdist:  # user-given
+                        continue
+                    oq.maximum_distance.magdist[trt] = get_magdist(
+                        {mag: ratio[mag][:, t] for mag in ratio},
+                        dist_bins[trt])
             for trt, eff in self.effect.items():
-                oq.maximum_distance.magdist[trt] = eff.dist_by_mag()
                 oq.pointsource_distance[trt] = eff.dist_by_mag(
                     eff.collapse_value)
         else:
@@ -311,6 +323,7 @@ class ClassicalCalculator(base.HazardCalculator):
         smap = parallel.Starmap(
             self.core_task.__func__, h5=self.datastore.hdf5)
         smap.task_queue = list(self.gen_task_queue())  # really fast
+        smap.checkpoint = self.checkpoint
         acc0 = self.acc0()  # create the rup/ datasets BEFORE swmr_on()
         self.datastore.swmr_on()
         smap.h5 = self.datastore.hdf5
@@ -157,6 +157,7 @@ class EventBasedCalculator(base.HazardCalculator):
                             allargs.append((block, srcfilter, par))
         smap = parallel.Starmap(
             self.build_ruptures.__func__, allargs, h5=self.datastore.hdf5)
+        smap.checkpoint = self.checkpoint
         mon = self.monitor('saving ruptures')
         for dic in smap:
             if dic['calc_times']:
@@ -354,10 +355,11 @@ class EventBasedCalculator(base.HazardCalculator):
         self.datastore.swmr_on()
         iterargs = ((rgetter, srcfilter, self.param)
                     for rgetter in self.gen_rupture_getters())
-        acc = parallel.Starmap(
+        smap = parallel.Starmap(
             self.core_task.__func__, iterargs, h5=self.datastore.hdf5,
-            num_cores=oq.num_cores
-        ).reduce(self.agg_dicts, self.acc0())
+            num_cores=oq.num_cores)
+        smap.checkpoint = self.checkpoint
+        acc = smap.reduce(self.agg_dicts, self.acc0())
 
         if self.indices:
             dset = self.datastore['gmf_data/indices']
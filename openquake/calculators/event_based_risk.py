@@ -91,10 +91,11 @@ def event_based_risk(riskinputs, crmodel, param, monitor):
 
                     # agglosses
                     agglosses[:, l] += ratios * aval
-                    if 'builder' in param:
-                        with mon:  # this is the heaviest part
-                            all_curves[idx, r][loss_type] = (
-                                builder.build_curve(aval, ratios, r))
+                if 'builder' in param:
+                    with mon:  # keeping only the largest losses
+                        all_curves[loss_type][:, r] = (
+                            builder.build_asset_curves(
+                                avalues, loss_ratios, r))
 
             # NB: I could yield the agglosses per output, but then I would
             # have millions of small outputs with big data transfer and slow
@@ -30,7 +30,8 @@ from h5py._hl.group import Group
 import numpy
 from openquake.baselib import config, hdf5
 from openquake.baselib.hdf5 import ArrayWrapper
-from openquake.baselib.general import group_array, get_array, println
+from openquake.baselib.general import (
+    group_array, get_array, println, fast_agg)
 from openquake.baselib.python3compat import encode, decode
 from openquake.hazardlib.calc import filters
 from openquake.hazardlib.gsim.base import ContextMaker
@@ -513,44 +514,35 @@ def extract_task_info(dstore, what):
         yield decode(name), dic[name]
 
 
-def _agg(losses, idxs):
-    shp = losses.shape[1:]
-    if not idxs:
-        # no intersection, return a 0-dim matrix
-        return numpy.zeros((0,) + shp, losses.dtype)
-    # numpy.array wants lists, not sets, hence the sorted below
-    return losses[numpy.array(sorted(idxs))].sum(axis=0)
-
-
 def _filter_agg(assetcol, losses, selected, stats=''):
     # losses is an array of shape (A, ..., R) with A=#assets, R=#realizations
-    aids_by_tag = assetcol.get_aids_by_tag()
-    idxs = set(range(len(assetcol)))
-    tagnames = []
+    tagnames, tags = [], []
     for tag in selected:
         tagname, tagvalue = tag.split('=', 1)
         if tagvalue == '*':
             tagnames.append(tagname)
         else:
-            idxs &= aids_by_tag[tag]
+            tags.append(tag)
     if len(tagnames) > 1:
         raise ValueError('Too many * as tag values in %s' % tagnames)
-    elif not tagnames:  # return an array of shape (..., R)
+    mask = assetcol.get_mask(tags)
+    if not tagnames:  # return an array of shape (..., R)
+        if mask.any():
+            data = losses[mask].sum(axis=0)
+        else:  # no intersection, return a 0-dim matrix
+            data = numpy.zeros((0,) + losses.shape[1:], losses.dtype)
         return ArrayWrapper(
-            _agg(losses, idxs), dict(selected=encode(selected), stats=stats))
+            data, dict(selected=encode(selected), stats=stats))
     else:  # return an array of shape (T, ..., R)
         [tagname] = tagnames
-        _tags = list(assetcol.tagcol.gen_tags(tagname))
-        all_idxs = [idxs & aids_by_tag[t] for t in _tags]
-        # NB: using a generator expression for all_idxs caused issues (?)
-        data, tags = [], []
-        for idxs, tag in zip(all_idxs, _tags):
-            agglosses = _agg(losses, idxs)
-            if len(agglosses):
-                data.append(agglosses)
-                tags.append(tag)
+        tagidxs = assetcol.array[tagname][mask]
+        T = len(getattr(assetcol.tagcol, tagname))
+        data = fast_agg(tagidxs, losses[mask], M=T).astype(losses.dtype)
+        ok = numpy.bincount(tagidxs, minlength=T) > 0  # nonempty tags
+        tags = [tag for tag, nonempty in zip(
+            assetcol.tagcol.gen_tags(tagname), ok) if nonempty]
         return ArrayWrapper(
-            numpy.array(data),
+            data[ok],
             dict(selected=encode(selected), tags=encode(tags), stats=stats))
 
 
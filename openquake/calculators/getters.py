@@ -354,7 +354,8 @@ class GmfGetter(object):
             try:
                 computer = calc.gmf.GmfComputer(
                     ebr, sitecol, self.oqparam.imtls, self.cmaker,
-                    self.oqparam.truncation_level, self.correl_model)
+                    self.oqparam.truncation_level, self.correl_model,
+                    self.oqparam.random_generator)
             except FarAwayRupture:
                 # due to numeric errors, ruptures within the maximum_distance
                 # when written, can be outside when read; I found a case with
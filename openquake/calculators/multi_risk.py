@@ -148,8 +148,8 @@ def wkt2peril(fname, name, sitecol):
                              (fname, wkt.split('(')[0]))
         geom = shapely.wkt.loads(wkt.strip('"'))  # strip quotes
     peril = numpy.zeros(len(sitecol), float)
-    for sid, lon, lat in sitecol.complete.array[['sids', 'lon', 'lat']]:
-        peril[sid] = shapely.geometry.Point(lon, lat).within(geom)
+    arr = sitecol.complete.array
+    peril[arr['sids']] = geo.utils.within(geom, arr['lon'], arr['lat'])
     return peril
 
 
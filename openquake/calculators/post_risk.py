@@ -27,6 +27,7 @@ from openquake.calculators import base
 
 F32 = numpy.float32
 U32 = numpy.uint32
+BLOCKSIZE = 1000000  # number of event losses read at once in post_risk
 
 
 def get_loss_builder(dstore, return_periods=None, loss_dt=None):
@@ -81,17 +82,33 @@ def post_risk(dstore, builder, ses_ratio, rlzi, monitor):
     :returns: a dictionary with keys rlzi, curves, agg_losses
     """
     with dstore:
-        rlzs = dstore['losses_by_event']['rlzi']
-        losses = dstore['losses_by_event'][rlzs == rlzi]['loss']
+        dset = dstore['losses_by_event']
+        rlzs = dset['rlzi']
+        shp = dset.dtype['loss'].shape  # (L, T, ...)
+        tags = tuple(range(2, len(shp) + 1))  # tag axis in (E, L, T...)
+        agg_losses = numpy.zeros(shp, F32)
+        top = scientific.TopLosses(
+            numpy.prod(shp, dtype=int), builder.num_top, shape=shp)
+        tot = scientific.TopLosses(shp[0], builder.num_top)
+        # read the event loss table in blocks, keeping in memory only
+        # the largest losses needed to compute the loss curves
+        for slc in general.gen_slices(0, len(rlzs), BLOCKSIZE):
+            ok, = numpy.where(rlzs[slc] == rlzi)
+            if len(ok) == 0:
+                continue
+            losses = dset[ok[0] + slc.start:ok[-1] + slc.start + 1]
+            losses = losses[losses['rlzi'] == rlzi]['loss']  # (E, L, T...)
+            agg_losses += losses.sum(axis=0)
+            top.update(losses.reshape(len(losses), -1).T)
+            if tags:
+                tot.update(losses.sum(axis=tags).T)
     # aggregate on the events
-    agg_losses = losses.sum(axis=0) * ses_ratio  # shape (L, T, ...)
+    agg_losses *= ses_ratio  # shape (L, T, ...)
     res = dict(rlzi=rlzi, agg_losses=agg_losses)
-    num_axis = len(losses.shape)
-    if num_axis > 2:  # there are tags, compute the totals
-        res['tot_losses'] = agg_losses.sum(axis=tuple(range(1, num_axis - 1)))
-        res['tot_curves'] = builder.build_curves(
-            losses.sum(axis=tuple(range(2, num_axis))), rlzi)
-    res['agg_curves'] = builder.build_curves(losses, rlzi)
+    if tags:  # there are tags, compute the totals
+        res['tot_losses'] = agg_losses.sum(axis=tuple(range(1, len(shp))))
+        res['tot_curves'] = builder.build_curves(tot, rlzi)
+    res['agg_curves'] = builder.build_curves(top, rlzi)
     return res
 
 
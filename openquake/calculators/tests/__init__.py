@@ -31,6 +31,7 @@ from openquake.calculators import base
 from openquake.calculators.export import export
 from openquake.baselib import datastore, general
 from openquake.commonlib import readinput, oqvalidation, writers
+from openquake.commonlib.tests import use_tmp_cachedir
 
 
 NOT_DARWIN = sys.platform != 'darwin'
@@ -98,9 +99,13 @@ def write_csv(dest, data, sep=',', fmt='%.6E', header=None, comment=None,
 class CalculatorTestCase(unittest.TestCase):
     OVERWRITE_EXPECTED = False
     edir = None  # will be set to a temporary directory
+    orig_files = None  # testdir -> names of the files before the test
 
     @classmethod
     def setUpClass(cls):
+        # NB: not done at import time, since this package is imported by
+        # import_all('openquake.calculators') also outside of the tests
+        use_tmp_cachedir()
         builtins.open = check_open
         export.sanity_check = True
         cls.duration = general.AccumDict()
@@ -113,6 +118,10 @@ class CalculatorTestCase(unittest.TestCase):
         """
         self.testdir = os.path.dirname(testfile) if os.path.isfile(testfile) \
             else testfile
+        if self.orig_files is None:
+            self.orig_files = {}
+        if self.testdir not in self.orig_files:
+            self.orig_files[self.testdir] = set(os.listdir(self.testdir))
         inis = [os.path.join(self.testdir, ini) for ini in job_ini.split(',')]
         params = readinput.get_params(inis, **kw)
 
@@ -151,6 +160,16 @@ class CalculatorTestCase(unittest.TestCase):
         self.__class__.duration += duration
         return result
 
+    def tearDown(self):
+        # remove the files unzipped in the test directories, so that
+        # the zipped inputs (exposures, ssmLT.zip) leave no by-products
+        for testdir, fnames in (self.orig_files or {}).items():
+            for fname in set(os.listdir(testdir)) - fnames:
+                path = os.path.join(testdir, fname)
+                if os.path.isfile(path):
+                    os.remove(path)
+        self.orig_files = None
+
     def execute(self, testfile, job_ini):
         """
         Return the result of the calculation without exporting it
@@ -21,7 +21,9 @@ import unittest
 import unittest.mock as mock
 import numpy
 from openquake.baselib import parallel
+from openquake.baselib.general import gettemp
 from openquake.hazardlib import InvalidFile
+from openquake.calculators import base
 from openquake.calculators.views import view
 from openquake.calculators.export import export
 from openquake.calculators.extract import extract
@@ -35,6 +37,10 @@ from openquake.qa_tests_data.classical import (
     case_42, case_43, case_44)
 
 
+def add(values, monitor):
+    return sum(values)
+
+
 class ClassicalTestCase(CalculatorTestCase):
 
     def assert_curves_ok(self, expected, test_dir, delta=None, **kw):
@@ -81,6 +87,46 @@ class ClassicalTestCase(CalculatorTestCase):
             self.run_calc(case_1.__file__, 'job.ini', minimum_magnitude='4.5')
         self.assertEqual(str(ctx.exception), 'All sources were discarded!?')
 
+    def test_resume(self):
+        # a calculation failing in post_execute is resumed by replaying
+        # the results of the classical tasks saved in the checkpoint
+        post_execute = 'openquake.calculators.classical.' \
+            'ClassicalCalculator.post_execute'
+        with mock.patch(post_execute, side_effect=RuntimeError('boom')), \
+                self.assertRaises(RuntimeError):
+            self.run_calc(case_1.__file__, 'job.ini', checkpoint='true')
+        dstore = self.calc.datastore
+        ckpt = dstore.filename[:-5] + '.ckpt'
+        self.assertTrue(os.path.exists(ckpt))
+        dstore.close()
+        os.remove(dstore.filename)
+
+        self.calc = base.calculators(self.calc.oqparam, dstore.calc_id)
+        with self.assertLogs(level='INFO') as cm:
+            self.calc.run(export_dir=self.edir)
+        self.assertIn('Replaying 1 results from the checkpoint',
+                      '\n'.join(cm.output))
+        self.assertFalse(os.path.exists(ckpt))  # removed at the end
+        [fname, _] = export(('hcurves', 'csv'), self.calc.datastore)
+        self.assertEqualFiles('expected/hazard_curve-PGA.csv', fname)
+
+    def test_checkpoint_partition(self):
+        # the results are not replayed if the work is split differently
+        fname = gettemp(suffix='.ckpt')
+        for allargs, expected, replayed in [
+                ([([1, 2],), ([3],)], [3, 3], 0),
+                ([([1],), ([2, 3],)], [1, 5], 0),
+                ([([1],), ([2, 3],)], [1, 5], 2)]:
+            smap = parallel.Starmap(add, allargs, distribute='no')
+            smap.checkpoint = ckpt = base.Checkpoint(fname, 'checksum')
+            with mock.patch('logging.info') as info:
+                self.assertEqual(sorted(smap), expected)
+            ckpt.close()
+            msg = 'Replaying %d results from the checkpoint'
+            num = sum(args[1] for args, _ in info.call_args_list
+                      if args[0] == msg)
+            self.assertEqual(num, replayed)
+
     def test_wrong_smlt(self):
         with self.assertRaises(InvalidFile):
             self.run_calc(case_1.__file__, 'job_wrong.ini')
@@ -79,6 +79,10 @@ class ScenarioRiskTestCase(CalculatorTestCase):
         tbl = extract(self.calc.datastore, 'agg_losses/occupants?taxonomy=*')
         self.assertEqual(tbl.array.shape, (1, 1))  # 1 taxonomy, 1 rlz
 
+        # test agglosses with an unknown tagname
+        with self.assertRaises(ValueError):
+            extract(self.calc.datastore, 'agg_losses/occupants?zone=1')
+
     def test_case_3(self):
         # a4 has a missing cost
         out = self.run_calc(case_3.__file__, 'job.ini', exports='csv')
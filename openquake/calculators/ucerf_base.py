@@ -293,6 +293,32 @@ class UCERFSource(BaseSeismicSource):
                 plane = hdf5[trace + "/RupturePlanes"][:].astype("float64")
                 yield trace, plane
 
+    def get_planar_surfaces(self, ridx):
+        """
+        :param ridx: a list of section indices
+        :returns: the planar surfaces of the given sections
+
+        The surfaces are cached in the original source, since the same
+        sections are shared by many ruptures.
+        """
+        try:
+            cache = self.orig._surfaces
+        except AttributeError:
+            cache = self.orig._surfaces = {}
+        missing = [idx for idx in ridx if idx not in cache]
+        if missing:
+            for idx, (trace, plane) in zip(
+                    missing, self.gen_trace_planes(missing)):
+                # plane has shape (4, 3, n) with the corners in the order
+                # top left, top right, bottom right, bottom left
+                lons, lats, depths = plane[[0, 1, 3, 2]].transpose(1, 2, 0)
+                cache[idx] = ImperfectPlanarSurface.from_corners(
+                    lons, lats, depths)
+        surfaces = []
+        for idx in ridx:
+            surfaces.extend(cache[idx])
+        return surfaces
+
     def get_background_sids(self, src_filter):
         """
         We can apply the filtering of the background sites as a pre-processing
@@ -325,29 +351,10 @@ class UCERFSource(BaseSeismicSource):
         trt = self.tectonic_region_type
         ridx = self.get_ridx(iloc)
         mag = self.orig.mags[iloc]
-        surface_set = []
         indices = src_filter.get_indices(self, ridx, mag)
         if len(indices) == 0:
             return None
-        for trace, plane in self.gen_trace_planes(ridx):
-            # build simple fault surface
-            for jloc in range(0, plane.shape[2]):
-                top_left = Point(
-                    plane[0, 0, jloc], plane[0, 1, jloc], plane[0, 2, jloc])
-                top_right = Point(
-                    plane[1, 0, jloc], plane[1, 1, jloc], plane[1, 2, jloc])
-                bottom_right = Point(
-                    plane[2, 0, jloc], plane[2, 1, jloc], plane[2, 2, jloc])
-                bottom_left = Point(
-                    plane[3, 0, jloc], plane[3, 1, jloc], plane[3, 2, jloc])
-                try:
-                    surface_set.append(
-                        ImperfectPlanarSurface.from_corner_points(
-                            top_left, top_right, bottom_right, bottom_left))
-                except ValueError as err:
-                    raise ValueError(err, trace, top_left, top_right,
-                                     bottom_right, bottom_left)
-
+        surface_set = self.get_planar_surfaces(ridx)
         rupture = ParametricProbabilisticRupture(
             mag, self.orig.rake[iloc], trt,
             surface_set[len(surface_set) // 2].get_middle_point(),
@@ -73,6 +73,47 @@ def run_job(job_ini, log_level='info', log_file=None, exports='',
     return job_id
 
 
+def resume_job(job_id, log_level='info', log_file=None, exports='',
+               username=getpass.getuser()):
+    """
+    Resume a failed or aborted calculation saved with `checkpoint = true`
+    by running it again with the same ID: the tasks completed before the
+    failure are not recomputed, their results are read from the checkpoint.
+
+    :param job_id: ID of the calculation to resume
+    """
+    job = logs.dbcmd('get_job', job_id, username)
+    if job.status not in ('failed', 'aborted'):
+        sys.exit('Job %d is %s, only failed or aborted jobs can be resumed' %
+                 (job_id, job.status))
+    if not os.path.exists(job.ds_calc_dir + '.ckpt'):
+        sys.exit('Job %d has no checkpoint, was it run with '
+                 'checkpoint = true?' % job_id)
+    with datastore.read(job.ds_calc_dir + '.hdf5') as dstore:
+        job_ini = dstore['oqparam'].inputs['job_ini']
+    hc_id = job.hazard_calculation_id
+    with logs.handle(job_id, log_level, log_file):
+        logging.info('Resuming job #%d', job_id)
+        oqparam = eng.job_from_file(job_ini, job_id, username,
+                                    hazard_calculation_id=hc_id)
+        # the outputs are recomputed from scratch, except the task results;
+        # the failed datastore is kept aside until the new run succeeds
+        fname = job.ds_calc_dir + '.hdf5'
+        os.rename(fname, fname + '.bak')
+        logs.dbcmd('set_status', job_id, 'executing')
+        try:
+            eng.run_calc(job_id, oqparam, exports,
+                         hazard_calculation_id=hc_id, username=username)
+        finally:
+            if logs.dbcmd('get_job', job_id, username).status == 'complete':
+                os.remove(fname + '.bak')
+            else:  # restore the failed datastore, to be able to resume it
+                os.replace(fname + '.bak', fname)
+        for line in logs.dbcmd('list_outputs', job_id, False):
+            safeprint(line)
+    return job_id
+
+
 def run_tile(job_ini, sites_slice):
     """
     Used in tiling calculations
@@ -133,7 +174,7 @@ def engine(log_file, no_distribute, yes, config_file, make_html_report,
            delete_calculation, delete_uncompleted_calculations,
            hazard_calculation_id, list_outputs, show_log,
            export_output, export_outputs, exports='',
-           log_level='info', reuse_hazard=False):
+           log_level='info', reuse_hazard=False, resume=None):
     """
     Run a calculation using the traditional command line API
     """
@@ -145,7 +186,8 @@ def engine(log_file, no_distribute, yes, config_file, make_html_report,
         config.read(os.path.abspath(os.path.expanduser(config_file)),
                     soft_mem_limit=int, hard_mem_limit=int, port=int,
                     multi_user=valid.boolean, multi_node=valid.boolean,
-                    serialize_jobs=valid.boolean, strict=valid.boolean,
+                    serialize_jobs=valid.boolean,
+                    persistent_workers=valid.boolean, strict=valid.boolean,
                     code=exec)
 
     if no_distribute:
@@ -210,6 +252,10 @@ def engine(log_file, no_distribute, yes, config_file, make_html_report,
                              exports, hazard_calculation_id=hc_id)
             if not hc_id:  # use the first calculation as base for the others
                 hc_id = job_id
+    elif resume is not None:
+        log_file = os.path.expanduser(log_file) \
+            if log_file is not None else None
+        resume_job(get_job_id(resume), log_level, log_file, exports)
     # hazard
     elif list_hazard_calculations:
         for line in logs.dbcmd(
@@ -309,3 +355,5 @@ engine.opt('exports', 'Comma-separated string specifing the export formats, '
 engine.opt('log_level', 'Defaults to "info"',
            choices=['debug', 'info', 'warn', 'error', 'critical'])
 engine.flg('reuse_hazard', 'Reuse the event based hazard if available')
+engine._add('resume', '--resume', help='Resume a failed calculation '
+            'run with checkpoint = true', metavar='CALCULATION_ID', type=int)
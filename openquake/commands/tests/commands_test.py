@@ -30,6 +30,7 @@ from openquake.baselib.datastore import read
 from openquake.baselib.hdf5 import read_csv
 from openquake import commonlib
 from openquake.commonlib.readinput import get_oqparam
+from openquake.commonlib.tests import use_tmp_cachedir
 from openquake.commands.info import info
 from openquake.commands.tidy import tidy
 from openquake.commands.show import show
@@ -59,6 +60,8 @@ from openquake.server.tests import data as test_data
 
 DATADIR = os.path.join(commonlib.__path__[0], 'tests', 'data')
 
+use_tmp_cachedir()
+
 
 class Print(object):
     def __init__(self):
@@ -348,9 +351,12 @@ class ZipTestCase(unittest.TestCase):
         shutil.rmtree(dtemp)
 
     def test_zip_ebr(self):
-        # this is a case with an exposure.csv
-        ini = os.path.join(os.path.dirname(case_eb.__file__), 'job_eb.ini')
+        # this is a case with an exposure.csv; the directory is copied
+        # since the zipped exposure is unzipped next to the job.ini
         dtemp = tempfile.mkdtemp()
+        inp = os.path.join(dtemp, 'inp')
+        shutil.copytree(os.path.dirname(case_eb.__file__), inp)
+        ini = os.path.join(inp, 'job_eb.ini')
         xzip = os.path.join(dtemp, 'x.zip')
         zip_cmd(ini, xzip, None)
         names = sorted(zipfile.ZipFile(xzip).namelist())
@@ -432,9 +438,12 @@ class DbTestCase(unittest.TestCase):
 class EngineRunJobTestCase(unittest.TestCase):
     def test_ebr(self):
         # test a single case of `run_job`, but it is the most complex one,
-        # event based risk with post processing
-        job_ini = os.path.join(
-            os.path.dirname(case_master.__file__), 'job.ini')
+        # event based risk with post processing; the directory is copied
+        # since the zipped source model logic tree is unzipped in place
+        dtemp = tempfile.mkdtemp()
+        inp = os.path.join(dtemp, 'inp')
+        shutil.copytree(os.path.dirname(case_master.__file__), inp)
+        job_ini = os.path.join(inp, 'job.ini')
         with Print.patch() as p:
             job_id = run_job(job_ini, log_level='error')
         self.assertIn('id | name', str(p))
@@ -449,6 +458,7 @@ class EngineRunJobTestCase(unittest.TestCase):
             self.assertIn('compute_gmfs', task_info)
             job_info = view('job_info', dstore)
             self.assertIn('compute_gmfs', job_info)
+        shutil.rmtree(dtemp)
 
     def test_smart_run(self):
         # test smart_run with gmf_ebrisk, since it was breaking
@@ -33,8 +33,8 @@ def workers(cmd):
             getpass.getuser() != 'openquake'):
         sys.exit('oq workers only works in single user mode')
 
-    master = workerpool.WorkerMaster(config.dbserver.host,
-                                     **config.zworkers)
+    master = workerpool.WorkerMaster(
+        **workerpool.get_zworkers(master_host=config.dbserver.host))
     pprint(getattr(master, cmd)())
 
 
@@ -21,6 +21,10 @@ Set up some system-wide loggers
 import os.path
 import socket
 import logging
+import threading
+import queue
+import time
+import sys
 from datetime import datetime
 from contextlib import contextmanager
 from openquake.baselib import zeromq, config, parallel, datastore
@@ -34,23 +38,70 @@ LEVELS = {'debug': logging.DEBUG,
 LOG = logging.getLogger()
 
 DBSERVER_PORT = int(os.environ.get('OQ_DBSERVER_PORT') or config.dbserver.port)
+LOG_BATCH_SIZE = 100  # max number of log records sent in a single command
+LOG_FLUSH_TIME = 1  # max number of seconds a log record is kept in memory
+
+
+class DbClient(object):
+    """
+    A client to the DbServer keeping open a REQ socket, so that it can be
+    reused for all the commands sent by the same thread.
+
+    :param end_point: zmq end point of the DbServer
+    """
+    def __init__(self, end_point):
+        self.sock = zeromq.Socket(end_point, zeromq.zmq.REQ, 'connect')
+        self.sock.__enter__()
+
+    def __call__(self, action, *args):
+        res = self.sock.send((action,) + args)
+        if isinstance(res, parallel.Result):
+            return res.get()
+        return res
+
+    def close(self):
+        """
+        Close the underlying socket
+        """
+        if hasattr(self.sock, 'zsocket'):
+            self.sock.__exit__(None, None, None)
+
+
+_dbclients = {}  # (pid, thread ID, host) -> DbClient
 
 
 def dbcmd(action, *args):
     """
-    A dispatcher to the database server.
+    A dispatcher to the database server. The connection is kept open
+    and reused by the following calls in the same process and thread.
 
     :param string action: database action to perform
     :param tuple args: arguments
     """
-    host = socket.gethostbyname(config.dbserver.host)
-    sock = zeromq.Socket(
-        'tcp://%s:%s' % (host, DBSERVER_PORT), zeromq.zmq.REQ, 'connect')
-    with sock:
-        res = sock.send((action,) + args)
-        if isinstance(res, parallel.Result):
-            return res.get()
-    return res
+    key = os.getpid(), threading.get_ident(), config.dbserver.host
+    try:
+        client = _dbclients[key]
+    except KeyError:
+        host = socket.gethostbyname(config.dbserver.host)
+        client = _dbclients[key] = DbClient(
+            'tcp://%s:%s' % (host, DBSERVER_PORT))
+    try:
+        return client(action, *args)
+    except BaseException:
+        # the REQ socket can be in an invalid state, so it is discarded
+        del _dbclients[key]
+        client.close()
+        raise
+
+
+def close_dbclient():
+    """
+    Close the connection to the DbServer opened by the current thread, if any
+    """
+    key = os.getpid(), threading.get_ident(), config.dbserver.host
+    client = _dbclients.pop(key, None)
+    if client is not None:
+        client.close()
 
 
 def touch_log_file(log_file):
@@ -102,17 +153,67 @@ class LogFileHandler(logging.FileHandler):
 
 class LogDatabaseHandler(logging.Handler):
     """
-    Log stream handler
+    Log database handler. The records are collected in a queue and sent
+    to the DbServer in batches by a background thread; a batch is sent
+    when it contains `batch_size` records, when the oldest record is
+    older than `flush_time` seconds, or when the handler is closed.
     """
-    def __init__(self, job_id):
+    def __init__(self, job_id, batch_size=LOG_BATCH_SIZE,
+                 flush_time=LOG_FLUSH_TIME):
         super().__init__()
         self.job_id = job_id
+        self.batch_size = batch_size
+        self.flush_time = flush_time
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._send, daemon=True)
+        self.thread.start()
 
     def emit(self, record):  # pylint: disable=E0202
         if record.levelno >= logging.INFO:
-            dbcmd('log', self.job_id, datetime.utcnow(), record.levelname,
-                  '%s/%s' % (record.processName, record.process),
-                  record.getMessage())
+            self.queue.put((self.job_id, datetime.utcnow(), record.levelname,
+                            '%s/%s' % (record.processName, record.process),
+                            record.getMessage()))
+
+    def _send(self):
+        # runs in the background thread; the connection to the DbServer
+        # is closed at the end, since the thread dies with the handler
+        try:
+            self._send_batches()
+        finally:
+            close_dbclient()
+
+    def _send_batches(self):
+        running = True
+        while running:
+            rec = self.queue.get()  # wait for the first record
+            if rec is None:  # sent by .close
+                break
+            batch = [rec]
+            deadline = time.time() + self.flush_time
+            while len(batch) < self.batch_size:
+                try:
+                    rec = self.queue.get(
+                        timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if rec is None:  # sent by .close
+                    running = False
+                    break
+                batch.append(rec)
+            try:
+                dbcmd('log_records', batch)
+            except Exception as exc:
+                sys.stderr.write('Could not save %d log records: %s\n' %
+                                 (len(batch), exc))
+
+    def close(self):
+        """
+        Send the remaining records and stop the background thread
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        super().close()
 
 
 @contextmanager
@@ -147,6 +248,7 @@ def handle(job_id, log_level='info', log_file=None):
             logging.root.warn('The log file %s is empty!?' % log_file)
         for handler in handlers:
             logging.root.removeHandler(handler)
+            handler.close()
 
 
 def get_last_calc_id(username=None):
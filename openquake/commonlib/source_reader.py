@@ -16,19 +16,24 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 import copy
+import glob
 import random
+import shutil
 import os.path
+import tempfile
 import pickle
 import functools
 import collections
 import logging
+import hashlib
 import zlib
 import numpy
 
-from openquake.baselib import hdf5, parallel
-from openquake.hazardlib import nrml, sourceconverter, calc
+from openquake.baselib import hdf5, parallel, datastore, __version__
+from openquake.hazardlib import nrml, sourceconverter, calc, source
 
 TWO16 = 2 ** 16  # 65,536
+BLOCKSIZE = 16 * 1024 ** 2  # source model files are hashed in 16 MB blocks
 source_info_dt = numpy.dtype([
     ('sm_id', numpy.uint16),           # 0
     ('grp_id', numpy.uint16),          # 1
@@ -84,6 +89,70 @@ def check_nonparametric_sources(fname, smodel, investigation_time):
     return np
 
 
+def get_checksum(src):
+    """
+    :returns: a 32 bit checksum of the parameters of the source
+    """
+    dic = {k: v for k, v in vars(src).items()
+           if k not in ('id', 'src_group_id', 'checksum')}
+    return zlib.adler32(pickle.dumps(dic, pickle.HIGHEST_PROTOCOL))
+
+
+@functools.lru_cache()
+def code_fingerprint():
+    """
+    :returns: the modification times of the modules converting the sources,
+              so that the cached source models are invalidated by a change
+              of the code even when the engine version is the same
+    """
+    fnames = [sourceconverter.__file__, nrml.__file__] + glob.glob(
+        os.path.join(os.path.dirname(source.__file__), '*.py'))
+    return [os.path.getmtime(fname) for fname in sorted(fnames)]
+
+
+def get_cachefile(fname, converter, cachedir):
+    """
+    :param fname: the full pathname of a source model file
+    :param converter: a SourceConverter instance
+    :param cachedir: the directory of the cache
+    :returns: the path of the file where the converted source model is cached,
+              depending on the content of the file, on the converter and on
+              the code
+    """
+    params = sorted((k, v) for k, v in vars(converter).items()
+                    if k != 'fname')
+    sha = hashlib.sha1(('%s %s %s' % (
+        __version__, code_fingerprint(), params)).encode('utf8'))
+    with open(fname, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCKSIZE), b''):
+            sha.update(block)
+    return os.path.join(cachedir, 'source_model-%s.pik' % sha.hexdigest())
+
+
+def convert_source_model(fname, converter, monitor):
+    """
+    :returns: the converted source model, with the checksums of the sources
+    """
+    [sm] = nrml.read_source_models([fname], converter, monitor)
+    for sg in sm:
+        for src in sg:
+            src.checksum = get_checksum(src)
+    return sm
+
+
+def cache_source_model(fname, converter, cachefile, monitor):
+    """
+    Convert a source model file and store it in the cachefile in pickle
+    format, together with the checksums of the sources.
+    """
+    sm = convert_source_model(fname, converter, monitor)
+    tmpfile = cachefile + '.%d.tmp' % os.getpid()
+    with open(tmpfile, 'wb') as f:
+        pickle.dump(sm, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmpfile, cachefile)  # atomic, even with concurrent jobs
+    return {}
+
+
 class SourceReader(object):
     """
     :param converter: a SourceConverter instance
@@ -121,16 +190,24 @@ class SourceReader(object):
             if hasattr(newgroup, 'changed') and newgroup.changed.any():
                 newsm.changes += newgroup.changed.sum()
                 for src, changed in zip(newgroup, newgroup.changed):
-                    # redoing count_ruptures can be slow
+                    # redoing count_ruptures can be slow; the checksum
+                    # is updated here, before a possible sampling
                     if changed:
                         src.num_ruptures = src.count_ruptures()
+                        src.checksum = get_checksum(src)
         return newsm
 
-    def __call__(self, ltmodel, apply_unc, fname, fileno, monitor):
+    def __call__(self, ltmodel, apply_unc, fname, cachefile, fileno,
+                 monitor):
         fname_hits = collections.Counter()  # fname -> number of calls
         mags = set()
         src_groups = []
-        [sm] = nrml.read_source_models([fname], self.converter, monitor)
+        try:
+            with open(cachefile, 'rb') as f:
+                sm = pickle.load(f)
+        except FileNotFoundError:  # removed by the cleanup of another job
+            sm = convert_source_model(fname, self.converter, monitor)
+        sm.fname = fname
         newsm = self.makesm(fname, sm, apply_unc)
         fname_hits[fname] += 1
         for sg in newsm:
@@ -146,10 +223,6 @@ class SourceReader(object):
                     srcmags = ['%.3f' % item[0] for item in
                                src.get_annual_occurrence_rates()]
                 mags.update(srcmags)
-                dic = {k: v for k, v in vars(src).items()
-                       if k != 'id' and k != 'src_group_id'}
-                src.checksum = zlib.adler32(
-                    pickle.dumps(dic, pickle.HIGHEST_PROTOCOL))
                 sg.info[i] = (ltmodel.ordinal, 0, src.source_id,
                               src.code, src.num_ruptures, 0, 0, 0,
                               src.checksum, src.wkt())
@@ -202,21 +275,50 @@ def get_ltmodels(oq, gsim_lt, source_model_lt, h5=None):
             hdf5.extend(sources, numpy.array(data, source_info_dt))
         return lt_models
 
-    logging.info('Reading the source model(s) in parallel')
+    # each source model file is converted only once and cached on disk,
+    # so that it is not converted again for the other logic tree branches
+    # nor in the next calculations with the same file and parameters;
+    # if the cache is disabled, a temporary directory is used instead
+    cachedir = datastore.get_cachedir()
+    tmpdir = None if cachedir else tempfile.mkdtemp(
+        prefix='source_models-', dir=datastore.get_datadir())
     allargs = []
     fileno = 0
+    cachefile = {}  # fname -> cachefile
     for ltm in lt_models:
         apply_unc = functools.partial(
             source_model_lt.apply_uncertainties, ltm.path)
         for name in ltm.names.split():
             fname = os.path.abspath(os.path.join(smlt_dir, name))
-            allargs.append((ltm, apply_unc, fname, fileno))
+            if fname not in cachefile:
+                cachefile[fname] = get_cachefile(
+                    fname, converter, cachedir or tmpdir)
+            allargs.append((ltm, apply_unc, fname, cachefile[fname], fileno))
             fileno += 1
-    smap = parallel.Starmap(
-        SourceReader(converter, smlt_dir, h5),
-        allargs, distribute=dist, h5=h5 if h5 else None)
-    # NB: h5 is None in logictree_test.py
-    return _store_results(smap, lt_models, source_model_lt, gsim_lt, oq, h5)
+    tocache = []
+    for fname, cfile in cachefile.items():
+        if os.path.exists(cfile):
+            os.utime(cfile)  # mark as recently used
+        else:
+            tocache.append((fname, converter, cfile))
+    try:
+        if tocache:
+            logging.info('Converting %d source model file(s) in parallel',
+                         len(tocache))
+            parallel.Starmap(cache_source_model, tocache, distribute=dist,
+                             h5=h5 if h5 else None).reduce()
+        logging.info('Reading the source model(s) in parallel')
+        smap = parallel.Starmap(
+            SourceReader(converter, smlt_dir, h5),
+            allargs, distribute=dist, h5=h5 if h5 else None)
+        # NB: h5 is None in logictree_test.py
+        return _store_results(
+            smap, lt_models, source_model_lt, gsim_lt, oq, h5)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+        elif tocache:
+            datastore.clean_cachedir(cachedir)
 
 
 def _store_results(smap, lt_models, source_model_lt, gsim_lt, oq, h5):
@@ -17,9 +17,25 @@
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import atexit
+import shutil
+import tempfile
+from openquake.baselib import config
 from openquake.commonlib import readinput
 
 DATADIR = os.path.join(os.path.dirname(__file__), 'data')
+CACHEDIR = []  # temporary cache directory shared by all the tests
+
+
+def use_tmp_cachedir():
+    """
+    Cache the parsed inputs in a temporary directory removed at exit,
+    instead of $OQ_DATADIR/cache; calling it again has no effect
+    """
+    if not CACHEDIR:
+        CACHEDIR.append(tempfile.mkdtemp(prefix='oqcache-'))
+        atexit.register(shutil.rmtree, CACHEDIR[0], True)
+    config.directory['cache_dir'] = CACHEDIR[0]
 
 
 class DifferentFiles(Exception):
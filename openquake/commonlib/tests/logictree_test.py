@@ -21,6 +21,8 @@ Tests for python logic tree processor.
 """
 
 import os
+import shutil
+import tempfile
 import unittest.mock as mock
 import codecs
 import unittest
@@ -31,6 +33,7 @@ from xml.parsers.expat import ExpatError
 from copy import deepcopy
 
 import openquake.hazardlib
+from openquake.baselib import config
 from openquake.hazardlib import geo
 from openquake.baselib.general import gettemp
 from openquake.hazardlib.gsim import registry
@@ -44,6 +47,8 @@ from openquake.commonlib.logictree import SourceModelLogicTree, GsimLogicTree
 
 DATADIR = os.path.join(os.path.dirname(__file__), 'data')
 
+tests.use_tmp_cachedir()
+
 
 class _TestableSourceModelLogicTree(logictree.SourceModelLogicTree):
     def __init__(self, filename, files, basepath):
@@ -2294,6 +2299,28 @@ class LogicTreeSourceSpecificUncertaintyTest(unittest.TestCase):
                     msg = "Wrong mmax value assigned to source 'a1'"
                     self.assertIn(src.mfd.max_mag, mags, msg)
 
+    def test_cache(self):
+        path = os.path.join(DATADIR, 'source_specific_uncertainty')
+        oqparam = readinput.get_oqparam(os.path.join(path, 'job.ini'))
+        ssc_lt = SourceModelLogicTree(os.path.join(path, 'sscLt.xml'))
+        gs_lt = GsimLogicTree(os.path.join(path, 'gmcLt.xml'))
+        cachedir = tempfile.mkdtemp()
+        with mock.patch.dict(config.directory, cache_dir=cachedir):
+            ltms = get_ltmodels(oqparam, gs_lt, ssc_lt)
+        fnames = os.listdir(cachedir)  # one per source model file
+        self.assertEqual(len(fnames), 3)
+        self.assertTrue(all(f.startswith('source_model-') for f in fnames))
+        # with cache_size = 0 the converted source models are not kept
+        shutil.rmtree(cachedir)
+        with mock.patch.dict(config.directory, cache_dir=cachedir,
+                             cache_size=0):
+            ltms0 = get_ltmodels(oqparam, gs_lt, ssc_lt)
+        self.assertFalse(os.path.exists(cachedir))
+        self.assertEqual([src.checksum for ltm in ltms0
+                          for src in ltm.src_groups[0]],
+                         [src.checksum for ltm in ltms
+                          for src in ltm.src_groups[0]])
+
     def test_smlt_bad(self):
         # apply to a source that does not exist in the given branch
         path = os.path.join(DATADIR, 'source_specific_uncertainty')
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2019 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import time
+import logging
+import unittest
+import unittest.mock as mock
+
+from openquake.commonlib import logs
+
+
+class LogDatabaseHandlerTestCase(unittest.TestCase):
+    def test_batches(self):
+        batches = []
+
+        def dbcmd(action, records):
+            self.assertEqual(action, 'log_records')
+            batches.append(records)
+        logger = logging.getLogger('logs_test')
+        logger.setLevel(logging.DEBUG)
+        with mock.patch('openquake.commonlib.logs.dbcmd', dbcmd):
+            handler = logs.LogDatabaseHandler(42, batch_size=3,
+                                              flush_time=60)
+            logger.addHandler(handler)
+            try:
+                for i in range(7):
+                    logger.info('message #%d', i)
+                logger.debug('not saved')
+            finally:
+                logger.removeHandler(handler)
+                handler.close()  # flush the remaining record
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        job_id, _timestamp, level, _process, msg = batches[-1][0]
+        self.assertEqual((job_id, level, msg), (42, 'INFO', 'message #6'))
+
+    def test_flush_time(self):
+        batches = []
+        with mock.patch('openquake.commonlib.logs.dbcmd',
+                        lambda action, records: batches.append(records)):
+            handler = logs.LogDatabaseHandler(42, flush_time=0)
+            handler.emit(logging.makeLogRecord(
+                dict(levelno=logging.INFO, levelname='INFO', msg='one')))
+            time.sleep(.5)
+            self.assertEqual(len(batches), 1)  # sent before closing
+            handler.close()
+
+    def test_close_dbclient(self):
+        # the connection opened by the background thread must be closed
+        clients = []
+
+        class FakeDbClient(object):
+            def __init__(self, end_point):
+                self.closed = False
+                clients.append(self)
+
+            def __call__(self, action, *args):
+                pass
+
+            def close(self):
+                self.closed = True
+
+        with mock.patch('openquake.commonlib.logs.DbClient', FakeDbClient):
+            handler = logs.LogDatabaseHandler(42, flush_time=0)
+            handler.emit(logging.makeLogRecord(
+                dict(levelno=logging.INFO, levelname='INFO', msg='one')))
+            handler.close()
+        [client] = clients
+        self.assertTrue(client.closed)
+        self.assertNotIn(client, logs._dbclients.values())
@@ -17,6 +17,7 @@
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import shutil
 import tempfile
 import unittest.mock as mock
 import unittest
@@ -27,6 +28,7 @@ from openquake.hazardlib import InvalidFile
 from openquake.risklib import asset
 from openquake.risklib.riskmodels import ValidationError
 from openquake.commonlib import readinput
+from openquake.commonlib.tests import use_tmp_cachedir
 from openquake.qa_tests_data.classical import case_1, case_2, case_21
 from openquake.qa_tests_data.event_based import case_16
 from openquake.qa_tests_data.event_based_risk import case_caracas
@@ -35,6 +37,8 @@ from openquake.qa_tests_data.event_based_risk import case_caracas
 TMP = tempfile.gettempdir()
 DATADIR = os.path.join(os.path.dirname(__file__), 'data')
 
+use_tmp_cachedir()
+
 
 def getparams(oq):
     return {k: v for k, v in vars(oq).items() if not k.startswith('_')}
@@ -310,6 +314,17 @@ class ExposureTestCase(unittest.TestCase):
         self.assertEqual([tuple(ct) for ct in exp.cost_types],
                          [('structural', 'per_asset', 'USD')])
 
+    def test_read_csv_bom(self):
+        # the BOM is stripped before looking for the comments
+        fname = general.gettemp(
+            '\ufeff#,generated_by="excel"\nid,lon,lat,taxonomy,number\n'
+            'a1,10.0,45.0,RC,2\na2,10.1,45.1,W,3\n', suffix='.csv')
+        array = asset.read_csv(
+            fname, {'lon': float, 'lat': float, 'number': float,
+                    None: object}, {})
+        self.assertEqual(list(array['id']), ['a1', 'a2'])
+        self.assertEqual(list(array['number']), [2, 3])
+
     def test_missing_number(self):
         raise unittest.SkipTest
         oqparam = mock.Mock()
@@ -429,9 +444,13 @@ exposure_file = %s''' % os.path.basename(self.exposure4))
 class GetCompositeSourceModelTestCase(unittest.TestCase):
 
     def test_reduce_source_model(self):
-        case2 = os.path.dirname(case_2.__file__)
+        # work on a copy, since the source models are backed up and
+        # rewritten in place
+        case2 = os.path.join(tempfile.mkdtemp(), 'case_2')
+        shutil.copytree(os.path.dirname(case_2.__file__), case2)
         smlt = os.path.join(case2, 'source_model_logic_tree.xml')
         readinput.reduce_source_model(smlt, [], False)
+        shutil.rmtree(os.path.dirname(case2))
 
     def test_wrong_trts(self):
         # invalid TRT in job.ini [reqv]
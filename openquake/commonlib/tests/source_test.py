@@ -31,6 +31,8 @@ from openquake.commonlib import tests, readinput
 from openquake.commonlib.source import CompositionInfo
 from openquake.hazardlib import nrml
 
+tests.use_tmp_cachedir()
+
 # directory where the example files are
 NRML_DIR = os.path.dirname(htests.__file__)
 
@@ -70,5 +70,8 @@ else:
     worker_prefetch_multiplier = 1
     result_cache_max = 1
     task_ignore_result = True
+    # the tasks send their results via zmq, so the only errors stored in
+    # the backend are the WorkerLostErrors, used to resubmit the lost tasks
+    task_store_errors_even_if_ignored = True
 
     imports = ["openquake.baselib.parallel", "openquake.hazardlib.contexts"]
@@ -38,7 +38,7 @@ except ImportError:
 from urllib.request import urlopen, Request
 from openquake.baselib.python3compat import decode
 from openquake.baselib import (
-    parallel, general, config, __version__, zeromq as z)
+    parallel, general, config, workerpool, __version__, zeromq as z)
 from openquake.commonlib.oqvalidation import OqParam
 from openquake.commonlib import readinput
 from openquake.calculators import base, views, export
@@ -303,6 +303,25 @@ def poll_queue(job_id, pid, poll_time):
     logs.dbcmd('update_job', job_id, {'status': 'executing', 'pid': _PID})
 
 
+def start_persistent_workers():
+    """
+    Start the long-lived local workers managed by the DbServer, if not
+    already running, and wait for them to go up.
+
+    :returns: True if the tasks can be sent to the local workers
+    """
+    try:
+        logs.dbcmd('zmq_start')  # start the workers, if not running
+    except RuntimeError:
+        # the DbServer was started with OQ_DISTRIBUTE != processpool
+        # or with persistent_workers = false
+        logs.LOG.warning('The DbServer is not managing persistent workers, '
+                         'spawning a new process pool')
+        return False
+    logs.dbcmd('zmq_wait')  # wait for them to go up
+    return True
+
+
 def run_calc(job_id, oqparam, exports, hazard_calculation_id=None, **kw):
     """
     Run a calculation.
@@ -338,8 +357,10 @@ def run_calc(job_id, oqparam, exports, hazard_calculation_id=None, **kw):
             logs.LOG.warning('Using %d cores on %s',
                              parallel.Starmap.num_cores, platform.node())
         if OQ_DISTRIBUTE == 'zmq' and config.zworkers['host_cores']:
-            logs.dbcmd('zmq_start')  # start the zworkers
+            logs.dbcmd('zmq_start')  # start the zworkers, if not running
             logs.dbcmd('zmq_wait')  # wait for them to go up
+        elif workerpool.persistent_workers():
+            parallel.Starmap.persistent = start_persistent_workers()
         set_concurrent_tasks_default(calc)
         t0 = time.time()
         calc.run(exports=exports,
@@ -369,8 +390,12 @@ def run_calc(job_id, oqparam, exports, hazard_calculation_id=None, **kw):
         # if there was an error in the calculation, this part may fail;
         # in such a situation, we simply log the cleanup error without
         # taking further action, so that the real error can propagate
-        if OQ_DISTRIBUTE == 'zmq' and config.zworkers['host_cores']:
-            logs.dbcmd('zmq_stop')  # stop the zworkers
+        if (OQ_DISTRIBUTE == 'zmq' and config.zworkers['host_cores'] or
+                parallel.Starmap.persistent):
+            # the workers are kept alive for the next calculations,
+            # but the cache of this calculation is removed
+            logs.dbcmd('zmq_clear_cache', calc.datastore.tempname)
+        parallel.clear_cache(calc.datastore.tempname)
         try:
             if OQ_DISTRIBUTE.startswith('celery'):
                 celery_cleanup(TERMINATE)
@@ -23,12 +23,14 @@ import collections.abc
 from contextlib import contextmanager
 import numpy
 
-from openquake.baselib import hdf5
+from openquake.baselib import hdf5, parallel
+from openquake.baselib.general import gen_slices
 from openquake.baselib.python3compat import raise_
 from openquake.hazardlib.geo.utils import (
     KM_TO_DEGREES, angular_distance, fix_lon, get_bounding_box, BBoxError)
 
 MAX_DISTANCE = 2000  # km, ultra big distance used if there is no filter
+POINTS_PER_BLOCK = 1000  # used when filtering multi point sources
 src_group_id = operator.attrgetter('src_group_id')
 
 
@@ -76,10 +78,19 @@ class IntegrationDistance(collections.abc.Mapping):
     400.0
     >>> maxdist('Some TRT', mag=2.5)
     400.0
+
+    It is also possible to give a list of pairs (magnitude, distance),
+    in which case the distance is interpolated linearly in magnitude:
+
+    >>> maxdist = IntegrationDistance({'default': [(5, 100), (7, 300)]})
+    >>> maxdist('default', mag=6)
+    200.0
+    >>> maxdist('default')  # maximum distance
+    300
     """
     def __init__(self, dic):
         self.dic = {}  # TRT -> float or list of pairs
-        self.magdist = {}  # TRT -> (magnitudes, distances), set by the engine
+        self.magdist = {}  # TRT -> {magstring: distance}
         for trt, value in dic.items():
             if isinstance(value, (list, numpy.ndarray)):
                 # assume a list of pairs (magstring, dist)
@@ -89,8 +100,15 @@ class IntegrationDistance(collections.abc.Mapping):
                 self.dic[trt] = float(value)
 
     def __call__(self, trt, mag=None):
-        if mag and trt in self.magdist:
-            return self.magdist[trt]['%.3f' % mag]
+        magdist = self.magdist.get(trt)
+        if mag and magdist:
+            try:
+                return magdist['%.3f' % mag]
+            except KeyError:  # interpolate
+                mags = sorted(magdist, key=float)
+                return float(numpy.interp(
+                    mag, [float(m) for m in mags],
+                    [magdist[m] for m in mags]))
         elif not self.dic:
             return MAX_DISTANCE
         return getdefault(self.dic, trt)
@@ -122,7 +140,7 @@ class IntegrationDistance(collections.abc.Mapping):
         :returns: a bounding box (min_lon, min_lat, max_lon, max_lat)
         """
         mag = src.get_min_max_mag()[1]
-        maxdist = self(src.tectonic_region_type)  # TODO: use mag here
+        maxdist = self(src.tectonic_region_type, mag)
         bbox = get_bounding_box(src, maxdist)
         return (fix_lon(bbox[0]), bbox[1], fix_lon(bbox[2]), bbox[3])
 
@@ -217,6 +235,11 @@ def split_sources(srcs):
     return sources, split_time
 
 
+def _read_sitecol(fname):
+    with hdf5.File(fname, 'r') as h5:
+        return h5.get('sitecol')
+
+
 class SourceFilter(object):
     """
     Filter objects have a .filter method yielding filtered sources,
@@ -261,8 +284,10 @@ class SourceFilter(object):
             return
         elif not os.path.exists(self.filename):
             raise FileNotFoundError('%s: shared_dir issue?' % self.filename)
-        with hdf5.File(self.filename, 'r') as h5:
-            self.__dict__['sitecol'] = sc = h5.get('sitecol')
+        # the site collection is kept in the worker between tasks
+        mtime = os.path.getmtime(self.filename)
+        self.__dict__['sitecol'] = sc = parallel.cached(
+            self.filename, ('sitecol', mtime), _read_sitecol, self.filename)
         return sc
 
     def get_rectangle(self, src):
@@ -329,6 +354,30 @@ class SourceFilter(object):
         bb = bbox[0] - a2, bbox[1] - a1, bbox[2] + a2, bbox[3] + a1
         return self.sitecol.within_bbox(bb)
 
+    def within_points(self, lons, lats, maxdist):
+        """
+        :param lons: longitudes of the points
+        :param lats: latitudes of the points
+        :param maxdist: maximum distance in km
+        :returns:
+            the site indices within the bounding box of at least one point,
+            enlarged by the maximum distance
+        """
+        lons = numpy.array(lons, float)
+        lats = numpy.array(lats, float)
+        a1 = min(maxdist * KM_TO_DEGREES, 90)
+        a2 = numpy.minimum(
+            angular_distance(maxdist, lats - a1, lats + a1), 180)
+        site_lons, site_lats = self.sitecol.lons, self.sitecol.lats
+        mask = numpy.zeros(len(site_lons), bool)
+        for slc in gen_slices(0, len(lons), POINTS_PER_BLOCK):
+            # longitude differences in the range [-180, 180[
+            dlon = (site_lons - lons[slc, None] + 180) % 360 - 180
+            dlat = site_lats - lats[slc, None]
+            mask |= ((numpy.abs(dlon) < a2[slc, None]) &
+                     (numpy.abs(dlat) < a1)).any(axis=0)
+        return mask.nonzero()[0]
+
     def filter(self, sources):
         """
         :param sources: a sequence of sources
@@ -338,6 +387,17 @@ class SourceFilter(object):
             if hasattr(src, 'indices'):   # already filtered
                 yield src
                 continue
+            elif getattr(src, 'code', None) == b'M':
+                # MultiPointSource, filter point by point
+                maxdist = self.integration_distance(
+                    src.tectonic_region_type, src.get_min_max_mag()[1])
+                indices = self.within_points(
+                    src.mesh.lons, src.mesh.lats,
+                    maxdist + src.get_max_radius())
+                if len(indices):
+                    src.indices = indices
+                    yield src
+                continue
             try:
                 box = self.integration_distance.get_affected_box(src)
             except BBoxError:  # too large, don't filter
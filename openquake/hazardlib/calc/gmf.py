@@ -23,6 +23,7 @@ Module :mod:`~openquake.hazardlib.calc.gmf` exports
 import numpy
 import scipy.stats
 
+from openquake.baselib.rng import CounterRNG, GMF_INTRA, GMF_INTER
 from openquake.hazardlib.const import StdDev
 from openquake.hazardlib.gsim.base import ContextMaker
 from openquake.hazardlib.gsim.multi import MultiGMPE
@@ -78,6 +79,11 @@ class GmfComputer(object):
         :mod:`openquake.hazardlib.correlation`. Can be ``None``, in which
         case non-correlated ground motion fields are calculated.
         Correlation model is not used if ``truncation_level`` is zero.
+
+    :param random_generator:
+        'legacy' to reseed the global numpy generator for each rupture,
+        'philox' to use a counter-based generator keyed by rupture seed,
+        site ID, event ID and IMT, which does not touch the global state
     """
     # The GmfComputer is called from the OpenQuake Engine. In that case
     # the rupture is an higher level containing a
@@ -87,7 +93,8 @@ class GmfComputer(object):
     # IMTs, N the number of affected sites and E the number of events. The
     # seed is extracted from the underlying rupture.
     def __init__(self, rupture, sitecol, imts, cmaker,
-                 truncation_level=None, correlation_model=None):
+                 truncation_level=None, correlation_model=None,
+                 random_generator='legacy'):
         if len(sitecol) == 0:
             raise ValueError('No sites')
         elif len(imts) == 0:
@@ -99,6 +106,7 @@ class GmfComputer(object):
         self.gsims = sorted(cmaker.gsims)
         self.truncation_level = truncation_level
         self.correlation_model = correlation_model
+        self.random_generator = random_generator
         # `rupture` can be an EBRupture instance
         if hasattr(rupture, 'srcidx'):
             self.srcidx = rupture.srcidx  # the source the rupture comes from
@@ -128,7 +136,8 @@ class GmfComputer(object):
             # NB: the trick for performance is to keep the call to
             # compute.compute outside of the loop over the realizations
             # it is better to have few calls producing big arrays
-            array, sig, eps = self.compute(gs, num_events)
+            eids = numpy.concatenate([eids_by_rlz[rlzi] for rlzi in rlzs])
+            array, sig, eps = self.compute(gs, num_events, eids=eids)
             array = array.transpose(1, 0, 2)  # from M, N, E to N, M, E
             for i, miniml in enumerate(min_iml):  # gmv < minimum
                 arr = array[:, i, :]
@@ -154,11 +163,12 @@ class GmfComputer(object):
         gmv_dt = [('sid', U32), ('eid', U32), ('gmv', (F32, m))]
         return numpy.array(data, gmv_dt)
 
-    def compute(self, gsim, num_events, seed=None):
+    def compute(self, gsim, num_events, seed=None, eids=None):
         """
         :param gsim: a GSIM instance
         :param num_events: the number of seismic events
         :param seed: a random seed or None
+        :param eids: the event IDs (relative to the rupture) or None
         :returns:
             a 32 bit array of shape (num_imts, num_sites, num_events) and
             two arrays with shape (num_imts, num_events): sig for stddev_inter
@@ -168,7 +178,13 @@ class GmfComputer(object):
             seed = seed or self.rupture.rup_id
         except AttributeError:
             pass
-        if seed is not None:
+        if self.random_generator == 'philox':
+            # the random numbers depend only on the counters, not on the
+            # global state, so the GMFs do not depend on the task splitting
+            self.intra_rng = CounterRNG(seed or 0, GMF_INTRA)
+            self.inter_rng = CounterRNG(seed or 0, GMF_INTER)
+            self.eids = numpy.arange(num_events) if eids is None else eids
+        elif seed is not None:
             numpy.random.seed(seed)
         result = numpy.zeros((len(self.imts), len(self.sids), num_events), F32)
         sig = numpy.zeros((len(self.imts), num_events), F32)
@@ -187,6 +203,19 @@ class GmfComputer(object):
                 ).with_traceback(exc.__traceback__)
         return result, sig, eps
 
+    def _rvs(self, distribution, imt, num_events, intra):
+        # returns random numbers of shape (N, E) if intra else (E,)
+        if self.random_generator == 'legacy':
+            if intra:
+                return rvs(distribution, len(self.sids), num_events)
+            return rvs(distribution, num_events)
+        m = self.imts.index(imt)
+        if intra:
+            u = self.intra_rng.uniform(self.sids[:, None], self.eids, m)
+        else:
+            u = self.inter_rng.uniform(self.eids, m)
+        return distribution.ppf(u)
+
     def _compute(self, seed, gsim, num_events, imt):
         """
         :param seed: a random seed or None if the seed is already set
@@ -219,7 +248,6 @@ class GmfComputer(object):
             distribution = scipy.stats.truncnorm(
                 - self.truncation_level, self.truncation_level)
 
-        num_sids = len(self.sids)
         if gsim.DEFINED_FOR_STANDARD_DEVIATION_TYPES == {StdDev.TOTAL}:
             # If the GSIM provides only total standard deviation, we need
             # to compute mean and total standard deviation at the sites
@@ -234,8 +262,8 @@ class GmfComputer(object):
             stddev_total = stddev_total.reshape(stddev_total.shape + (1, ))
             mean = mean.reshape(mean.shape + (1, ))
 
-            total_residual = stddev_total * rvs(
-                distribution, num_sids, num_events)
+            total_residual = stddev_total * self._rvs(
+                distribution, imt, num_events, intra=True)
             gmf = gsim.to_imt_unit_values(mean + total_residual)
             stdi = numpy.nan
             epsilons = numpy.empty(num_events, F32)
@@ -247,8 +275,8 @@ class GmfComputer(object):
             stddev_intra = stddev_intra.reshape(stddev_intra.shape + (1, ))
             stddev_inter = stddev_inter.reshape(stddev_inter.shape + (1, ))
             mean = mean.reshape(mean.shape + (1, ))
-            intra_residual = stddev_intra * rvs(
-                distribution, num_sids, num_events)
+            intra_residual = stddev_intra * self._rvs(
+                distribution, imt, num_events, intra=True)
 
             if self.correlation_model is not None:
                 intra_residual = self.correlation_model.apply_correlation(
@@ -257,7 +285,7 @@ class GmfComputer(object):
                 if len(sh) == 1:  # a vector
                     intra_residual = intra_residual.reshape(sh + (1,))
 
-            epsilons = rvs(distribution, num_events)
+            epsilons = self._rvs(distribution, imt, num_events, intra=False)
             inter_residual = stddev_inter * epsilons
 
             gmf = gsim.to_imt_unit_values(
@@ -22,6 +22,7 @@ import time
 import warnings
 import operator
 import itertools
+import collections
 import numpy
 from scipy.interpolate import interp1d
 
@@ -39,6 +40,9 @@ F32 = numpy.float32
 KNOWN_DISTANCES = frozenset(
     'rrup rx ry0 rjb rhypo repi rcdpp azimuth azimuth_cp rvolc'.split())
 
+#: maximum size in bytes of the distances stored in a DistanceCache
+DISTANCE_CACHE_SIZE = 100 * 1024 ** 2
+
 
 def get_distances(rupture, sites, param):
     """
@@ -74,6 +78,102 @@ def get_distances(rupture, sites, param):
     return dist
 
 
+class DistanceCache(object):
+    """
+    A memory-bounded cache of the distances between ruptures and sites,
+    keyed by (rupture ID, distance kind, complete site collection). It is
+    meant to live inside a single task, so that the distances of a rupture
+    are computed once even if the rupture is processed several times, for
+    instance by the filtering and by the GMF computation. The distances
+    are stored by site ID, so that the distances for a subset of the cached
+    sites (like the sites surviving the filtering) are extracted from the
+    cache. Ruptures without a ``rup_id``, i.e. the ones generated on the fly
+    by the classical calculator and processed only once, and meshes of
+    points are not cached. When the stored arrays exceed ``maxbytes`` the
+    least recently used ones are discarded.
+
+    :param maxbytes: maximum size of the cache in bytes
+    """
+    def __init__(self, maxbytes=DISTANCE_CACHE_SIZE):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (complete sitecol, sorted sids, distances)
+        self.dic = collections.OrderedDict()
+
+    def __getstate__(self):
+        # do not send the cached distances to the workers
+        return dict(maxbytes=self.maxbytes)
+
+    def __setstate__(self, state):
+        self.__init__(state['maxbytes'])
+
+    def get(self, rupture, sites, param):
+        """
+        :param rupture: a rupture
+        :param sites: a mesh of points or a site collection
+        :param param: the kind of distance to compute
+        :returns: a read-only array of distances, possibly cached
+        """
+        rup_id = getattr(rupture, 'rup_id', 0)
+        complete = getattr(sites, 'complete', None)
+        if not rup_id or complete is None or not self.maxbytes:
+            return get_distances(rupture, sites, param)
+        # the complete site collection is kept in the cache, so that its id
+        # cannot be reused by another object
+        key = (rup_id, param, id(complete))
+        sids = sites.sids
+        try:
+            _complete, cached_sids, cached = self.dic[key]
+        except KeyError:
+            pass
+        else:
+            self.dic.move_to_end(key)
+            if len(sids) == len(cached_sids) and (sids == cached_sids).all():
+                self.hits += 1
+                return cached
+            idx = numpy.searchsorted(cached_sids, sids)
+            idx[idx == len(cached_sids)] = 0
+            if (cached_sids[idx] == sids).all():  # subset of the cached sites
+                self.hits += 1
+                dist = cached[idx]
+                dist.flags.writeable = False
+                return dist
+            self.nbytes -= cached_sids.nbytes + cached.nbytes
+            del self.dic[key]
+        self.misses += 1
+        dist = get_distances(rupture, sites, param)
+        if (numpy.diff(sids) > 0).all():  # sorted, as usual
+            dist.flags.writeable = False
+            self.dic[key] = complete, sids, dist
+        else:
+            order = numpy.argsort(sids)
+            sorted_dist = dist[order]
+            sorted_dist.flags.writeable = False
+            self.dic[key] = complete, sids[order], sorted_dist
+        self.nbytes += sids.nbytes + dist.nbytes
+        while self.nbytes > self.maxbytes and len(self.dic) > 1:
+            _complete, oldsids, olddist = self.dic.popitem(last=False)[1]
+            self.nbytes -= oldsids.nbytes + olddist.nbytes
+        return dist
+
+    def clear(self):
+        """
+        Remove all the cached distances
+        """
+        self.dic.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.dic)
+
+    def __repr__(self):
+        return '<%s %d entries, %d bytes, %d hits, %d misses>' % (
+            self.__class__.__name__, len(self), self.nbytes, self.hits,
+            self.misses)
+
+
 class FarAwayRupture(Exception):
     """Raised if the rupture is outside the maximum distance for all sites"""
 
@@ -121,7 +221,7 @@ class RupData(object):
         self.data['sid_'].append(numpy.int16(sctx.sids))
         for dst_param in (self.cmaker.REQUIRES_DISTANCES | {'rrup'}):
             if dctx is None:  # compute the distances
-                dists = get_distances(rup, sctx, dst_param)
+                dists = self.cmaker.dcache.get(rup, sctx, dst_param)
             else:  # reuse already computed distances
                 dists = getattr(dctx, dst_param)
             self.data[dst_param + '_'].append(F32(dists))
@@ -166,6 +266,8 @@ class ContextMaker(object):
             for gsim, rlzis in gsims.items():
                 for rlzi in rlzis:
                     self.gsim_by_rlzi[rlzi] = gsim
+        self.dcache = DistanceCache(
+            param.get('distance_cache_size', DISTANCE_CACHE_SIZE))
         self.mon = monitor
         self.ctx_mon = monitor('make_contexts', measuremem=False)
         self.loglevels = DictArray(self.imtls)
@@ -190,9 +292,9 @@ class ContextMaker(object):
         :returns:
             (filtered sites, distance context)
         """
-        distances = get_distances(rupture, sites, self.filter_distance)
+        distances = self.dcache.get(rupture, sites, self.filter_distance)
         mdist = mdist or self.maximum_distance(
-            rupture.tectonic_region_type)  # TODO: add rupture.mag here
+            rupture.tectonic_region_type, rupture.mag)
         mask = distances <= mdist
         if mask.any():
             sites, distances = sites.filter(mask), distances[mask]
@@ -253,7 +355,7 @@ class ContextMaker(object):
         """
         sites, dctx = self.filter(sites, rupture, mdist)
         for param in self.REQUIRES_DISTANCES - set([self.filter_distance]):
-            distances = get_distances(rupture, sites, param)
+            distances = self.dcache.get(rupture, sites, param)
             setattr(dctx, param, distances)
         reqv_obj = (self.reqv.get(rupture.tectonic_region_type)
                     if self.reqv else None)
@@ -279,6 +381,20 @@ class ContextMaker(object):
             ctxs.append((rup, sctx, dctx))
         return ctxs
 
+    def _gen_fake_contexts(self, mags, dists):
+        # yield (m, d, rupture context, distances context) for each pair
+        # magnitude-distance, with all the distances equal to the given one
+        for m, d in itertools.product(range(len(mags)), range(len(dists))):
+            rup = RuptureContext()
+            for par in self.REQUIRES_RUPTURE_PARAMETERS:
+                setattr(rup, par, 0)
+            rup.mag = mags[m]
+            rup.width = .01  # 10 meters to avoid warnings in abrahamson_2014
+            dctx = DistancesContext(
+                (dst, numpy.array([dists[d]]))
+                for dst in self.REQUIRES_DISTANCES)
+            yield m, d, rup, dctx
+
     def make_gmv(self, onesite, mags, dists):
         """
         :param onesite: a SiteCollection instance with a single site
@@ -287,18 +403,9 @@ class ContextMaker(object):
         :returns: an array of GMVs of shape (#mags, #dists)
         """
         assert len(onesite) == 1, onesite
-        nmags, ndists = len(mags), len(dists)
-        gmv = numpy.zeros((nmags, ndists))
-        for m, d in itertools.product(range(nmags), range(ndists)):
-            mag, dist = mags[m], dists[d]
-            rup = RuptureContext()
-            for par in self.REQUIRES_RUPTURE_PARAMETERS:
-                setattr(rup, par, 0)
-            rup.mag = mag
-            rup.width = .01  # 10 meters to avoid warnings in abrahamson_2014
-            dctx = DistancesContext(
-                (dst, numpy.array([dist])) for dst in self.REQUIRES_DISTANCES)
-            max_imt = self.imts[-1]
+        gmv = numpy.zeros((len(mags), len(dists)))
+        max_imt = self.imts[-1]
+        for m, d, rup, dctx in self._gen_fake_contexts(mags, dists):
             means = []
             for gsim in self.gsims:
                 try:
@@ -312,6 +419,37 @@ class ContextMaker(object):
                 gmv[m, d] = numpy.exp(max(means))
         return gmv
 
+    def make_max_ratio(self, onesite, mags, dists, truncation_level):
+        """
+        :param onesite: a SiteCollection instance with a single site
+        :param mags: a sequence of magnitudes
+        :param dists: a sequence of distances
+        :param truncation_level: the truncation level of the GSIMs
+        :returns: an array of shape (#mags, #dists) with the largest ratio,
+            over all GSIMs and IMTs, between the truncated upper bound
+            exp(mean + truncation_level * total stddev) and the minimum
+            intensity measure level; a rupture with a ratio below 1 cannot
+            exceed any level
+        """
+        assert len(onesite) == 1, onesite
+        min_loglevels = numpy.array(
+            [self.loglevels[imt].min() for imt in self.imtls])
+        ratio = numpy.zeros((len(mags), len(dists)))
+        for m, d, rup, dctx in self._gen_fake_contexts(mags, dists):
+            logratios = []
+            for gsim in self.gsims:
+                try:
+                    mean, std = base.get_mean_std(  # shape (2, N, M, G)
+                        onesite, rup, dctx, self.imts, [gsim])[:, 0, :, 0]
+                except ValueError:  # magnitude outside of supported range
+                    continue
+                else:
+                    logratios.append(
+                        (mean + truncation_level * std - min_loglevels).max())
+            # if no GSIM supports the magnitude, keep the maximum distance
+            ratio[m, d] = numpy.exp(max(logratios)) if logratios else numpy.inf
+        return ratio
+
     def get_pmap_by_grp(self, srcfilter, group):
         """
         :return: dictionaries pmap, rdata, calc_times
@@ -499,7 +637,7 @@ class PmapMaker(object):
                 loc.depth = numpy.average(depths, weights=weights)
                 trt = src.tectonic_region_type
                 for mag, rups in self.mag_rups:
-                    mdist = self.maximum_distance(trt)  # FIXME: mag-dep
+                    mdist = self.maximum_distance(trt, mag)
                     pdist = self.pointsource_distance.get('%.3f' % mag)
                     close, far = sites.split(loc, min(pdist, mdist))
                     if close is None:  # all is far
@@ -746,6 +884,43 @@ def get_effect_by_mag(mags, onesite, gsims_by_trt, maximum_distance, imtls,
     return dict(zip(mags, gmv))
 
 
+# used in calculators/classical.py
+def get_max_ratio_by_mag(mags, onesite, gsims_by_trt, maximum_distance,
+                         imtls, truncation_level, monitor):
+    """
+    :param mag: an ordered list of magnitude strings with format %.3d
+    :returns: a dict magnitude-string -> array(#dists, #trts) of ratios
+        computed with :meth:`ContextMaker.make_max_ratio`
+    """
+    trts = list(gsims_by_trt)
+    ndists = 51
+    ratio = numpy.zeros((len(mags), ndists, len(trts)))
+    param = dict(maximum_distance=maximum_distance, imtls=imtls)
+    for t, trt in enumerate(trts):
+        dist_bins = maximum_distance.get_dist_bins(trt, ndists)
+        cmaker = ContextMaker(trt, gsims_by_trt[trt], param)
+        ratio[:, :, t] = cmaker.make_max_ratio(
+            onesite, [float(mag) for mag in mags], dist_bins,
+            truncation_level)
+    return dict(zip(mags, ratio))
+
+
+def get_magdist(ratio_by_mag, dists):
+    """
+    :param ratio_by_mag: a dict magstring -> ratios, one per distance
+    :param dists: an increasing array of distances
+    :returns: a dict magstring -> distance beyond which the ratios are < 1
+    """
+    magdist = {}
+    for mag, ratios in ratio_by_mag.items():
+        [idxs] = (ratios >= 1).nonzero()
+        if len(idxs) == 0:  # the magnitude cannot exceed any level
+            magdist[mag] = dists[0]
+        else:  # the next distance bin, to be on the safe side
+            magdist[mag] = dists[min(idxs[-1] + 1, len(dists) - 1)]
+    return magdist
+
+
 # used in calculators/classical.py
 def ruptures_by_mag_dist(sources, srcfilter, gsims, params, monitor):
     """
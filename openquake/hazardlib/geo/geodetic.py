@@ -21,7 +21,9 @@ Module :mod:`openquake.hazardlib.geo.geodetic` contains functions for geodetic
 transformations, optimized for massive calculations.
 """
 import numpy
+from scipy.spatial import cKDTree
 from scipy.spatial.distance import cdist
+from openquake.baselib.general import gen_slices
 from openquake.baselib.python3compat import round
 
 #: Earth radius in km.
@@ -30,6 +32,13 @@ EARTH_RADIUS = 6371.0
 #: Maximum elevation on Earth in km.
 EARTH_ELEVATION = -8.848
 
+#: Maximum number of distances computed in a single pass by the brute
+#: force algorithms, to bound the memory occupation
+MAX_DISTANCES = 1000000
+
+#: Minimum number of target points for using a KD-tree in :func:`nearest`
+KDTREE_MIN_POINTS = 100
+
 
 def geodetic_distance(lons1, lats1, lons2, lats2, diameter=2*EARTH_RADIUS):
     """
@@ -221,6 +230,30 @@ def spherical_to_cartesian(lons, lats, depths=None):
     return arr
 
 
+def nearest(xyz, points):
+    """
+    Find the closest point of ``xyz`` for each point in ``points``.
+    For large problems a KD-tree is used, otherwise the distances are
+    computed by brute force on blocks of points, so that the memory
+    occupation is bounded.
+
+    :param xyz: an array of shape (M, 3) with cartesian coordinates
+    :param points: an array of shape (N, 3) with cartesian coordinates
+    :returns: N distances and N indices in the range [0, M)
+    """
+    M, N = len(xyz), len(points)
+    if N >= KDTREE_MIN_POINTS and M * N > MAX_DISTANCES:
+        return cKDTree(xyz).query(points)
+    dists = numpy.zeros(N)
+    idxs = numpy.zeros(N, int)
+    for slc in gen_slices(0, N, max(MAX_DISTANCES // M, 1)):
+        dmatrix = cdist(xyz, points[slc])
+        idx = dmatrix.argmin(axis=0)
+        idxs[slc] = idx
+        dists[slc] = dmatrix[idx, numpy.arange(len(idx))]
+    return dists, idxs
+
+
 def min_geodetic_distance(a, b):
     """
     Compute the minimum distance between first mesh and each point
@@ -233,7 +266,7 @@ def min_geodetic_distance(a, b):
         a = spherical_to_cartesian(a[0].flatten(), a[1].flatten())
     if isinstance(b, tuple):
         b = spherical_to_cartesian(b[0].flatten(), b[1].flatten())
-    return cdist(a, b).min(axis=0)
+    return nearest(a, b)[0]
 
 
 def distance_matrix(lons, lats, diameter=2*EARTH_RADIUS):
@@ -248,11 +281,11 @@ def distance_matrix(lons, lats, diameter=2*EARTH_RADIUS):
     lats = numpy.radians(lats)
     cos_lats = numpy.cos(lats)
     result = numpy.zeros((m, m))
-    for i in range(len(lons)):
-        a = numpy.sin((lats[i] - lats) / 2.0)
-        b = numpy.sin((lons[i] - lons) / 2.0)
-        result[i, :] = numpy.arcsin(
-            numpy.sqrt(a * a + cos_lats[i] * cos_lats * b * b)) * diameter
+    for slc in gen_slices(0, m, max(MAX_DISTANCES // m, 1)):
+        a = numpy.sin((lats[slc, None] - lats) / 2.0)
+        b = numpy.sin((lons[slc, None] - lons) / 2.0)
+        result[slc] = numpy.arcsin(numpy.sqrt(
+            a * a + cos_lats[slc, None] * cos_lats * b * b)) * diameter
     return result
 
 
@@ -21,7 +21,6 @@ Module :mod:`openquake.hazardlib.geo.mesh` defines classes :class:`Mesh` and
 its subclass :class:`RectangularMesh`.
 """
 import numpy
-from scipy.spatial.distance import cdist
 import shapely.geometry
 import shapely.ops
 
@@ -242,11 +241,11 @@ class Mesh(object):
             numpy array of distances in km of shape (self.size, mesh.size)
 
         Method doesn't make any assumptions on arrangement of the points
-        in either mesh and instead calculates the distance from each point of
-        this mesh to each point of the target mesh and returns the lowest found
-        for each.
+        in either mesh and instead finds the closest point of this mesh
+        for each point of the target mesh, see
+        :func:`openquake.hazardlib.geo.geodetic.nearest`.
         """
-        return cdist(self.xyz, mesh.xyz).min(axis=0)
+        return geodetic.nearest(self.xyz, mesh.xyz)[0]
 
     def get_closest_points(self, mesh):
         """
@@ -256,7 +255,7 @@ class Mesh(object):
             :class:`Mesh` object of the same shape as `mesh` with closest
             points from this one at respective indices.
         """
-        min_idx = cdist(self.xyz, mesh.xyz).argmin(axis=0)  # lose shape
+        min_idx = geodetic.nearest(self.xyz, mesh.xyz)[1]  # lose shape
         if hasattr(mesh, 'shape'):
             min_idx = min_idx.reshape(mesh.shape)
         lons = self.lons.take(min_idx)
@@ -22,6 +22,7 @@ Module :mod:`openquake.hazardlib.geo.polygon` defines :class:`Polygon`.
 import numpy
 import shapely.geometry
 import shapely.wkt
+from shapely import vectorized
 
 from openquake.hazardlib.geo.mesh import Mesh
 from openquake.hazardlib.geo import geodetic
@@ -222,28 +223,29 @@ class Polygon(object):
         lons, lats = [], []
         # we cover the bounding box (in spherical coordinates) from highest
         # to lowest latitude and from left to right by longitude. we step
-        # by mesh spacing distance (linear measure). we check each point
-        # if it is inside the polygon and yield the point object, if so.
+        # by mesh spacing distance (linear measure). then we check all the
+        # points at once and keep the ones inside the polygon.
         # this way we produce an uniformly-spaced mesh regardless of the
         # latitude.
         latitude = north
         while latitude > south:
             longitude = west
             while utils.get_longitudinal_extent(longitude, east) > 0:
-                # we use Cartesian space just for checking if a point
-                # is inside of the polygon.
-                x, y = self._projection(longitude, latitude)
-                if self._polygon2d.contains(shapely.geometry.Point(x, y)):
-                    lons.append(longitude)
-                    lats.append(latitude)
-
+                lons.append(longitude)
+                lats.append(latitude)
                 # move by mesh spacing along parallel...
                 longitude, _, = geodetic.point_at(longitude, latitude,
                                                   90, mesh_spacing)
             # ... and by the same distance along meridian in outer one
             _, latitude = geodetic.point_at(west, latitude, 180, mesh_spacing)
-
-        return Mesh(numpy.array(lons), numpy.array(lats), depths=None)
+        lons, lats = numpy.array(lons), numpy.array(lats)
+        if len(lons):
+            # we use Cartesian space just for checking if a point
+            # is inside of the polygon.
+            xx, yy = self._projection(lons, lats)
+            inside = vectorized.contains(self._polygon2d, xx, yy)
+            lons, lats = lons[inside], lats[inside]
+        return Mesh(lons, lats, depths=None)
 
 
 def get_resampled_coordinates(lons, lats):
@@ -23,12 +23,17 @@ Module :mod:`openquake.hazardlib.geo.surface.multi` defines
 import numpy
 from copy import deepcopy
 from scipy.spatial.distance import pdist, squareform
+from openquake.baselib.general import gen_slices
 from openquake.hazardlib.geo.surface.base import BaseSurface, downsample_trace
 from openquake.hazardlib.geo.mesh import Mesh
-from openquake.hazardlib.geo import utils
+from openquake.hazardlib.geo import utils, geodetic
 from openquake.hazardlib.geo.surface import (
     PlanarSurface, SimpleFaultSurface, ComplexFaultSurface)
 from openquake.hazardlib.geo.surface.gridded import GriddedSurface
+from openquake.hazardlib.geo.surface import planar
+
+#: number of sites for which the distances are computed in a single pass
+SITES_PER_BLOCK = 10000
 
 
 class MultiSurface(BaseSurface):
@@ -133,6 +138,31 @@ class MultiSurface(BaseSurface):
         self.gc2u = None
         self.tmp_mesh = None
         self.gc_length = None
+        self.planar_array = None  # set by _get_arrays
+        self.mesh_xyz = None  # set by _get_arrays
+        self.gc2_segments = None  # set by _get_gc2_segments
+
+    def _get_arrays(self):
+        """
+        :returns:
+            the geometry of the planar surface elements as an array of dtype
+            :data:`planar.planar_array_dt` and the cartesian coordinates
+            of the points of all the other surface elements, stacked in
+            an array of shape (P, 3)
+        """
+        if self.planar_array is None:
+            planars = [surf for surf in self.surfaces
+                       if isinstance(surf, PlanarSurface)]
+            arr = numpy.zeros(len(planars), planar.planar_array_dt)
+            for name in planar.planar_array_dt.names:
+                if planars:
+                    arr[name] = [getattr(surf, name) for surf in planars]
+            self.planar_array = arr
+            xyzs = [surf.mesh.xyz for surf in self.surfaces
+                    if not isinstance(surf, PlanarSurface)]
+            self.mesh_xyz = (numpy.concatenate(xyzs) if xyzs
+                             else numpy.zeros((0, 3)))
+        return self.planar_array, self.mesh_xyz
 
     def _get_edge_set(self, tol=0.1):
         """
@@ -167,9 +197,19 @@ class MultiSurface(BaseSurface):
         <.base.BaseSurface.get_min_distance>`
         for spec of input and result values.
         """
-        dists = [surf.get_min_distance(mesh) for surf in self.surfaces]
-
-        return numpy.min(dists, axis=0)
+        # the points of all the elements are stacked together, so that
+        # the distances are computed in one pass for each block of sites
+        arr, mesh_xyz = self._get_arrays()
+        xyz = mesh.xyz
+        dists = numpy.full(len(xyz), numpy.inf)
+        for slc in gen_slices(0, len(xyz), SITES_PER_BLOCK):
+            if len(arr):
+                dists[slc] = planar.get_min_distance(
+                    arr, xyz[slc]).min(axis=1)
+            if len(mesh_xyz):
+                dists[slc] = numpy.minimum(
+                    dists[slc], geodetic.nearest(mesh_xyz, xyz[slc])[0])
+        return dists.reshape(mesh.lons.shape)
 
     def get_closest_points(self, mesh):
         """
@@ -226,9 +266,22 @@ class MultiSurface(BaseSurface):
         """
         # for each point in mesh compute the Joyner-Boore distance to all the
         # surfaces and return the shortest one.
-        dists = [
-            surf.get_joyner_boore_distance(mesh) for surf in self.surfaces]
-        return numpy.min(dists, axis=0)
+        # the distances to the planar elements are computed in one pass
+        # for each block of sites, the other elements are considered
+        # one at the time since they need the convex hull of their mesh
+        arr, _ = self._get_arrays()
+        lons, lats = mesh.lons.flatten(), mesh.lats.flatten()
+        dists = numpy.full(len(lons), numpy.inf)
+        if len(arr):
+            for slc in gen_slices(0, len(lons), SITES_PER_BLOCK):
+                dists[slc] = planar.get_joyner_boore_distance(
+                    arr, lons[slc], lats[slc]).min(axis=1)
+        dists = dists.reshape(mesh.lons.shape)
+        for surf in self.surfaces:
+            if not isinstance(surf, PlanarSurface):
+                dists = numpy.minimum(
+                    dists, surf.get_joyner_boore_distance(mesh))
+        return dists
 
     def get_top_edge_depth(self):
         """
@@ -474,30 +527,35 @@ class MultiSurface(BaseSurface):
         # GC2 length should be the largest positive GC2 value of the edges
         self.gc_length = numpy.max(rup_gc2u)
 
-    def _get_ut_i(self, seg, sx, sy):
-        """
-        Returns the U and T coordinate for a specific trace segment
-
-        :param seg:
-            End points of the segment edge
-
-        :param sx:
-            Sites longitudes rendered into coordinate system
-
-        :param sy:
-            Sites latitudes rendered into coordinate system
+    def _get_gc2_segments(self):
         """
-        p0x, p0y, p1x, p1y = seg[0, 0], seg[0, 1], seg[1, 0], seg[1, 1]
-        # Unit vector normal to strike
-        t_i_vec = [p1y - p0y, -(p1x - p0x), 0.0]
-        t_i_hat = t_i_vec / numpy.linalg.norm(t_i_vec)
-        # Unit vector along strike
-        u_i_vec = [p1x - p0x, p1y - p0y, 0.0]
-        u_i_hat = u_i_vec / numpy.linalg.norm(u_i_vec)
-        # Vectors from P0 to sites
-        rsite = numpy.column_stack([sx - p0x, sy - p0y])
-        return numpy.sum(u_i_hat[:-1] * rsite, axis=1),\
-            numpy.sum(t_i_hat[:-1] * rsite, axis=1)
+        :returns:
+            the segments of all the traces in the GC2 configuration, as a
+            dictionary of arrays of length S (the number of segments)
+        """
+        if self.gc2_segments is None:
+            p0s, p1s, lengths, s_ijs = [], [], [], []
+            for j, edges in enumerate(self.cartesian_edges):
+                p0s.append(edges[:-1, :2])
+                p1s.append(edges[1:, :2])
+                lengths.append(self.length_set[j][:len(edges) - 1])
+                # equation 12 of Spudich and Chiou
+                s_ijs.append(self.cum_length_set[j][:len(edges) - 1] +
+                             numpy.dot((edges[0, :2] - self.p0),
+                                       self.gc2_config["b_hat"]))
+            p0 = numpy.concatenate(p0s)
+            vec = numpy.concatenate(p1s) - p0
+            norm = numpy.sqrt((vec ** 2).sum(axis=1))
+            self.gc2_segments = dict(
+                p0=p0,
+                # unit vector along strike
+                u_hat=vec / norm[:, None],
+                # unit vector normal to strike
+                t_hat=numpy.column_stack([vec[:, 1], -vec[:, 0]]) /
+                norm[:, None],
+                length=numpy.concatenate(lengths),
+                s_ij=numpy.concatenate(s_ijs))
+        return self.gc2_segments
 
     def get_generalised_coordinates(self, lons, lats):
         """
@@ -513,67 +571,58 @@ class MultiSurface(BaseSurface):
         # If the GC2 configuration has not been setup already - do it!
         if not self.gc2_config:
             self._setup_gc2_framework()
-        # Initially the weights are set to zero
-        sx, sy = self.proj(lons, lats)
-        sum_w_i = numpy.zeros_like(lons)
-        sum_w_i_t_i = numpy.zeros_like(lons)
-        sum_wi_ui_si = numpy.zeros_like(lons)
-        # Find the cumulative length of the fault up until the given segment
-        # Essentially calculating s_i
-        general_t = numpy.zeros_like(lons)
-        general_u = numpy.zeros_like(lons)
-        on_segment = numpy.zeros_like(lons, dtype=bool)
-        # Loop over the traces
-        for j, edges in enumerate(self.cartesian_edges):
-            # Loop over segments in trace
-            # s_ij_total = 0.0
-            for i in range(edges.shape[0] - 1):
-                # Get u_i and t_i
-                u_i, t_i = self._get_ut_i(edges[i:(i + 2), :], sx, sy)
-                # If t_i is 0 and u_i is within the section length then site is
-                # directly on the edge - therefore general_t is 0
-                w_i = numpy.zeros_like(lons)
-                ti0_check = numpy.fabs(t_i) < 1.0E-3  # < 1 m precision
-                on_segment_range = numpy.logical_and(
-                    u_i >= 0.0,
-                    u_i <= self.length_set[j][i])
-                # Deal with the case in which t_i is 0 and the site is inside
-                # of the segment
-                idx0 = numpy.logical_and(ti0_check, on_segment_range)
-                # In this null case w_i is ignored - however, null sites on
-                # previous segments would not be null sites on this segment,
-                # so we update the list of null sites
-                on_segment[numpy.logical_or(on_segment, idx0)] = True
-                # Also take care of the U case this time using
-                # equation 12 of Spudich and Chiou
-                s_ij = self.cum_length_set[j][i] + numpy.dot(
-                    (edges[0, :2] - self.p0), self.gc2_config["b_hat"])
-                general_u[idx0] = u_i[idx0] + s_ij
-
+        shape = numpy.shape(lons)
+        sx, sy = self.proj(numpy.ravel(lons), numpy.ravel(lats))
+        general_t = numpy.zeros(len(sx))
+        general_u = numpy.zeros(len(sx))
+        for slc in gen_slices(0, len(sx), SITES_PER_BLOCK):
+            general_t[slc], general_u[slc] = self._get_gc2_coordinates(
+                sx[slc], sy[slc])
+        return general_t.reshape(shape), general_u.reshape(shape)
+
+    def _get_gc2_coordinates(self, sx, sy):
+        # compute the GC2 coordinates of N sites, considering all the S
+        # segments of all the traces at once with arrays of shape (S, N)
+        seg = self._get_gc2_segments()
+        length = seg['length'][:, None]
+        s_ij = seg['s_ij'][:, None]
+        # vectors from the first point of each segment to the sites
+        rx = sx - seg['p0'][:, 0:1]
+        ry = sy - seg['p0'][:, 1:2]
+        u_i = seg['u_hat'][:, 0:1] * rx + seg['u_hat'][:, 1:2] * ry
+        t_i = seg['t_hat'][:, 0:1] * rx + seg['t_hat'][:, 1:2] * ry
+        # If t_i is 0 and u_i is within the section length then site is
+        # directly on the edge - therefore general_t is 0
+        ti0_check = numpy.fabs(t_i) < 1.0E-3  # < 1 m precision
+        on_segment_range = (u_i >= 0.0) & (u_i <= length)
+        idx0 = ti0_check & on_segment_range
+        on_segment = idx0.any(axis=0)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            w_i = numpy.where(
+                ti0_check,
                 # In the first case, ti = 0, u_i is outside of the segment
                 # this implements equation 5
-                idx1 = numpy.logical_and(ti0_check,
-                                         numpy.logical_not(on_segment_range))
-                w_i[idx1] = ((1.0 / (u_i[idx1] - self.length_set[j][i])) -
-                             (1.0 / u_i[idx1]))
-
+                (1.0 / (u_i - length)) - (1.0 / u_i),
                 # In the last case the site is not on the edge (t != 0)
                 # implements equation 4
-                idx2 = numpy.logical_not(ti0_check)
-                w_i[idx2] = ((1. / t_i[idx2]) * (numpy.arctan(
-                             (self.length_set[j][i] - u_i[idx2]) / t_i[idx2]) -
-                             numpy.arctan(-u_i[idx2] / t_i[idx2])))
-
-                idx = numpy.logical_or(idx1, idx2)
-                # Equation 3
-                sum_w_i[idx] += w_i[idx]
-                # Part of equation 2
-                sum_w_i_t_i[idx] += (w_i[idx] * t_i[idx])
-                # Part of equation 9
-                sum_wi_ui_si[idx] += (w_i[idx] * (u_i[idx] + s_ij))
-
+                (1. / t_i) * (numpy.arctan((length - u_i) / t_i) -
+                              numpy.arctan(-u_i / t_i)))
+        # In the null case w_i is ignored
+        w_i[idx0] = 0.
+        # Equation 3, part of equation 2 and part of equation 9
+        sum_w_i = w_i.sum(axis=0)
+        sum_w_i_t_i = (w_i * t_i).sum(axis=0)
+        sum_wi_ui_si = (w_i * (u_i + s_ij)).sum(axis=0)
+        general_t = numpy.zeros(len(sx))
+        general_u = numpy.zeros(len(sx))
+        # For the sites on a segment edge the U coordinate is given by the
+        # last segment containing them
+        last = len(idx0) - 1 - idx0[::-1].argmax(axis=0)
+        sites = numpy.arange(len(sx))
+        general_u[on_segment] = (u_i[last, sites] +
+                                 s_ij[last, 0])[on_segment]
         # For those sites not on the segment edge itself
-        idx_t = numpy.logical_not(on_segment)
+        idx_t = ~on_segment
         general_t[idx_t] = (1.0 / sum_w_i[idx_t]) * sum_w_i_t_i[idx_t]
         general_u[idx_t] = (1.0 / sum_w_i[idx_t]) * sum_wi_ui_si[idx_t]
         return general_t, general_u
@@ -590,7 +639,7 @@ class MultiSurface(BaseSurface):
         # If the GC2 calculations have already been computed (by invoking Ry0
         # first) and the mesh is identical then class has GC2 attributes
         # already pre-calculated
-        if not self.tmp_mesh or (self.tmp_mesh == mesh):
+        if self.tmp_mesh is None or not (self.tmp_mesh == mesh):
             self.gc2t, self.gc2u = self.get_generalised_coordinates(mesh.lons,
                                                                     mesh.lats)
             # Update mesh
@@ -610,7 +659,7 @@ class MultiSurface(BaseSurface):
         # If the GC2 calculations have already been computed (by invoking Ry0
         # first) and the mesh is identical then class has GC2 attributes
         # already pre-calculated
-        if not self.tmp_mesh or (self.tmp_mesh == mesh):
+        if self.tmp_mesh is None or not (self.tmp_mesh == mesh):
             # If that's not the case, or the mesh is different then
             # re-compute GC2 configuration
             self.gc2t, self.gc2u = self.get_generalised_coordinates(mesh.lons,
@@ -18,7 +18,7 @@
 
 """
 Module :mod:`openquake.hazardlib.geo.surface.planar` contains
-:class:`PlanarSurface`.
+:class:`PlanarSurface` and a few functions working on arrays of planes.
 """
 import logging
 import numpy
@@ -31,6 +31,115 @@ from openquake.hazardlib.geo.nodalplane import NodalPlane
 from openquake.hazardlib.geo import utils as geo_utils
 from openquake.baselib.slots import with_slots
 
+F64 = numpy.float64
+
+#: the geometry of a planar surface, as computed by the constructor of
+#: :class:`PlanarSurface`; the corners are in the order tl, tr, bl, br
+planar_array_dt = numpy.dtype([
+    ('corner_lons', (F64, 4)), ('corner_lats', (F64, 4)),
+    ('corner_depths', (F64, 4)), ('strike', F64), ('dip', F64),
+    ('width', F64), ('length', F64), ('normal', (F64, 3)), ('d', F64),
+    ('uv1', (F64, 3)), ('uv2', (F64, 3)), ('zero_zero', (F64, 3))])
+
+
+def build_planar_array(lons, lats, depths):
+    """
+    Compute the geometry of many planar surfaces at once, without
+    checking them.
+
+    :param lons: longitudes of the corners, an array of shape (N, 4)
+    :param lats: latitudes of the corners, an array of shape (N, 4)
+    :param depths: depths of the corners, an array of shape (N, 4)
+    :returns: an array of N elements of dtype planar_array_dt
+    """
+    arr = numpy.zeros(len(lons), planar_array_dt)
+    arr['corner_lons'] = lons
+    arr['corner_lats'] = lats
+    arr['corner_depths'] = depths
+    lons, lats, depths = (arr['corner_lons'], arr['corner_lats'],
+                          arr['corner_depths'])
+    arr['strike'] = geodetic.azimuth(
+        lons[:, 0], lats[:, 0], lons[:, 1], lats[:, 1])
+    dist = geodetic.distance(lons[:, 0], lats[:, 0], depths[:, 0],
+                             lons[:, 2], lats[:, 2], depths[:, 2])
+    arr['dip'] = numpy.degrees(numpy.arcsin(
+        (depths[:, 2] - depths[:, 0]) / dist))
+    xyz = geo_utils.spherical_to_cartesian(lons, lats, depths)  # (N, 4, 3)
+    tl, tr, bl = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+    # see PlanarSurface._init_plane
+    arr['normal'] = normal = geo_utils.normalized(
+        numpy.cross(tl - tr, tl - bl))
+    arr['d'] = - (normal * tl).sum(axis=-1)
+    arr['uv1'] = geo_utils.normalized(tr - tl)
+    arr['uv2'] = numpy.cross(arr['normal'], arr['uv1'])
+    arr['zero_zero'] = tl
+    _dists, xx, yy = project(arr, xyz.transpose(1, 0, 2))  # shape (4, N)
+    arr['length'] = ((xx[1] - xx[0]) + (xx[3] - xx[2])) / 2.0
+    arr['width'] = ((yy[2] - yy[0]) + (yy[3] - yy[1])) / 2.0
+    return arr
+
+
+def project(planar, xyz):
+    """
+    Project points on many planes at once, see :meth:`PlanarSurface._project`
+
+    :param planar: an array of N elements of dtype planar_array_dt
+    :param xyz: an array of shape (M, 3) or (M, N, 3)
+    :returns: three arrays of shape (M, N): distances, xx and yy
+    """
+    if len(xyz.shape) == 2:
+        xyz = xyz[:, None]  # shape (M, 1, 3)
+    dists = (planar['normal'] * xyz).sum(axis=-1) + planar['d']
+    projs = xyz - planar['normal'] * dists[..., None]
+    vectors2d = projs - planar['zero_zero']
+    xx = (vectors2d * planar['uv1']).sum(axis=-1)
+    yy = (vectors2d * planar['uv2']).sum(axis=-1)
+    return dists, xx, yy
+
+
+def get_min_distance(planar, xyz):
+    """
+    :param planar: an array of N elements of dtype planar_array_dt
+    :param xyz: an array of shape (M, 3) with the cartesian coordinates
+    :returns: the distances to each plane as an array of shape (M, N)
+    """
+    # see PlanarSurface.get_min_distance for the explanation
+    dists, xx, yy = project(planar, xyz)
+    mxx = numpy.select([xx < 0, xx > planar['length']],
+                       [xx, xx - planar['length']], 0)
+    myy = numpy.select([yy < 0, yy > planar['width']],
+                       [yy, yy - planar['width']], 0)
+    return numpy.sqrt(dists ** 2 + mxx ** 2 + myy ** 2)
+
+
+def get_joyner_boore_distance(planar, lons, lats):
+    """
+    :param planar: an array of N elements of dtype planar_array_dt
+    :param lons: an array of M longitudes
+    :param lats: an array of M latitudes
+    :returns: the Joyner-Boore distances as an array of shape (M, N)
+    """
+    # see PlanarSurface.get_joyner_boore_distance for the explanation
+    arcs_lons = planar['corner_lons'][:, [0, 2, 0, 1]]  # shape (N, 4)
+    arcs_lats = planar['corner_lats'][:, [0, 2, 0, 1]]
+    strike = planar['strike'][:, None]
+    downdip = (strike + 90) % 360
+    arcs_azimuths = numpy.concatenate([strike, strike, downdip, downdip], 1)
+    dists_to_arcs = geodetic.distance_to_arc(
+        arcs_lons, arcs_lats, arcs_azimuths,
+        lons.reshape(-1, 1, 1), lats.reshape(-1, 1, 1))  # shape (M, N, 4)
+    corners = geo_utils.spherical_to_cartesian(
+        planar['corner_lons'], planar['corner_lats'])  # shape (N, 4, 3)
+    points = geo_utils.spherical_to_cartesian(lons.flat, lats.flat)
+    dists_to_corners = numpy.sqrt(((
+        points[:, None, None] - corners) ** 2).sum(axis=-1)).min(axis=-1)
+    ds1, ds2, ds3, ds4 = numpy.sign(dists_to_arcs).transpose(2, 0, 1)
+    dists_to_arcs = numpy.abs(dists_to_arcs).reshape(
+        dists_to_arcs.shape[:2] + (2, 2)).min(axis=-1)
+    return numpy.select(
+        [(ds1 == ds2) & (ds3 == ds4), ds1 == ds2, ds3 == ds4],
+        [dists_to_corners, dists_to_arcs[..., 0], dists_to_arcs[..., 1]], 0)
+
 
 @with_slots
 class PlanarSurface(BaseSurface):
@@ -184,6 +293,38 @@ class PlanarSurface(BaseSurface):
         self = cls(strike, dip, tl, tr, br, bl, check=False)
         return self
 
+    @classmethod
+    def from_corners(cls, lons, lats, depths):
+        """
+        Build many planar surfaces at once, without checking them.
+
+        :param lons: longitudes of the corners, an array of shape (N, 4)
+        :param lats: latitudes of the corners, an array of shape (N, 4)
+        :param depths: depths of the corners, an array of shape (N, 4)
+        :returns: a list of N :class:`PlanarSurface` instances
+        """
+        return [cls.from_record(rec)
+                for rec in build_planar_array(lons, lats, depths)]
+
+    @classmethod
+    def from_record(cls, rec):
+        """
+        Build a planar surface without checking it.
+
+        :param rec: a record with the fields of planar_array_dt
+        :returns: a :class:`PlanarSurface` instance
+        """
+        # avoid calling PlanarSurface's constructor
+        self = object.__new__(cls)
+        for name in planar_array_dt.names:
+            setattr(self, name, rec[name].copy())
+        self.strike = float(self.strike)
+        self.dip = float(self.dip)
+        self.width = float(self.width)
+        self.length = float(self.length)
+        self.d = float(self.d)
+        return self
+
     def _init_plane(self):
         """
         Prepare everything needed for projecting arbitrary points on a plane
@@ -20,13 +20,12 @@
 Module :mod:`openquake.hazardlib.geo.utils` contains functions that are common
 to several geographical primitives and some other low-level spatial operations.
 """
-import math
 import logging
-import operator
 import collections
 
 import numpy
 from scipy.spatial import cKDTree
+from shapely import vectorized
 import shapely.geometry
 
 from openquake.baselib.hdf5 import vstr
@@ -58,8 +57,8 @@ def angular_distance(km, lat, lat2=None):
     """
     if lat2 is not None:
         # use the largest latitude to compute the angular distance
-        lat = max(abs(lat), abs(lat2))
-    return km * KM_TO_DEGREES / math.cos(lat * DEGREES_TO_RAD)
+        lat = numpy.maximum(numpy.abs(lat), numpy.abs(lat2))
+    return km * KM_TO_DEGREES / numpy.cos(lat * DEGREES_TO_RAD)
 
 
 class SiteAssociationError(Exception):
@@ -70,7 +69,8 @@ class _GeographicObjects(object):
     """
     Store a collection of geographic objects, i.e. objects with lons, lats.
     It is possible to extract the closest object to a given location by
-    calling the method .get_closest(lon, lat).
+    calling the method .get_closest(lon, lat), or the closest objects to
+    many locations at once by calling the method .query(lons, lats).
     """
     def __init__(self, objects):
         self.objects = objects
@@ -101,6 +101,24 @@ class _GeographicObjects(object):
         min_dist, idx = self.kdtree.query(xyz)
         return self.objects[idx], min_dist
 
+    def query(self, lons, lats, assoc_dist=None):
+        """
+        Find the closest objects to the given points with a single
+        query on the KD-tree.
+
+        :param lons: longitudes in degrees
+        :param lats: latitudes in degrees
+        :param assoc_dist: if given, ignore the objects more distant than that
+        :returns: (distances, indices); for the points with nothing closer
+                  than assoc_dist the distance is infinite and the index is
+                  equal to the number of objects
+        """
+        xyz = spherical_to_cartesian(lons, lats)
+        if assoc_dist is None:
+            return self.kdtree.query(xyz, n_jobs=-1)
+        return self.kdtree.query(
+            xyz, distance_upper_bound=assoc_dist, n_jobs=-1)
+
     def assoc(self, sitecol, assoc_dist, mode):
         """
         :param sitecol: a (filtered) site collection
@@ -109,31 +127,31 @@ class _GeographicObjects(object):
         :returns: filtered site collection, filtered objects, discarded
         """
         assert mode in 'strict warn filter', mode
-        dic = {}
-        discarded = []
-        for sid, lon, lat in zip(sitecol.sids, sitecol.lons, sitecol.lats):
-            obj, distance = self.get_closest(lon, lat)
-            if assoc_dist is None:
-                dic[sid] = obj  # associate all
-            elif distance <= assoc_dist:
-                dic[sid] = obj  # associate within
-            elif mode == 'warn':
-                dic[sid] = obj  # associate outside
+        lons, lats = sitecol.lons, sitecol.lats
+        dists, idxs = self.query(lons, lats)
+        if assoc_dist is None:  # associate all
+            ok = numpy.ones(len(dists), bool)
+        else:  # associate within
+            ok = dists <= assoc_dist
+        far, = (~ok).nonzero()
+        if len(far) and mode == 'strict':
+            i = far[0]
+            raise SiteAssociationError(
+                'There is nothing closer than %s km '
+                'to site (%s %s)' % (assoc_dist, lons[i], lats[i]))
+        elif len(far) and mode == 'warn':
+            for i in far:  # associate outside
+                obj = self.objects[idxs[i]]
                 logging.warning(
                     'The closest vs30 site (%.1f %.1f) is distant more than %d'
                     ' km from site #%d (%.1f %.1f)', obj['lon'], obj['lat'],
-                    int(distance), sid, lon, lat)
-            elif mode == 'filter':
-                discarded.append(obj)
-            elif mode == 'strict':
-                raise SiteAssociationError(
-                    'There is nothing closer than %s km '
-                    'to site (%s %s)' % (assoc_dist, lon, lat))
-        if not dic:
+                    int(dists[i]), sitecol.sids[i], lons[i], lats[i])
+            ok[:] = True
+        if not ok.any():
             raise SiteAssociationError(
                 'No sites could be associated within %s km' % assoc_dist)
-        sids = sorted(dic)
-        return (sitecol.filtered(sids), numpy.array([dic[s] for s in sids]),
+        discarded = self.objects[idxs[~ok]]
+        return (sitecol.filtered(sitecol.sids[ok]), self.objects[idxs[ok]],
                 discarded)
 
     def assoc2(self, assets_by_site, assoc_dist, mode, asset_refs):
@@ -151,32 +169,38 @@ class _GeographicObjects(object):
         self.objects.filtered  # self.objects must be a SiteCollection
         asset_dt = numpy.dtype(
             [('asset_ref', vstr), ('lon', F32), ('lat', F32)])
-        assets_by_sid = collections.defaultdict(list)
-        discarded = []
-        for assets in assets_by_site:
-            lon, lat = assets[0].location
-            obj, distance = self.get_closest(lon, lat)
-            if distance <= assoc_dist:
-                # keep the assets, otherwise discard them
-                assets_by_sid[obj['sids']].extend(assets)
-            elif mode == 'strict':
-                raise SiteAssociationError(
-                    'There is nothing closer than %s km '
-                    'to site (%s %s)' % (assoc_dist, lon, lat))
-            else:
-                discarded.extend(assets)
-        sids = sorted(assets_by_sid)
-        if not sids:
+        lons, lats = numpy.array(
+            [assets[0].location for assets in assets_by_site]).T
+        dists, idxs = self.query(lons, lats, assoc_dist)
+        ok = dists <= assoc_dist
+        if mode == 'strict' and not ok.all():
+            i = (~ok).nonzero()[0][0]
+            raise SiteAssociationError(
+                'There is nothing closer than %s km '
+                'to site (%s %s)' % (assoc_dist, lons[i], lats[i]))
+        if not ok.any():
             raise SiteAssociationError(
                 'Could not associate any site to any assets within the '
                 'asset_hazard_distance of %s km' % assoc_dist)
-        assets_by_site = [
-            sorted(assets_by_sid[sid], key=operator.attrgetter('ordinal'))
-            for sid in sids]
+        # group the associated assets by site ID and ordinal
+        assets, sids = [], []
+        discarded = []
+        for assets_, good, idx in zip(assets_by_site, ok, idxs):
+            if good:
+                assets.extend(assets_)
+                sids.append(numpy.repeat(idx, len(assets_)))
+            else:
+                discarded.extend(assets_)
+        sids = self.objects.sids[numpy.concatenate(sids)]
+        ordinals = numpy.array([asset.ordinal for asset in assets])
+        order = numpy.lexsort((ordinals, sids))
+        usids, starts = numpy.unique(sids[order], return_index=True)
+        assets_by_site = [[assets[i] for i in indices]
+                          for indices in numpy.split(order, starts[1:])]
         data = [(asset_refs[asset.ordinal],) + asset.location
                 for asset in discarded]
         discarded = numpy.array(data, asset_dt)
-        return self.objects.filtered(sids), assets_by_site, discarded
+        return self.objects.filtered(usids), assets_by_site, discarded
 
 
 def assoc(objects, sitecol, assoc_dist, mode, asset_refs=()):
@@ -611,6 +635,39 @@ def cross_idl(lon1, lon2, *lons):
     return l1 * l2 < 0 and abs(l1 - l2) > 180
 
 
+def within(region, lons, lats):
+    """
+    Vectorized point-in-polygon test, with a bounding box prefilter.
+    Regions crossing the international date line are supported, provided
+    they are given with longitudes in the range [0, 360], since a polygon
+    with an edge longer than 180 degrees is a perfectly valid wide region:
+
+    >>> region = shapely.geometry.Polygon(
+    ...     [(179, 0), (181, 0), (181, 1), (179, 1)])
+    >>> within(region, [179.5, -179.5, 0], [.5, .5, .5])
+    array([ True,  True, False])
+    >>> region = shapely.geometry.Polygon(
+    ...     [(-100, -10), (100, -10), (100, 10), (-100, 10)])
+    >>> within(region, [0, 150], [0, 0])
+    array([ True, False])
+
+    :param region: a shapely polygon in longitude, latitude coordinates
+    :param lons: longitudes of the points
+    :param lats: latitudes of the points
+    :returns: a boolean mask, True for the points inside the region
+    """
+    lons = numpy.array(lons, float)
+    lats = numpy.array(lats, float)
+    min_lon, min_lat, max_lon, max_lat = region.bounds
+    if max_lon > 180:  # region in the range [0, 360]
+        lons %= 360
+    mask = ((min_lon <= lons) & (lons <= max_lon) &
+            (min_lat <= lats) & (lats <= max_lat))
+    if mask.any():
+        mask[mask] = vectorized.contains(region, lons[mask], lats[mask])
+    return mask
+
+
 def plane_fit(points):
     """
     This fits an n-dimensional plane to a set of points. See
@@ -32,6 +32,7 @@ import shapely.geometry
 from openquake.hazardlib.gsim.bradley_2013 import (
     Bradley2013LHC, convert_to_LHC)
 from openquake.hazardlib import const
+from openquake.hazardlib.geo.utils import within
 from openquake.hazardlib.imt import PGA
 
 
@@ -640,10 +641,7 @@ class Bradley2013bChchMaps(Bradley2013bChchCBD):
              (172.6123, -43.5289), (172.6124, -43.5245),
              (172.6220, -43.5233)]
         )
-        points = [shapely.geometry.Point(lons[ind], lats[ind])
-                  for ind in np.arange(len(lons))]
-        in_cbd = np.asarray([polygon.contains(point)
-                             for point in points])
+        in_cbd = within(polygon, lons, lats)
 
         return in_cbd
 
@@ -660,11 +658,7 @@ class Bradley2013bChchMaps(Bradley2013bChchCBD):
         # communication, 10 August 2018)
         polygon = shapely.geometry.Polygon([(171.6, -43.3), (173.2, -43.3),
                                             (173.2, -43.9), (171.6, -43.9)])
-        points_in_polygon = [
-            shapely.geometry.Point(lons[i], lats[i]).within(polygon)
-            for i in np.arange(len(lons))
-        ]
-        in_cshm = any(points_in_polygon)
+        in_cshm = bool(within(polygon, lons, lats).any())
 
         return in_cshm
 
@@ -23,6 +23,7 @@ in the form of binary tables, and
 :class:`openquake.hazardlib.gsim.gmpe_table.AmplificationTable` for defining
 the corresponding amplification of the IMLs
 """
+import collections
 from copy import deepcopy
 
 import h5py
@@ -283,6 +284,12 @@ class GMPETable(GMPE):
 
     iii) The IML values are then interpolated to the correct distance via
          linear-D|linear-IML interpolation
+
+    The tables interpolated at the period of a given IMT and the vectors
+    interpolated at a given magnitude are cached, since the same pairs
+    (magnitude, IMT) are requested again and again for different ruptures.
+    The magnitude cache keeps at most `MAG_CACHE_SIZE` vectors, discarding
+    the least recently used ones; the caches are not pickled.
     """
     DEFINED_FOR_TECTONIC_REGION_TYPE = ""
 
@@ -300,6 +307,8 @@ class GMPETable(GMPE):
 
     gmpe_table = None  # see subclasses like NBCC2015_AA13_activecrustFRjb_low
 
+    MAG_CACHE_SIZE = 1000  # max number of vectors in the magnitude cache
+
     amplification = None
 
     def __init__(self, **kwargs):
@@ -308,6 +317,7 @@ class GMPETable(GMPE):
         the tables from hdf5 and hold them in memory.
         """
         super().__init__(**kwargs)
+        self._init_caches()
         fname = self.kwargs.get('gmpe_table', self.gmpe_table)
         with h5py.File(fname, "r") as fle:
             self.distance_type = decode(fle["Distances"].attrs["metric"])
@@ -328,6 +338,22 @@ class GMPETable(GMPE):
             if "Amplification" in fle:
                 self._setup_amplification(fle)
 
+    def _init_caches(self):
+        self._period_tables = {}  # (val_type, imt) -> log10 table (D, M)
+        # (val_type, imt, mag) -> vector of size D, in LRU order
+        self._mag_tables = collections.OrderedDict()
+
+    def __getstate__(self):
+        # do not send the cached tables to the workers
+        state = self.__dict__.copy()
+        del state['_period_tables']
+        del state['_mag_tables']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_caches()
+
     def _setup_standard_deviations(self, fle):
         """
         Reads the standard deviation tables from hdf5 and stores them in
@@ -391,8 +417,7 @@ class GMPETable(GMPE):
         # Return Distance Tables
         imls = self._return_tables(rctx.mag, imt, "IMLs")
         # Get distance vector for the given magnitude
-        idx = numpy.searchsorted(self.m_w, rctx.mag)
-        dists = self.distances[:, 0, idx - 1]
+        dists = self.get_distances(rctx.mag)
         # Get mean and standard deviations
         mean = self._get_mean(imls, dctx, dists)
         stddevs = self._get_stddevs(dists, rctx.mag, dctx, imt, stddev_types)
@@ -411,6 +436,32 @@ class GMPETable(GMPE):
         else:
             return numpy.log(mean), stddevs
 
+    def get_distances(self, mags):
+        """
+        :param mags: a magnitude or an array of N magnitudes
+        :returns: the distance vector(s) of the table, of shape D or (D, N)
+        """
+        idx = numpy.searchsorted(self.m_w, mags)
+        return self.distances[:, 0, idx - 1]
+
+    def get_tables(self, mags, imt, stddev_types=()):
+        """
+        Returns the tables interpolated at many magnitudes at once.
+
+        :param mags: an array of N magnitudes
+        :param imt: an intensity measure type
+        :param stddev_types: a list of S standard deviation types
+        :returns:
+            the distances and the IMLs, arrays of shape (D, N), and
+            the standard deviations, an array of shape (S, D, N)
+        """
+        mags = numpy.asarray(mags, float)
+        dists = self.get_distances(mags)
+        imls = self._return_tables(mags, imt, "IMLs")
+        sigmas = numpy.array([self._return_tables(mags, imt, stddev_type)
+                              for stddev_type in stddev_types])
+        return dists, imls, sigmas
+
     def _get_mean(self, data, dctx, dists):
         """
         Returns the mean intensity measure level from the tables
@@ -421,21 +472,16 @@ class GMPETable(GMPE):
         :param distances:
             The distance vector for the given magnitude and IMT
         """
-        # For values outside of the interpolation range use -999. to ensure
-        # value is identifiable and outside of potential real values
-        interpolator_mean = interp1d(dists, data,
-                                     bounds_error=False,
-                                     fill_value=-999.)
-        mean = interpolator_mean(getattr(dctx, self.distance_type))
+        distances = getattr(dctx, self.distance_type)
+        # For distances between the final distance and a margin of 0.001
+        # km the interpolation returns the value at the final distance
+        mean = numpy.interp(distances, dists, data)
         # For those distances less than or equal to the shortest distance
         # extrapolate the shortest distance value
-        mean[getattr(dctx, self.distance_type) < (dists[0] + 1.0E-3)] = data[0]
+        mean[distances < (dists[0] + 1.0E-3)] = data[0]
         # For those distances significantly greater than the furthest distance
         # set to 1E-20.
-        mean[getattr(dctx, self.distance_type) > (dists[-1] + 1.0E-3)] = 1E-20
-        # If any distance is between the final distance and a margin of 0.001
-        # km then assign to smallest distance
-        mean[mean < -1.] = data[-1]
+        mean[distances > (dists[-1] + 1.0E-3)] = 1E-20
         return mean
 
     def _get_stddevs(self, dists, mag, dctx, imt, stddev_types):
@@ -458,22 +504,52 @@ class GMPETable(GMPE):
                 raise ValueError("Standard Deviation type %s not supported"
                                  % stddev_type)
             sigma = self._return_tables(mag, imt, stddev_type)
-            interpolator_std = interp1d(dists, sigma,
-                                        bounds_error=False)
-            stddev = interpolator_std(getattr(dctx, self.distance_type))
-            stddev[getattr(dctx, self.distance_type) < dists[0]] = sigma[0]
-            stddev[getattr(dctx, self.distance_type) > dists[-1]] = sigma[-1]
-            stddevs.append(stddev)
+            # outside the distance range the values at the extremes are used
+            stddevs.append(numpy.interp(
+                getattr(dctx, self.distance_type), dists, sigma))
         return stddevs
 
     def _return_tables(self, mag, imt, val_type):
         """
         Returns the vector of ground motions or standard deviations
         corresponding to the specific magnitude and intensity measure type.
+        If an array of N magnitudes is passed, returns an array of shape
+        (D, N). The vectors for scalar magnitudes are cached.
 
         :param val_type:
             String indicating the type of data {"IMLs", "Total", "Inter" etc}
         """
+        if numpy.ndim(mag):
+            return 10. ** self._interp_mags(
+                mag, self._get_period_table(imt, val_type))
+        key = (val_type, str(imt), mag)
+        try:
+            table = self._mag_tables[key]
+        except KeyError:
+            table = 10. ** self._interp_mags(
+                mag, self._get_period_table(imt, val_type))
+            table.flags.writeable = False  # the cached table is shared
+            self._mag_tables[key] = table
+            if len(self._mag_tables) > self.MAG_CACHE_SIZE:
+                self._mag_tables.popitem(last=False)
+        else:
+            self._mag_tables.move_to_end(key)
+        return table
+
+    def _get_period_table(self, imt, val_type):
+        """
+        Returns the log10 of the table of ground motions or standard
+        deviations for the given intensity measure type, with shape (D, M).
+        The tables are cached.
+
+        :param val_type:
+            String indicating the type of data {"IMLs", "Total", "Inter" etc}
+        """
+        key = (val_type, str(imt))
+        try:
+            return self._period_tables[key]
+        except KeyError:
+            pass
         if imt.name in 'PGA PGV':
             # Get scalar imt
             if val_type == "IMLs":
@@ -481,7 +557,7 @@ class GMPETable(GMPE):
             else:
                 iml_table = self.stddevs[val_type][imt.name][:]
             n_d, n_s, n_m = iml_table.shape
-            iml_table = iml_table.reshape([n_d, n_m])
+            table = numpy.log10(iml_table.reshape([n_d, n_m]))
         else:
             if val_type == "IMLs":
                 periods = self.imls["T"][:]
@@ -501,29 +577,38 @@ class GMPETable(GMPE):
             interpolator = interp1d(numpy.log10(periods),
                                     numpy.log10(iml_table),
                                     axis=1)
-            iml_table = 10. ** interpolator(numpy.log10(imt.period))
-        return self.apply_magnitude_interpolation(mag, iml_table)
+            table = interpolator(numpy.log10(imt.period))
+        self._period_tables[key] = table
+        return table
 
     def apply_magnitude_interpolation(self, mag, iml_table):
         """
         Interpolates the tables to the required magnitude level
 
-        :param float mag:
-            Magnitude
+        :param mag:
+            Magnitude or array of magnitudes
         :param iml_table:
             Intensity measure level table
         """
-        # do not allow "mag" to exceed maximum table magnitude
-        if mag > self.m_w[-1]:
-            mag = self.m_w[-1]
+        return 10.0 ** self._interp_mags(mag, numpy.log10(iml_table))
 
+    def _interp_mags(self, mag, log_table):
+        # linear interpolation of a table of shape (D, M) along the
+        # magnitude axis; returns an array of shape D or (D, N)
+        mags = numpy.asarray(mag, float)
+        # do not allow "mag" to exceed maximum table magnitude
+        mags = numpy.minimum(mags, self.m_w[-1])
         # Get magnitude values
-        if mag < self.m_w[0] or mag > self.m_w[-1]:
+        if (mags < self.m_w[0]).any():
             raise ValueError("Magnitude %.2f outside of supported range "
-                             "(%.2f to %.2f)" % (mag,
+                             "(%.2f to %.2f)" % (mags.min(),
                                                  self.m_w[0],
                                                  self.m_w[-1]))
         # It is assumed that log10 of the spectral acceleration scales
         # linearly (or approximately linearly) with magnitude
-        m_interpolator = interp1d(self.m_w, numpy.log10(iml_table), axis=1)
-        return 10.0 ** m_interpolator(mag)
+        idx = numpy.clip(numpy.searchsorted(self.m_w, mags, 'right') - 1,
+                         0, len(self.m_w) - 2)
+        m_lo, m_hi = self.m_w[idx], self.m_w[idx + 1]
+        weight = (mags - m_lo) / (m_hi - m_lo)
+        return (log_table[:, idx] * (1. - weight) +
+                log_table[:, idx + 1] * weight)
@@ -26,6 +26,7 @@ import shapely.geometry
 from openquake.hazardlib.gsim.base import CoeffsTable
 from openquake.hazardlib.gsim.mcverry_2006 import McVerry2006AscSC
 from openquake.hazardlib import const
+from openquake.hazardlib.geo.utils import within
 from openquake.hazardlib.imt import PGA, SA
 
 
@@ -170,10 +171,7 @@ class McVerry2006Chch(McVerry2006AscSC):
         # communication, 10 August 2018)
         polygon = shapely.geometry.Polygon([(171.6, -43.3), (173.2, -43.3),
                                             (173.2, -43.9), (171.6, -43.9)])
-        points_in_polygon = [
-            shapely.geometry.Point(lons[i], lats[i]).within(polygon)
-            for i in np.arange(len(lons))]
-        in_cshm = any(points_in_polygon)
+        in_cshm = bool(within(polygon, lons, lats).any())
 
         return in_cshm
 
@@ -487,8 +487,7 @@ class NGAEastBaseGMPE(GMPETable):
         # Return Distance Tables
         imls = self._return_tables(rctx.mag, imt, "IMLs")
         # Get distance vector for the given magnitude
-        idx = np.searchsorted(self.m_w, rctx.mag)
-        dists = self.distances[:, 0, idx - 1]
+        dists = self.get_distances(rctx.mag)
         # Get mean and standard deviations
         mean = self._get_mean(imls, dctx, dists)
         nsites = getattr(dctx, self.distance_type).shape
@@ -202,7 +202,12 @@ def get_source_model_04(node, fname, converter=default):
 
 
 @node_to_obj.add(('sourceModel', 'nrml/0.5'))
-def get_source_model_05(node, fname, converter=default):
+def get_source_model_05(node, fname, converter=default, sources=None):
+    """
+    :param sources:
+        None or a dictionary id(sourceGroup node) -> list of pairs
+        (source node, source) with the sources already converted
+    """
     converter.fname = fname
     groups = []  # expect a sequence of sourceGroup nodes
     for src_group in node:
@@ -211,7 +216,11 @@ def get_source_model_05(node, fname, converter=default):
                 '%s: you have an incorrect declaration '
                 'xmlns="http://openquake.org/xmlns/nrml/0.5"; it should be '
                 'xmlns="http://openquake.org/xmlns/nrml/0.4"' % fname)
-        sg = converter.convert_node(src_group)
+        if sources is None:
+            sg = converter.convert_node(src_group)
+        else:
+            sg = converter.convert_sourceGroup(
+                src_group, sources[id(src_group)])
         if len(sg):
             # a source group can be empty if the source_id filtering is on
             groups.append(sg)
@@ -306,6 +315,46 @@ validators = {
 }
 
 
+def read_source_model(fname, converter=default):
+    """
+    Convert a source model file into a SourceModel instance. The files
+    in NRML 0.5 format are parsed in streaming mode, i.e. the sources are
+    converted as soon as they are read and their nodes are discarded,
+    without keeping the full tree in memory.
+
+    :param fname: a source model file
+    :param converter: a SourceConverter instance
+    """
+    [node] = read(fname, stop='sourceGroup')  # the full tree for NRML 0.4
+    if (get_tag_version(node) != ('sourceModel', 'nrml/0.5') or
+            not any('sourceGroup' in grp.tag for grp in node)):
+        return node_to_obj(node, fname, converter)
+    converter.fname = fname
+    parser = ValidatingXmlParser(validators)
+    sources = collections.defaultdict(list)  # id(group node) -> pairs
+    for grp_node, src_node in parser.parse_iter(fname, 'sourceGroup'):
+        src = converter.convert_node(src_node)
+        # keep only the information needed in convert_sourceGroup
+        src_node = Node(src_node.tag, src_node.attrib, lineno=src_node.lineno)
+        sources[id(grp_node)].append((src_node, src))
+    [sm_node] = parser.root
+    return get_source_model_05(sm_node, fname, converter, sources)
+
+
+def stream(fname, parents):
+    """
+    Parse a NRML file in streaming mode, see
+    :meth:`openquake.baselib.node.ValidatingXmlParser.parse_iter`
+
+    :param fname: the name of the file to parse
+    :param parents: a tag or a list of tags (without namespace)
+    :yields: validated nodes, children of the nodes with the given tags
+    """
+    for parent, node in ValidatingXmlParser(validators).parse_iter(
+            fname, parents):
+        yield node
+
+
 def read_source_models(fnames, converter, monitor):
     """
     :param fnames:
@@ -319,7 +368,7 @@ def read_source_models(fnames, converter, monitor):
     """
     for fname in fnames:
         if fname.endswith(('.xml', '.nrml')):
-            sm = to_python(fname, converter)
+            sm = read_source_model(fname, converter)
         else:
             raise ValueError('Unrecognized extension in %s' % fname)
         sm.fname = fname
@@ -21,10 +21,9 @@ Module :mod:`openquake.hazardlib.site` defines :class:`Site`.
 """
 import numpy
 import collections
-from shapely import geometry
 from openquake.baselib.general import split_in_blocks, not_equal, get_duplicates
 from openquake.hazardlib.geo.utils import (
-    fix_lon, cross_idl, _GeographicObjects)
+    fix_lon, cross_idl, within, _GeographicObjects)
 from openquake.hazardlib.geo.mesh import Mesh
 
 U32LIMIT = 2 ** 32
@@ -425,9 +424,7 @@ class SiteCollection(object):
         :param region: a shapely polygon
         :returns: a filtered SiteCollection of sites within the region
         """
-        mask = numpy.array([
-            geometry.Point(rec['lon'], rec['lat']).within(region)
-            for rec in self.array])
+        mask = within(region, self.array['lon'], self.array['lat'])
         return self.filter(mask)
 
     def within_bbox(self, bbox):
@@ -17,14 +17,40 @@
 Module :mod:`openquake.hazardlib.source.area` defines :class:`AreaSource`.
 """
 import math
-from copy import deepcopy
 from openquake.hazardlib import geo, mfd
-from openquake.hazardlib.source.point import PointSource
+from openquake.hazardlib.geo.surface.planar import build_planar_array
+from openquake.hazardlib.source.point import (
+    PointSource, build_rupture_array, rupture_from_record)
 from openquake.hazardlib.source.base import ParametricSeismicSource
-from openquake.hazardlib.source.rupture import ParametricProbabilisticRupture
 from openquake.baselib.slots import with_slots
 
 
+def translate_rupture_array(ref, p1, p2):
+    """
+    Translate an array of ruptures preserving their geometry, see
+    :meth:`openquake.hazardlib.geo.surface.planar.PlanarSurface.translate`.
+
+    :param ref: an array of dtype rupture_array_dt with epicenter ``p1``
+    :param p1: the original epicenter, a Point instance
+    :param p2: the new epicenter, a Point instance
+    :returns: a new array of dtype rupture_array_dt with epicenter ``p2``
+    """
+    azimuth = geo.geodetic.azimuth(p1.longitude, p1.latitude,
+                                   p2.longitude, p2.latitude)
+    distance = geo.geodetic.geodetic_distance(p1.longitude, p1.latitude,
+                                              p2.longitude, p2.latitude)
+    lons, lats = geo.geodetic.point_at(
+        ref['corner_lons'], ref['corner_lats'], azimuth, distance)
+    planar = build_planar_array(lons, lats, ref['corner_depths'])
+    arr = ref.copy()
+    for name in ('corner_lons', 'corner_lats', 'normal', 'd', 'uv1', 'uv2',
+                 'zero_zero'):
+        arr[name] = planar[name]
+    arr['hypo'][:, 0] = p2.longitude
+    arr['hypo'][:, 1] = p2.latitude
+    return arr
+
+
 @with_slots
 class AreaSource(ParametricSeismicSource):
     """
@@ -98,38 +124,17 @@ class AreaSource(ParametricSeismicSource):
         # generate "reference ruptures" -- all the ruptures that have the same
         # epicenter location (first point of the polygon's mesh) but different
         # magnitudes, nodal planes, hypocenters' depths and occurrence rates
-        # NB: all this mumbo-jumbo is done to avoid multiple calls to
-        # PointSource._get_rupture_surface
-        ref_ruptures = []
-        for mag, mag_occ_rate in self.get_annual_occurrence_rates():
-            for np_prob, np in self.nodal_plane_distribution.data:
-                for hc_prob, hc_depth in self.hypocenter_distribution.data:
-                    hypocenter = geo.Point(latitude=epicenter0.latitude,
-                                           longitude=epicenter0.longitude,
-                                           depth=hc_depth)
-                    occurrence_rate = (mag_occ_rate * np_prob * hc_prob
-                                       * rate_scaling_factor)
-                    surface, nhc = PointSource._get_rupture_surface(
-                        self, mag, np, hypocenter)
-                    if kwargs.get('shift_hypo'):
-                        hc_depth = nhc.depth
-                    ref_ruptures.append((mag, np.rake, hc_depth,
-                                         surface, occurrence_rate))
+        ref = build_rupture_array(
+            self, epicenter0.longitude, epicenter0.latitude,
+            kwargs.get('shift_hypo'))
+        ref['occurrence_rate'] *= rate_scaling_factor
 
         # for each of the epicenter positions generate as many ruptures
         # as we generated "reference" ones: new ruptures differ only
         # in hypocenter and surface location
         for epicenter in polygon_mesh:
-            for mag, rake, hc_depth, surface, occ_rate in ref_ruptures:
-                # translate the surface from first epicenter position
-                # to the target one preserving it's geometry
-                surface = surface.translate(epicenter0, epicenter)
-                hypocenter = deepcopy(epicenter)
-                hypocenter.depth = hc_depth
-                rupture = ParametricProbabilisticRupture(
-                    mag, rake, self.tectonic_region_type, hypocenter,
-                    surface, occ_rate, self.temporal_occurrence_model)
-                yield rupture
+            for rec in translate_rupture_array(ref, epicenter0, epicenter):
+                yield rupture_from_record(self, rec)
 
     def count_ruptures(self):
         """
@@ -14,7 +14,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-Module :mod:`openquake.hazardlib.source.area` defines :class:`AreaSource`.
+Module :mod:`openquake.hazardlib.source.multi` defines
+:class:`MultiPointSource`.
 """
 import numpy
 from openquake.hazardlib.source.base import ParametricSeismicSource
@@ -23,7 +24,8 @@ from openquake.hazardlib.geo import utils, NodalPlane
 from openquake.hazardlib.geo.mesh import Mesh
 from openquake.hazardlib.pmf import PMF
 from openquake.hazardlib.valid import SCALEREL
-from openquake.hazardlib.source.point import PointSource
+from openquake.hazardlib.source.point import (
+    PointSource, build_rupture_array, rupture_from_record)
 
 F32 = numpy.float32
 npd_dt = numpy.dtype([('probability', F32),
@@ -89,11 +91,19 @@ class MultiPointSource(ParametricSeismicSource):
 
     def iter_ruptures(self, **kwargs):
         """
-        Yield the ruptures of the underlying point sources
+        Yield the ruptures of the underlying points, built directly from
+        the arrays of the source without instantiating point sources
         """
-        for ps in self:
-            for rupture in ps.iter_ruptures(**kwargs):
-                yield rupture
+        shift_hypo = kwargs.get('shift_hypo')
+        for mfd, lon, lat in zip(self.mfd, self.mesh.lons, self.mesh.lats):
+            mag_rates = [(mag, rate)
+                         for mag, rate in mfd.get_annual_occurrence_rates()
+                         if rate > 0 and mag >= self.min_mag]
+            if not mag_rates:
+                continue
+            for rec in build_rupture_array(
+                    self, lon, lat, shift_hypo, mag_rates):
+                yield rupture_from_record(self, rec)
 
     def count_ruptures(self):
         """
@@ -110,7 +120,16 @@ class MultiPointSource(ParametricSeismicSource):
         Bounding box containing all the point sources, enlarged by the
         maximum distance.
         """
-        return utils.get_bounding_box([ps.location for ps in self], maxdist)
+        lonlat = dict(lon=numpy.array(self.mesh.lons, float),
+                      lat=numpy.array(self.mesh.lats, float))
+        return utils.get_bounding_box(lonlat, maxdist)
+
+    def get_max_radius(self):
+        """
+        :returns: the maximum rupture projection radius of the points
+        """
+        max_mag = self.get_min_max_mag()[1]
+        return PointSource._get_max_rupture_projection_radius(self, max_mag)
 
     @property
     def polygon(self):
@@ -17,15 +17,23 @@
 Module :mod:`openquake.hazardlib.source.point` defines :class:`PointSource`.
 """
 import math
+import numpy
 from openquake.baselib.slots import with_slots
 from openquake.hazardlib.scalerel import PointMSR
 from openquake.hazardlib.geo import Point, geodetic
-from openquake.hazardlib.geo.surface.planar import PlanarSurface
+from openquake.hazardlib.geo.surface.planar import (
+    PlanarSurface, F64, planar_array_dt, build_planar_array)
 from openquake.hazardlib.geo.nodalplane import NodalPlane
 from openquake.hazardlib.source.base import ParametricSeismicSource
 from openquake.hazardlib.source.rupture import ParametricProbabilisticRupture
 from openquake.hazardlib.geo.utils import get_bounding_box
 
+# the parameters of a rupture followed by the geometry of its planar surface;
+# the field hypo contains longitude, latitude and depth of the hypocenter
+rupture_array_dt = numpy.dtype(
+    [('mag', F64), ('rake', F64), ('occurrence_rate', F64),
+     ('hypo', (F64, 3))] + planar_array_dt.descr)
+
 
 def _get_rupture_dimensions(src, mag, rake, dip):
     """
@@ -68,6 +76,110 @@ def _get_rupture_dimensions(src, mag, rake, dip):
     return rup_length, rup_width
 
 
+def build_rupture_array(src, lon, lat, shift_hypo=False, mag_rates=None):
+    """
+    Compute the parameters and the planar surfaces of all the ruptures
+    generated by a point source with epicenter ``(lon, lat)``. This is
+    a vectorized version of :meth:`PointSource._get_rupture_surface`.
+
+    :param src:
+        a PointSource or AreaSource
+    :param lon:
+        longitude of the epicenter
+    :param lat:
+        latitude of the epicenter
+    :param shift_hypo:
+        if True, use the rupture centers as hypocenters
+    :param mag_rates:
+        a list of pairs (mag, rate); if not given, use the annual occurrence
+        rates of the source
+    :returns:
+        an array of dtype rupture_array_dt, ordered by magnitude,
+        nodal plane and hypocenter depth
+    """
+    if mag_rates is None:
+        mag_rates = src.get_annual_occurrence_rates()
+    rows = []
+    for mag, mag_occ_rate in mag_rates:
+        for np_prob, np in src.nodal_plane_distribution.data:
+            rup_length, rup_width = _get_rupture_dimensions(
+                src, mag, np.rake, np.dip)
+            for hc_prob, hc_depth in src.hypocenter_distribution.data:
+                rows.append((mag, np.rake, mag_occ_rate * np_prob * hc_prob,
+                             np.strike, np.dip, rup_length, rup_width,
+                             hc_depth))
+    if not rows:  # for instance all magnitudes are below min_mag
+        return numpy.zeros(0, rupture_array_dt)
+    (mag, rake, rate, strike, dip, rup_length, rup_width,
+     hc_depth) = numpy.array(rows, F64).T
+    usd = src.upper_seismogenic_depth
+    lsd = src.lower_seismogenic_depth
+    assert ((usd <= hc_depth) & (lsd >= hc_depth)).all()
+    rdip = numpy.radians(dip)
+    azimuth_down = (strike + 90) % 360
+    azimuth_up = (azimuth_down + 180) % 360
+    rup_proj_height = rup_width * numpy.sin(rdip)
+    rup_proj_width = rup_width * numpy.cos(rdip)
+    hheight = rup_proj_height / 2.
+
+    # move the ruptures vertically to fit inside the seismogenic layer
+    vshift = usd - hc_depth + hheight
+    vshift_lower = lsd - hc_depth - hheight
+    vshift = numpy.where(
+        vshift < 0, numpy.where(vshift_lower > 0, 0, vshift_lower), vshift)
+    shifted = vshift != 0
+    clon, clat = geodetic.point_at(
+        lon, lat, numpy.where(vshift < 0, azimuth_up, azimuth_down),
+        numpy.abs(vshift / numpy.tan(rdip)))
+    clon = numpy.where(shifted, clon, lon)
+    clat = numpy.where(shifted, clat, lat)
+    cdepth = numpy.where(shifted, hc_depth + vshift, hc_depth)
+
+    # move from the rupture centers along the diagonals to the corners
+    theta = numpy.degrees(
+        numpy.arctan((rup_proj_width / 2.) / (rup_length / 2.)))
+    hor_dist = numpy.sqrt(
+        (rup_length / 2.) ** 2 + (rup_proj_width / 2.) ** 2)
+    azimuths = numpy.array([  # shape (4, N) for tl, tr, bl, br
+        (strike + 180 + theta) % 360, (strike - theta) % 360,
+        (strike + 180 - theta) % 360, (strike + theta) % 360])
+    lons, lats = geodetic.point_at(clon, clat, azimuths, hor_dist)
+    depths = numpy.array([cdepth - rup_proj_height / 2.,
+                          cdepth - rup_proj_height / 2.,
+                          cdepth + rup_proj_height / 2.,
+                          cdepth + rup_proj_height / 2.])
+    planar = build_planar_array(lons.T, lats.T, depths.T)
+    arr = numpy.zeros(len(rows), rupture_array_dt)
+    for name in planar_array_dt.names:
+        arr[name] = planar[name]
+    arr['strike'] = strike
+    arr['dip'] = dip
+    arr['mag'] = mag
+    arr['rake'] = rake
+    arr['occurrence_rate'] = rate
+    if shift_hypo:
+        arr['hypo'] = numpy.array([clon, clat, cdepth]).T
+    else:
+        arr['hypo'] = numpy.array([numpy.full_like(hc_depth, lon),
+                                   numpy.full_like(hc_depth, lat),
+                                   hc_depth]).T
+    return arr
+
+
+def rupture_from_record(src, rec):
+    """
+    :param src: the source generating the rupture
+    :param rec: a record of dtype rupture_array_dt
+    :returns: a :class:`ParametricProbabilisticRupture` instance
+    """
+    lon, lat, depth = rec['hypo']
+    return ParametricProbabilisticRupture(
+        float(rec['mag']), float(rec['rake']), src.tectonic_region_type,
+        Point(float(lon), float(lat), float(depth)),
+        PlanarSurface.from_record(rec), float(rec['occurrence_rate']),
+        src.temporal_occurrence_model)
+
+
 @with_slots
 class PointSource(ParametricSeismicSource):
     """
@@ -163,19 +275,10 @@ class PointSource(ParametricSeismicSource):
         Generate one rupture for each combination of magnitude, nodal plane
         and hypocenter depth.
         """
-        for mag, mag_occ_rate in self.get_annual_occurrence_rates():
-            for np_prob, np in self.nodal_plane_distribution.data:
-                for hc_prob, hc_depth in self.hypocenter_distribution.data:
-                    hc = Point(latitude=self.location.latitude,
-                               longitude=self.location.longitude,
-                               depth=hc_depth)
-                    occurrence_rate = mag_occ_rate * np_prob * hc_prob
-                    surface, nhc = self._get_rupture_surface(mag, np, hc)
-                    yield ParametricProbabilisticRupture(
-                        mag, np.rake, self.tectonic_region_type,
-                        nhc if kwargs.get('shift_hypo') else hc,
-                        surface, occurrence_rate,
-                        self.temporal_occurrence_model)
+        loc = self.location
+        for rec in build_rupture_array(self, loc.longitude, loc.latitude,
+                                       kwargs.get('shift_hypo')):
+            yield rupture_from_record(self, rec)
 
     def count_nphc(self):
         """
@@ -868,12 +868,15 @@ class SourceConverter(RuptureConverter):
     def convert_sourceModel(self, node):
         return [self.convert_node(subnode) for subnode in node]
 
-    def convert_sourceGroup(self, node):
+    def convert_sourceGroup(self, node, sources=None):
         """
         Convert the given node into a SourceGroup object.
 
         :param node:
             a node with tag sourceGroup
+        :param sources:
+            if not None, a list of pairs (source node, source) with the
+            sources of the group already converted (streaming mode)
         :returns:
             a :class:`SourceGroup` instance
         """
@@ -901,8 +904,10 @@ class SourceConverter(RuptureConverter):
             if isinstance(tom, PoissonTOM):
                 assert hasattr(sg, 'occurrence_rate')
         #
-        for src_node in node:
-            src = self.convert_node(src_node)
+        if sources is None:
+            sources = [(src_node, self.convert_node(src_node))
+                       for src_node in node]
+        for src_node, src in sources:
             if src is None:  # filtered out by source_id
                 continue
             # transmit the group attributes to the underlying source
@@ -920,10 +925,10 @@ class SourceConverter(RuptureConverter):
                     setattr(src, attr, node[attr])
             sg.update(src)
         if srcs_weights is not None:
-            if len(node) and len(srcs_weights) != len(node):
+            if len(sources) and len(srcs_weights) != len(sources):
                 raise ValueError(
                     'There are %d srcs_weights but %d source(s) in %s'
-                    % (len(srcs_weights), len(node), self.fname))
+                    % (len(srcs_weights), len(sources), self.fname))
             for src, sw in zip(sg, srcs_weights):
                 src.mutex_weight = sw
         # check that, when the cluster option is set, the group has a temporal
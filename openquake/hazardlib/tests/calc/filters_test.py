@@ -49,6 +49,15 @@ class IntegrationDistanceTestCase(unittest.TestCase):
         bb = maxdist.get_bounding_box(0, 10, 'default', mag=6)
         aae(bb, [-1.8263869, 8.20136, 1.8263869, 11.79864])
 
+    def test_interpolation(self):
+        maxdist = IntegrationDistance({'default': [
+            (3, 30), (4, 40), (5, 100), (6, 200), (7, 300), (8, 400)]})
+        aae(maxdist('default', mag=5.5), 150)
+        aae(maxdist('default', mag=4.25), 55)
+        aae(maxdist('default', mag=2.5), 30)  # clipped to the minimum
+        aae(maxdist('default', mag=9), 400)  # clipped to the maximum
+        aae(maxdist('default'), 400)
+
 
 class SourceFilterTestCase(unittest.TestCase):
     def test_get_bounding_boxes(self):
@@ -96,6 +105,18 @@ class SourceFilterTestCase(unittest.TestCase):
         sites = srcfilter.get_close_sites(src)
         self.assertIsNotNone(sites)
 
+    def test_within_points(self):
+        # the longitude span is computed at the latitude of the enlarged box
+        # closest to the pole, as in close_sids
+        sitecol = SiteCollection([
+            Site(location=Point(1.82, 60.8),
+                 vs30=760, vs30measured=True, z1pt0=100, z2pt5=5),
+            Site(location=Point(1.9, 60.8),
+                 vs30=760, vs30measured=True, z1pt0=100, z2pt5=5)])
+        srcfilter = SourceFilter(sitecol, IntegrationDistance({}))
+        idx = srcfilter.within_points([0, 10], [60, 60], maxdist=100)
+        self.assertEqual(list(idx), [0])
+
 
 # from https://groups.google.com/d/msg/openquake-users/P03SxJsfW_s/nCdcxj8WAAAJ
 characteric_source = '''\
@@ -16,9 +16,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
+import pickle
 import unittest
 import numpy
-from openquake.hazardlib.contexts import Effect
+from openquake.hazardlib.const import TRT
+from openquake.hazardlib.site import SiteCollection
+from openquake.hazardlib.source.point import make_rupture
+from openquake.hazardlib.contexts import (
+    Effect, DistanceCache, get_distances)
 
 dists = numpy.array([0, 10, 20, 30, 40, 50])
 intensities = {
@@ -39,3 +44,51 @@ class EffectTestCase(unittest.TestCase):
 
         dist = list(effect.dist_by_mag(1.1).values())
         numpy.testing.assert_allclose(dist, [0, 10, 13.225806, 16.666667])
+
+
+class DistanceCacheTestCase(unittest.TestCase):
+    def test(self):
+        rup = make_rupture(TRT.ACTIVE_SHALLOW_CRUST, 6., seismo=(0, 30))
+        rup.rup_id = 1
+        sites = SiteCollection.from_points([0, .1, .2], [0, .1, .2])
+        dcache = DistanceCache()
+        rrup = dcache.get(rup, sites, 'rrup')
+        self.assertIs(dcache.get(rup, sites, 'rrup'), rrup)
+        numpy.testing.assert_equal(rrup, get_distances(rup, sites, 'rrup'))
+        self.assertEqual((dcache.hits, dcache.misses), (1, 1))
+
+        # the cached distances cannot be changed by the callers
+        with self.assertRaises(ValueError):
+            rrup[0] = 0
+
+        # the distances of a subset of the sites are taken from the cache
+        rrup12 = dcache.get(rup, sites.filtered([1, 2]), 'rrup')
+        numpy.testing.assert_equal(rrup12, rrup[1:])
+        self.assertEqual((dcache.hits, dcache.misses), (2, 1))
+
+        # a different kind of distance is computed
+        rjb = dcache.get(rup, sites.filtered([1, 2]), 'rjb')
+        self.assertEqual(len(rjb), 2)
+        self.assertEqual((dcache.hits, dcache.misses), (2, 2))
+
+        # sites not in the cache replace the cached ones
+        rjb = dcache.get(rup, sites, 'rjb')
+        self.assertEqual(len(rjb), 3)
+        self.assertEqual((dcache.hits, dcache.misses), (2, 3))
+        self.assertEqual(len(dcache), 2)
+
+        # ruptures without rup_id and meshes are not cached
+        rup.rup_id = 0
+        dcache.get(rup, sites, 'rrup')
+        rup.rup_id = 1
+        dcache.get(rup, sites.mesh, 'rrup')
+        self.assertEqual(len(dcache), 2)
+
+        # the least recently used distances are discarded
+        dcache.maxbytes = dcache.nbytes
+        dcache.get(rup, sites, 'rx')
+        self.assertEqual(len(dcache), 2)
+        self.assertLessEqual(dcache.nbytes, dcache.maxbytes)
+
+        # the cache is not transferred
+        self.assertEqual(len(pickle.loads(pickle.dumps(dcache))), 0)
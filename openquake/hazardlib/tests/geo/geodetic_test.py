@@ -96,6 +96,38 @@ class TestGeodeticDistance(unittest.TestCase):
                     -82.64354555, 1149.65543285])
         # NB: the sum of the eigenvalues must be zero up to numeric errors
 
+    def test_distance_matrix_blocks(self):
+        # the result must not depend on the block size
+        lons = numpy.linspace(84, 86, 50)
+        lats = numpy.linspace(26, 29, 50)
+        dmatrix = geodetic.distance_matrix(lons, lats)
+        orig = geodetic.MAX_DISTANCES
+        geodetic.MAX_DISTANCES = 120
+        try:
+            numpy.testing.assert_equal(
+                geodetic.distance_matrix(lons, lats), dmatrix)
+        finally:
+            geodetic.MAX_DISTANCES = orig
+
+
+class NearestTestCase(unittest.TestCase):
+    def test_kdtree_vs_brute_force(self):
+        rng = numpy.random.RandomState(42)
+        xyz = geodetic.spherical_to_cartesian(
+            rng.uniform(10, 11, 2000), rng.uniform(45, 46, 2000),
+            rng.uniform(0, 20, 2000))
+        points = geodetic.spherical_to_cartesian(
+            rng.uniform(9, 12, 1000), rng.uniform(44, 47, 1000))
+        dists, idxs = geodetic.nearest(xyz, points)  # KD-tree
+        orig = geodetic.KDTREE_MIN_POINTS
+        geodetic.KDTREE_MIN_POINTS = 1E9
+        try:
+            bdists, bidxs = geodetic.nearest(xyz, points)  # brute force
+        finally:
+            geodetic.KDTREE_MIN_POINTS = orig
+        numpy.testing.assert_allclose(dists, bdists)
+        numpy.testing.assert_equal(idxs, bidxs)
+
 
 class TestAzimuth(unittest.TestCase):
     def test_LAX_to_JFK(self):
@@ -312,6 +312,31 @@ class ConcordantSurfaceTestCase(unittest.TestCase):
         ry0 = self.model.get_ry0_distance(self.mesh)
         numpy.testing.assert_array_almost_equal(expected_ry0, ry0)
 
+    def test_gc2_different_meshes(self):
+        """
+        Verifies that the GC2 coordinates are recomputed when the mesh
+        changes
+        """
+        mesh = Mesh(self.data[:10, 0], self.data[:10, 1], self.data[:10, 2])
+        self.model.get_rx_distance(mesh)
+        numpy.testing.assert_array_almost_equal(
+            self.data[:, 5], self.model.get_rx_distance(self.mesh))
+        numpy.testing.assert_array_almost_equal(
+            self.data[:, 6], self.model.get_ry0_distance(self.mesh))
+
+    def test_stacked_distances(self):
+        """
+        Verifies that the distances computed on all the surface elements
+        at once are the same as the ones computed element by element
+        """
+        surfaces = FRANK1.surfaces + [SFLT1]
+        model = MultiSurface(surfaces)
+        for meth in ('get_min_distance', 'get_joyner_boore_distance'):
+            expected = numpy.min(
+                [getattr(surf, meth)(self.mesh) for surf in surfaces], axis=0)
+            numpy.testing.assert_array_almost_equal(
+                expected, getattr(model, meth)(self.mesh))
+
 
 class DiscordantSurfaceTestCase(unittest.TestCase):
     """
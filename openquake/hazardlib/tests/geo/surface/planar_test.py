@@ -19,6 +19,7 @@ import numpy
 from openquake.hazardlib.geo import Point
 from openquake.hazardlib.geo.mesh import Mesh
 from openquake.hazardlib.geo import utils as geo_utils
+from openquake.hazardlib.geo.surface import planar
 from openquake.hazardlib.geo.surface.planar import PlanarSurface
 from openquake.hazardlib.tests.geo.surface import _planar_test_data as tdata
 
@@ -523,3 +524,32 @@ class PlanarSurfaceGetMiddlePointTestCase(unittest.TestCase):
         aac(midpoint.longitude, 0.0, atol=1E-4)
         aac(midpoint.latitude, 0.044966, atol=1E-4)
         aac(midpoint.depth, -4.0, atol=1E-4)
+
+
+class PlanarArrayTestCase(unittest.TestCase):
+    # building many surfaces at once must give the same geometry and the
+    # same distances as building them one at the time
+    def test(self):
+        surfaces = [
+            PlanarSurface.from_corner_points(
+                Point(0.0, 0.0, 0.0), Point(0.0, 0.089932, 0.0),
+                Point(0.0, 0.089932, 10.0), Point(0.0, 0.0, 10.0)),
+            PlanarSurface.from_corner_points(
+                Point(0.1, 0.1, 2.0), Point(0.2, 0.15, 2.0),
+                Point(0.22, 0.11, 12.0), Point(0.12, 0.06, 12.0))]
+        lons = numpy.array([s.corner_lons for s in surfaces])
+        lats = numpy.array([s.corner_lats for s in surfaces])
+        depths = numpy.array([s.corner_depths for s in surfaces])
+        for surf, new in zip(surfaces,
+                             PlanarSurface.from_corners(lons, lats, depths)):
+            for name in planar.planar_array_dt.names:
+                aac(getattr(new, name), getattr(surf, name))
+        mesh = Mesh(numpy.array([0.05, -0.1, 0.15, 0.3]),
+                    numpy.array([0.05, 0.2, 0.1, -0.1]),
+                    numpy.zeros(4))
+        arr = planar.build_planar_array(lons, lats, depths)
+        aac(planar.get_min_distance(arr, mesh.xyz),
+            numpy.array([s.get_min_distance(mesh) for s in surfaces]).T)
+        aac(planar.get_joyner_boore_distance(arr, mesh.lons, mesh.lats),
+            numpy.array([s.get_joyner_boore_distance(mesh)
+                         for s in surfaces]).T)
@@ -438,4 +438,32 @@ class PlaneFit(unittest.TestCase):
         self.assertAlmostEqual(self.c[-1], -sum(par*pnt), 2)
 
 
-# NB: utils.assoc is tested in the engine
+# NB: utils.assoc is tested in the engine, here only the bulk association
+class AssocTestCase(unittest.TestCase):
+    def setUp(self):
+        from openquake.hazardlib.site import SiteCollection
+        self.sitecol = SiteCollection.from_points(
+            [0, 1, 2], [0, 0, 0], req_site_params=())
+
+    def test_assoc(self):
+        sm = numpy.array([(1.01, 0, 400.), (0.01, 0, 300.), (9, 9, 200.)],
+                         [('lon', float), ('lat', float), ('vs30', float)])
+        sitecol, objs, discarded = utils.assoc(sm, self.sitecol, 10, 'filter')
+        self.assertEqual(list(sitecol.sids), [0, 1])
+        self.assertEqual(list(objs['vs30']), [300, 400])
+        self.assertEqual(list(discarded['vs30']), [400])  # closest to site 2
+        with self.assertRaises(utils.SiteAssociationError):
+            utils.assoc(sm, self.sitecol, 10, 'strict')
+
+    def test_assoc2(self):
+        Asset = collections.namedtuple('Asset', 'ordinal location')
+        assets_by_site = [[Asset(2, (1.01, 0)), Asset(0, (1.01, 0))],
+                          [Asset(1, (5, 5))],
+                          [Asset(3, (.99, 0))],
+                          [Asset(4, (0, .01))]]
+        sitecol, assets_by, discarded = utils.assoc(
+            assets_by_site, self.sitecol, 10, 'filter', 'abcde')
+        self.assertEqual(list(sitecol.sids), [0, 1])
+        self.assertEqual([[a.ordinal for a in assets] for assets in assets_by],
+                         [[4], [0, 2, 3]])
+        self.assertEqual(list(discarded['asset_ref']), ['b'])
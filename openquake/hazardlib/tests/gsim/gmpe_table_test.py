@@ -17,6 +17,7 @@
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import pickle
 import tempfile
 import unittest
 
@@ -481,6 +482,47 @@ class GSIMTableGoodTestCase(unittest.TestCase):
             str(ve.exception),
             "Spectral period 2.500 outside of valid range (0.100 to 2.000)")
 
+    def test_get_tables_many_magnitudes(self):
+        """
+        Tests that the tables interpolated at many magnitudes at once are
+        the same as the ones interpolated one magnitude at the time
+        """
+        gsim = GMPETable(gmpe_table=self.TABLE_FILE)
+        mags = np.array([5.0, 5.7, 6.5, 7.0, 7.5])
+        imt = imt_module.SA(0.5)
+        dists, imls, sigmas = gsim.get_tables(mags, imt, ["Total"])
+        self.assertEqual(imls.shape, (3, 5))
+        self.assertEqual(sigmas.shape, (1, 3, 5))
+        for i, mag in enumerate(mags):
+            np.testing.assert_array_almost_equal(
+                dists[:, i], gsim.get_distances(mag))
+            np.testing.assert_array_almost_equal(
+                imls[:, i], gsim._return_tables(mag, imt, "IMLs"))
+            np.testing.assert_array_almost_equal(
+                sigmas[0, :, i], gsim._return_tables(mag, imt, "Total"))
+        # the vectors for scalar magnitudes are cached
+        self.assertIs(gsim._return_tables(6.5, imt, "IMLs"),
+                      gsim._return_tables(6.5, imt, "IMLs"))
+
+    def test_mag_cache(self):
+        """
+        Tests that the magnitude cache is bounded and not pickled
+        """
+        gsim = GMPETable(gmpe_table=self.TABLE_FILE)
+        gsim.MAG_CACHE_SIZE = 2
+        imt = imt_module.SA(0.5)
+        table = gsim._return_tables(5.0, imt, "IMLs")
+        gsim._return_tables(6.0, imt, "IMLs")
+        gsim._return_tables(5.0, imt, "IMLs")  # now 6.0 is the oldest
+        gsim._return_tables(7.0, imt, "IMLs")
+        self.assertEqual([key[2] for key in gsim._mag_tables], [5.0, 7.0])
+        self.assertIs(gsim._return_tables(5.0, imt, "IMLs"), table)
+        new = pickle.loads(pickle.dumps(gsim))
+        self.assertEqual(len(new._mag_tables), 0)
+        self.assertEqual(len(new._period_tables), 0)
+        np.testing.assert_array_equal(
+            new._return_tables(5.0, imt, "IMLs"), table)
+
     def test_get_mean_and_stddevs_good(self):
         """
         Tests the full execution of the GMPE tables for valid data
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2019 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import pickle
+import unittest
+from openquake.hazardlib import nrml
+from openquake.hazardlib.sourceconverter import SourceConverter
+from openquake.risklib.asset import assets2array
+from openquake import qa_tests_data
+
+QA = os.path.dirname(qa_tests_data.__file__)
+
+
+def get_source_models_05():
+    # the NRML 0.5 source models with source groups in qa_tests_data
+    for dirpath, dirnames, fnames in sorted(os.walk(QA)):
+        for fname in sorted(fnames):
+            if fname.endswith('.xml'):
+                path = os.path.join(dirpath, fname)
+                with open(path, 'rb') as f:
+                    data = f.read()
+                if b'nrml/0.5' in data and b'<sourceGroup' in data:
+                    yield path
+
+
+class ReadSourceModelTestCase(unittest.TestCase):
+
+    def check(self, fname):
+        # streamed conversion vs conversion of the full tree
+        sm = nrml.to_python(fname, SourceConverter(50., 5., 5., 0.1, 10.))
+        streamed = nrml.read_source_model(
+            fname, SourceConverter(50., 5., 5., 0.1, 10.))
+        self.assertEqual(len(streamed), len(sm))
+        for grp, sgrp in zip(sm, streamed):
+            self.assertEqual(sgrp.trt, grp.trt)
+            self.assertEqual([src.source_id for src in sgrp],
+                             [src.source_id for src in grp])
+            for src, ssrc in zip(grp, sgrp):
+                self.assertEqual(pickle.dumps(vars(ssrc)),
+                                 pickle.dumps(vars(src)),
+                                 (fname, src.source_id))
+
+    def test_nrml05(self):
+        fnames = list(get_source_models_05())
+        self.assertGreater(len(fnames), 40)
+        for fname in fnames:
+            self.check(fname)
+
+    def test_nrml04(self):
+        # NRML 0.4 files are not streamed, they fall back to node_to_obj
+        fname = os.path.join(QA, 'event_based', 'case_3', 'source_model.xml')
+        sm = nrml.read_source_model(
+            fname, SourceConverter(50., 5., 5., 0.1, 10.))
+        [grp] = sm
+        self.assertEqual([src.source_id for src in grp], ['1'])
+        self.check(fname)
+
+
+class StreamExposureTestCase(unittest.TestCase):
+
+    def test_assets(self):
+        fname = os.path.join(QA, 'event_based', 'case_23',
+                             'exposure_model.xml')
+        assets = nrml.read(fname).exposureModel.assets
+        streamed = list(nrml.stream(fname, 'assets'))
+        self.assertEqual(len(streamed), 96)
+        self.assertEqual([node.to_str() for node in streamed],
+                         [node.to_str() for node in assets])
+        fields = ['id', 'lon', 'lat', 'taxonomy', 'number',
+                  'structural', 'nonstructural', 'night']
+        array = assets2array(nrml.stream(fname, 'assets'), fields, False,
+                             False)
+        expected = assets2array(assets, fields, False, False)
+        self.assertEqual(array.tolist(), expected.tolist())
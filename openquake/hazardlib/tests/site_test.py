@@ -24,6 +24,7 @@ from shapely import wkt
 from openquake.baselib import hdf5
 from openquake.hazardlib.site import Site, SiteCollection
 from openquake.hazardlib.geo.point import Point
+from openquake.hazardlib.geo.utils import within
 
 assert_eq = numpy.testing.assert_equal
 
@@ -252,6 +253,18 @@ class WithinBBoxTestCase(unittest.TestCase):
     def test1(self):
         assert_eq(self.sites.within_bbox((-182, -28, -178, -26)), [0])
 
+    def test_within_region_idl(self):
+        region = wkt.loads('POLYGON((179 -29, 181 -29, 181 -25, '
+                           '179 -25, 179 -29))')
+        assert_eq(self.sites.within(region).sids, [0, 4])
+
+    def test_within_wide_region(self):
+        # not crossing the IDL, even if the edges are longer than 180 degrees
+        region = wkt.loads('POLYGON((-100 -10, 100 -10, 100 10, '
+                           '-100 10, -100 -10))')
+        assert_eq(within(region, [0, 150, -150], [0, 0, 0]),
+                  [True, False, False])
+
 
 class SiteCollectionIterTestCase(unittest.TestCase):
 
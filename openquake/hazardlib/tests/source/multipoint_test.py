@@ -25,6 +25,8 @@ from openquake.hazardlib.geo.mesh import Mesh
 from openquake.hazardlib.scalerel.peer import PeerMSR
 from openquake.hazardlib.geo import NodalPlane
 from openquake.hazardlib.pmf import PMF
+from openquake.hazardlib.site import SiteCollection
+from openquake.hazardlib.calc.filters import SourceFilter
 
 
 class MultiPointTestCase(unittest.TestCase):
@@ -83,3 +85,34 @@ multiPointSource{id='mp1', name='multi point source', tectonicRegion='Active Sha
         numpy.testing.assert_almost_equal(
             (-0.8994569916564479, -0.39932, 1.8994569916564479, 1.89932),
             bbox)
+
+        # test the ruptures, generated directly from the arrays
+        rups = list(mps.iter_ruptures())
+        self.assertEqual(len(rups), mps.count_ruptures())
+        exp = [rup for split in splits for rup in split.iter_ruptures()]
+        for rup, ex in zip(rups, exp):
+            self.assertEqual(rup.mag, ex.mag)
+            self.assertEqual(rup.occurrence_rate, ex.occurrence_rate)
+            self.assertEqual(rup.hypocenter, ex.hypocenter)
+            numpy.testing.assert_allclose(
+                rup.surface.corner_lons, ex.surface.corner_lons)
+            numpy.testing.assert_allclose(
+                rup.surface.corner_lats, ex.surface.corner_lats)
+
+    def test_filter(self):
+        npd = PMF([(1, NodalPlane(1, 20, 3))])
+        hd = PMF([(1, 14)])
+        mesh = Mesh(numpy.array([0, 10]), numpy.array([0, 10]))
+        mmfd = MultiMFD('incrementalMFD', size=2, min_mag=[4.5],
+                        bin_width=[.1], occurRates=[[.3, .1], [.4, .2, .1]])
+        mps = MultiPointSource('mp1', 'multi point source',
+                               'Active Shallow Crust',
+                               mmfd, PeerMSR(), 1.0,
+                               10, 20, npd, hd, mesh)
+        # the site at (5, 5) is inside the bounding box of the source
+        # but far from both points, so it must be discarded
+        sitecol = SiteCollection.from_points(
+            [0.5, 5, 10.2, 20], [0.5, 5, 10.1, 20])
+        srcfilter = SourceFilter(sitecol, {'default': 100})
+        [src] = srcfilter.filter([mps])
+        numpy.testing.assert_equal(src.indices, [0, 2])
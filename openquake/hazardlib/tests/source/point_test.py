@@ -14,8 +14,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import unittest
+import numpy
 from openquake.hazardlib.const import TRT
-from openquake.hazardlib.source.point import PointSource
+from openquake.hazardlib.source.point import (
+    PointSource, build_rupture_array, rupture_array_dt)
 from openquake.hazardlib.source.rupture import ParametricProbabilisticRupture
 from openquake.hazardlib.mfd import TruncatedGRMFD, EvenlyDiscretizedMFD
 from openquake.hazardlib.scalerel.peer import PeerMSR
@@ -27,6 +29,8 @@ from openquake.hazardlib.tests.geo.surface import \
     _planar_test_data as planar_surface_test_data
 from openquake.hazardlib.tests import assert_pickleable
 
+aac = numpy.testing.assert_allclose
+
 
 def make_point_source(lon=1.2, lat=3.4, **kwargs):
     default_arguments = {
@@ -403,6 +407,45 @@ class PointSourceIterRupturesTestCase(unittest.TestCase):
         ruptures = list(src.iter_ruptures())
         self.assertEqual(len(ruptures), 1)
 
+    def test_rupture_array(self):
+        # the vectorized geometry must agree with _get_rupture_surface
+        mfd = TruncatedGRMFD(a_val=2, b_val=1, min_mag=4.5,
+                             max_mag=7.5, bin_width=1)
+        np_dist = PMF([(0.5, NodalPlane(45, 90, 0)),
+                       (0.5, NodalPlane(271.3, 33.3, 90))])
+        hc_dist = PMF([(0.5, 3.), (0.5, 12.7)])
+        src = make_point_source(
+            nodal_plane_distribution=np_dist, hypocenter_distribution=hc_dist,
+            mfd=mfd, upper_seismogenic_depth=2, lower_seismogenic_depth=16)
+        loc = src.location
+        arr = build_rupture_array(src, loc.longitude, loc.latitude,
+                                  shift_hypo=True)
+        self.assertEqual(len(arr), src.count_ruptures())
+        i = 0
+        for mag, _rate in src.get_annual_occurrence_rates():
+            for _, np in np_dist.data:
+                for _, hc_depth in hc_dist.data:
+                    hc = Point(loc.longitude, loc.latitude, hc_depth)
+                    surface, center = src._get_rupture_surface(mag, np, hc)
+                    rec = arr[i]
+                    self.assertEqual(rec['mag'], mag)
+                    aac(rec['hypo'], [center.x, center.y, center.z])
+                    aac(rec['corner_lons'], surface.corner_lons)
+                    aac(rec['corner_lats'], surface.corner_lats)
+                    aac(rec['corner_depths'], surface.corner_depths)
+                    aac(rec['width'], surface.width)
+                    aac(rec['length'], surface.length)
+                    i += 1
+
+    def test_no_ruptures_above_min_mag(self):
+        src = make_point_source()
+        src.min_mag = 6  # all the magnitudes are below
+        loc = src.location
+        arr = build_rupture_array(src, loc.longitude, loc.latitude)
+        self.assertEqual(arr.dtype, rupture_array_dt)
+        self.assertEqual(len(arr), 0)
+        self.assertEqual(list(src.iter_ruptures()), [])
+
 
 class PointSourceMaxRupProjRadiusTestCase(unittest.TestCase):
     def test(self):
@@ -20,10 +20,12 @@ import itertools
 import logging
 import csv
 import os
+import codecs
+import hashlib
 import numpy
-from shapely import wkt, geometry
+from shapely import wkt
 
-from openquake.baselib import hdf5, general
+from openquake.baselib import hdf5, general, parallel, datastore, __version__
 from openquake.baselib.node import Node, context
 from openquake.baselib.python3compat import encode, decode
 from openquake.hazardlib import valid, nrml, geo, InvalidFile
@@ -188,6 +190,7 @@ U32 = numpy.uint32
 F32 = numpy.float32
 U64 = numpy.uint64
 TWO32 = 2 ** 32
+CHUNKSIZE = 16 * 1024 ** 2  # exposure CSV files are parsed in 16 MB chunks
 by_taxonomy = operator.attrgetter('taxonomy')
 
 
@@ -234,6 +237,18 @@ class TagCollection(object):
                 raise InvalidFile('contains more then %d tags' % TWO32)
             return idx
 
+    def add_array(self, tagname, tagvalues):
+        """
+        :param tagvalues: an array of tag values
+        :returns: an array of tag indices, as if `.add` were called in order
+        """
+        uniq, first, inv = numpy.unique(
+            tagvalues, return_index=True, return_inverse=True)
+        idxs = numpy.zeros(len(uniq), U32)
+        for i in first.argsort():  # in order of first appearance
+            idxs[i] = self.add(tagname, uniq[i])
+        return idxs[inv]
+
     def add_tags(self, dic, prefix):
         """
         :param dic: a dictionary tagname -> tagvalue
@@ -374,6 +389,47 @@ class AssetCollection(object):
                 aids_by_tag[tag].add(aid)
         return aids_by_tag
 
+    def get_mask(self, tags):
+        """
+        :param tags: a list of strings of the form "tagname=tagvalue"
+        :returns: a boolean array which is true for the assets with all tags
+        """
+        tagnames = [tag.split('=', 1)[0] for tag in tags]
+        missing = set(tagnames) - set(self.tagcol.tagnames)
+        if missing:
+            raise ValueError('Unknown tagname(s) %s' % missing)
+        mask = numpy.ones(len(self), bool)
+        for tag in tags:
+            tagname, tagvalue = tag.split('=', 1)
+            tagvalues = [decode(val) for val in getattr(self.tagcol, tagname)]
+            try:
+                tagidx = tagvalues.index(tagvalue)
+            except ValueError:  # unknown tag, no assets
+                mask[:] = False
+            else:
+                mask &= self.array[tagname] == tagidx
+        return mask
+
+    def get_agg_idx(self, tagnames):
+        """
+        :param tagnames: a list of valid tag names
+        :returns: (array of A indices of the tag combinations, shape)
+
+        The index of an asset is the position of its tag combination in the
+        flattened array of shape (T1, T2, ...) of all the possible tag
+        combinations, including the unknown tag "?" with index 0.
+        """
+        missing = set(tagnames) - set(self.tagcol.tagnames)
+        if missing:
+            raise ValueError('Unknown tagname(s) %s' % missing)
+        shape = tuple(len(getattr(self.tagcol, tagname))
+                      for tagname in tagnames)
+        if not shape:
+            return numpy.zeros(len(self), int), shape
+        idx = numpy.ravel_multi_index(
+            [self.array[tagname] for tagname in tagnames], shape)
+        return idx, shape
+
     @property
     def taxonomies(self):
         """
@@ -396,30 +452,18 @@ class AssetCollection(object):
         :param array: an array with the same length as the asset collection
         :returns: an array of aggregate values with the proper shape
         """
-        missing = set(tagnames) - set(self.tagcol.tagnames)
-        if missing:
-            raise ValueError('Unknown tagname(s) %s' % missing)
+        idx, shape = self.get_agg_idx(tagnames)
         A, *shp = array.shape
         if A != len(self):
             raise ValueError('The array must have length %d, got %d' %
                              (len(self), A))
         if not tagnames:
             return array.sum(axis=0)
-        elif len(tagnames) == 1:
-            # fast track for single-tag aggregation
-            # for the Canada exposure it is 30x faster
-            # fast_agg(assets['taxonomy'], values)  => 47.6 ms
-            # fast_agg2(assets[['taxonomy']], values) => 1.4 s
-            [tagname] = tagnames
-            avalues = general.fast_agg(self.array[tagname], array)[1:]
-            tags = [(i + 1,) for i in range(len(avalues))]
-        else:  # multi-tag aggregation
-            tags, avalues = general.fast_agg2(self.array[tagnames], array)
-        shape = [len(getattr(self.tagcol, tagname))-1 for tagname in tagnames]
-        arr = numpy.zeros(shape, (F32, tuple(shp)) if shp else F32)
-        for tag, aval in zip(tags, avalues):
-            arr[tuple(i - 1 for i in tag)] = aval
-        return arr
+        # a single bincount on the combined index of the tags
+        res = general.fast_agg(idx, array, M=numpy.prod(shape))
+        # discard the unknown tags "?" with index 0
+        res = res.reshape(shape + tuple(shp))[(slice(1, None),) * len(shape)]
+        return res.astype(F32)
 
     def agg_value(self, loss_types, *tagnames):
         """
@@ -589,6 +633,107 @@ cost_type_dt = numpy.dtype([('name', hdf5.vstr),
                             ('unit', hdf5.vstr)])
 
 
+def _get_csv_chunks(fname, chunksize):
+    # returns the header of the file and the (start, stop) byte offsets of
+    # the chunks of data, aligned to the line ends
+    with open(fname, 'rb') as f:
+        line = f.readline()
+        if line.startswith(codecs.BOM_UTF8):  # strip the BOM
+            line = line[len(codecs.BOM_UTF8):]
+        while line.startswith(b'#'):  # skip the comments
+            line = f.readline()
+        header = next(csv.reader([line.decode('utf-8-sig')]))
+        start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        chunks = []
+        while start < size:
+            f.seek(start + chunksize)
+            f.readline()
+            stop = min(f.tell(), size)
+            chunks.append((start, stop))
+            start = stop
+    return header, chunks
+
+
+def read_csv_chunk(fname, start, stop, dt, monitor=None):
+    """
+    Parse the bytes in the range [start, stop) of a CSV file
+
+    :returns: a dictionary with keys start, array
+    """
+    with open(fname, 'rb') as f:
+        f.seek(start)
+        lines = f.read(stop - start).decode('utf-8').splitlines()
+    try:
+        array = numpy.array([tuple(row) for row in csv.reader(lines)], dt)
+    except Exception as exc:
+        raise InvalidFile('%s: %s' % (fname, exc))
+    return dict(start=start, array=array)
+
+
+def read_csv(fname, dtypedict, renamedict, chunksize=CHUNKSIZE):
+    """
+    Read an exposure CSV file into a structured array, in parallel for
+    files larger than the chunksize. The string fields are converted into
+    fixed-size unicode fields and the array is cached in .npy format in
+    the directory $OQ_DATADIR/cache (unless the cache is disabled), with a
+    key depending on the content of the file, so that reading the same
+    exposure again is fast.
+
+    :param fname: a CSV file with an header
+    :param dtypedict: a dictionary fieldname -> dtype, None -> default
+    :param renamedict: aliases for the fields to rename
+    :returns: a structured array
+    """
+    header, chunks = _get_csv_chunks(fname, chunksize)
+    dt = hdf5.build_dt(dtypedict, header)
+    cachedir = datastore.get_cachedir()
+    if cachedir:
+        sha = hashlib.sha1(('%s %s %s' % (
+            __version__, dt, sorted(renamedict.items()))).encode('utf8'))
+        with open(fname, 'rb') as f:
+            for block in iter(lambda: f.read(chunksize), b''):
+                sha.update(block)
+        cachefile = os.path.join(
+            cachedir, 'exposure-%s.npy' % sha.hexdigest())
+        try:
+            array = numpy.load(cachefile)
+        except FileNotFoundError:  # not cached yet or removed
+            pass
+        else:
+            logging.info('Reading the cached %s', fname)
+            os.utime(cachefile)  # mark as recently used
+            return array
+    if len(chunks) > 1:
+        dist = ('no' if os.environ.get('OQ_DISTRIBUTE') == 'no'
+                else 'processpool')
+        allargs = [(fname, start, stop, dt) for start, stop in chunks]
+        dics = sorted(
+            parallel.Starmap(read_csv_chunk, allargs, distribute=dist),
+            key=operator.itemgetter('start'))
+        array = numpy.concatenate([dic['array'] for dic in dics])
+    elif chunks:
+        array = read_csv_chunk(fname, *chunks[0], dt)['array']
+    else:
+        array = numpy.zeros(0, dt)
+    dtlist = []
+    for name in array.dtype.names:
+        dt = array.dtype[name]
+        if dt == object:  # convert into a fixed-size unicode field
+            dt = array[name].astype(str).dtype
+        dtlist.append((renamedict.get(name, name), dt))
+    array = array.astype(dtlist)
+    array['lon'] = numpy.round(array['lon'], 5)
+    array['lat'] = numpy.round(array['lat'], 5)
+    if cachedir:
+        tmpfile = cachefile + '.%d.tmp' % os.getpid()
+        with open(tmpfile, 'wb') as f:
+            numpy.save(f, array)
+        os.replace(tmpfile, cachefile)  # atomic, even with concurrent jobs
+        datastore.clean_cachedir(cachedir)
+    return array
+
+
 def _get_exposure(fname, stop=None):
     """
     :param fname:
@@ -690,9 +835,11 @@ def _minimal_tagcol(fnames, by_country):
 
 def assets2array(asset_nodes, fields, retrofitted, ignore_missing_costs):
     """
+    :param asset_nodes: an iterable over asset nodes, possibly a stream
     :returns: an array of assets from the asset nodes
     """
-    first_asset = asset_nodes[0]
+    asset_nodes = iter(asset_nodes)
+    first_asset = next(asset_nodes, None)
     for occ in getattr(first_asset, 'occupancies', []):
         name = 'occupants_' + occ['period']
         if name not in fields:
@@ -700,9 +847,11 @@ def assets2array(asset_nodes, fields, retrofitted, ignore_missing_costs):
     dtlist = [(f, object) for f in fields]
     if retrofitted:
         dtlist.append(('retrofitted', object))
-    nodes = list(asset_nodes)
-    array = numpy.zeros(len(nodes), dtlist)
-    for asset, rec in zip(nodes, array):
+    if first_asset is None:  # no assets
+        return numpy.zeros(0, dtlist)
+    rows = []  # the asset nodes are converted into rows and discarded
+    for asset in itertools.chain([first_asset], asset_nodes):
+        rec = {}
         # fix asset.attrib
         for occ in getattr(asset, 'occupancies', []):
             asset.attrib['occupants_' + occ['period']] = occ['occupants']
@@ -730,7 +879,8 @@ def assets2array(asset_nodes, fields, retrofitted, ignore_missing_costs):
                         raise
             else:
                 rec[field] = asset.attrib.get(field, '?')
-    return array
+        rows.append(tuple(rec.get(name, 0) for name, _ in dtlist))
+    return numpy.array(rows, dtlist)
 
 
 class Exposure(object):
@@ -800,19 +950,20 @@ class Exposure(object):
             param['region'] = None
         param['fname'] = fname
         param['ignore_missing_costs'] = set(ignore_missing_costs)
-        exposure, assetnodes = _get_exposure(param['fname'])
+        exposure, _ = _get_exposure(param['fname'], stop='asset')
         if tagcol:
             exposure.tagcol = tagcol
-        if assetnodes:
-            array = assets2array(
-                assetnodes, exposure._csv_header(),
+        if exposure.datafiles:
+            arrays = exposure._read_csv()
+        else:  # read the assets from the XML file, in streaming mode
+            arrays = [assets2array(
+                nrml.stream(param['fname'], 'assets'),
+                exposure._csv_header(),
                 exposure.retrofitted or calculation_mode == 'classical_bcr',
-                ignore_missing_costs)
-        else:
-            array = exposure._read_csv()
+                ignore_missing_costs)]
         param['relevant_cost_types'] = set(exposure.cost_types['name']) - set(
             ['occupants'])
-        exposure._populate_from(array, param, check_dupl)
+        exposure._populate_from(arrays, param, check_dupl)
         if param['region'] and param['out_of_region']:
             logging.info('Discarded %d assets outside the region',
                          param['out_of_region'])
@@ -853,7 +1004,7 @@ class Exposure(object):
 
     def _read_csv(self):
         """
-        :yields: asset nodes
+        :returns: a list of asset arrays, one per CSV file
         """
         expected_header = set(self._csv_header('', ''))
         for fname in self.datafiles:
@@ -877,47 +1028,64 @@ class Exposure(object):
         for field in self.occupancy_periods.split():
             conv[field] = float
             rename[field] = 'occupants_' + field
-        for fname in self.datafiles:
-            array = hdf5.read_csv(fname, conv, rename).array
-            array['lon'] = numpy.round(array['lon'], 5)
-            array['lat'] = numpy.round(array['lat'], 5)
-            yield from array
+        return [read_csv(fname, conv, rename) for fname in self.datafiles]
 
-    def _populate_from(self, asset_array, param, check_dupl):
+    def _populate_from(self, asset_arrays, param, check_dupl):
+        idx = 0
         asset_refs = set()
-        for idx, asset in enumerate(asset_array):
-            asset_id = asset['id']
-            # check_dupl is False only in oq prepare_site_model since
-            # in that case we are only interested in the asset locations
-            if check_dupl and asset_id in asset_refs:
-                raise nrml.DuplicatedID(asset_id)
-            asset_refs.add(param['asset_prefix'] + asset_id)
-            self._add_asset(idx, asset, param)
-
-    def _add_asset(self, idx, asset, param):
+        prefix = param['asset_prefix']
+        for asset_array in asset_arrays:
+            if param['region']:
+                inside = geo.utils.within(
+                    param['region'], asset_array['lon'], asset_array['lat'])
+                param['out_of_region'] += len(inside) - inside.sum()
+            else:
+                inside = numpy.ones(len(asset_array), bool)
+            tagidxs = self._get_tagidxs(asset_array[inside], prefix)
+            t = 0
+            for asset, ok in zip(asset_array, inside):
+                asset_id = asset['id']
+                # check_dupl is False only in oq prepare_site_model since
+                # in that case we are only interested in the asset locations
+                if check_dupl and asset_id in asset_refs:
+                    raise nrml.DuplicatedID(asset_id)
+                asset_refs.add(prefix + asset_id)
+                self.asset_refs.append(prefix + asset_id)
+                if ok:
+                    self._add_asset(idx, asset, param, tagidxs[t])
+                    t += 1
+                idx += 1
+
+    def _get_tagidxs(self, asset_array, prefix):
+        # returns an array of tag indices of shape (A, T), vectorized
+        # equivalent to calling .tagcol.add_tags on each asset
+        tagnames = self.tagcol.tagnames
+        tagidxs = numpy.zeros((len(asset_array), len(tagnames)), U32)
+        for t, tagname in enumerate(tagnames):
+            if tagname in ('exposure', 'country'):
+                tagidxs[:, t] = self.tagcol.add(tagname, prefix)
+                continue
+            tagvalues = asset_array[tagname]
+            invalid = ['', '*']
+            if tagname in ('taxonomy', 'id'):
+                invalid.append('?')  # the unknown tag is not accepted
+            for value in invalid:
+                if (tagvalues == value).any():
+                    raise ValueError('Invalid tagvalue="%s"' % value)
+            if tagname == 'id':
+                tagvalues = numpy.array([prefix + v for v in tagvalues])
+            tagidxs[:, t] = self.tagcol.add_array(tagname, tagvalues)
+        return tagidxs
+
+    def _add_asset(self, idx, asset, param, idxs):
         values = {}
         try:
             retrofitted = asset['retrofitted']
         except ValueError:
             retrofitted = None
         asset_id = asset['id']
-        prefix = param['asset_prefix']
-        # FIXME: in case of an exposure split in CSV files the line number
-        # is None because param['fname'] points to the .xml file :-(
-        self.asset_refs.append(prefix + asset_id)
-        taxonomy = asset['taxonomy']
         number = asset['number']
         location = asset['lon'], asset['lat']
-        if param['region'] and not geometry.Point(*location).within(
-                param['region']):
-            param['out_of_region'] += 1
-            return
-        dic = {tagname: asset[tagname] for tagname in self.tagcol.tagnames
-               if tagname not in ('country', 'exposure') and
-               asset[tagname] != '?'}
-        dic['taxonomy'] = taxonomy
-        dic['id'] = prefix + asset_id
-        idxs = self.tagcol.add_tags(dic, prefix)
         tot_occupants = 0
         num_occupancies = 0
         for name in asset.dtype.names:
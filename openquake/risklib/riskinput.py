@@ -27,18 +27,59 @@ U32 = numpy.uint32
 F32 = numpy.float32
 
 
+class EpsilonGetter(object):
+    """
+    Generate the epsilons on the fly, without storing an epsilon matrix
+    of shape (A, E). The epsilon for a given asset and event depends only
+    on (master_seed, asset ordinal, event index), so the results do not
+    depend on how the assets and the events are split in tasks.
+
+    :param master_seed: the master seed
+    :param asset_correlation: the asset correlation coefficient
+    :param E: the total number of events
+    :param by_taxonomy: if True, correlate only assets of the same taxonomy
+    """
+    def __init__(self, master_seed, asset_correlation, E, by_taxonomy=False):
+        self.master_seed = master_seed
+        self.asset_correlation = asset_correlation
+        self.E = E
+        self.by_taxonomy = by_taxonomy
+
+    def get(self, assets, eids=None):
+        """
+        :param assets: an array of A assets
+        :param eids: an array of E' event indices (default all events)
+        :returns: an array of epsilons of shape (A, E')
+        """
+        if eids is None:
+            eids = numpy.arange(self.E)
+        groups = assets['taxonomy'] if self.by_taxonomy else None
+        return scientific.make_counter_epsilons(
+            assets['ordinal'], eids, self.master_seed,
+            self.asset_correlation, groups)
+
+    def __repr__(self):
+        return '<%s master_seed=%d, E=%d>' % (
+            self.__class__.__name__, self.master_seed, self.E)
+
+
 def get_assets_by_taxo(assets, tempname=None):
     """
     :param assets: an array of assets
-    :param tempname: hdf5 file where the epsilons are (or None)
-    :returns: assets_by_taxo with attributes eps and idxs
+    :param tempname:
+        hdf5 file where the epsilons are, an EpsilonGetter or None
+    :returns: assets_by_taxo with attributes eps, epsgetter and idxs
     """
     assets_by_taxo = AccumDict(group_array(assets, 'taxonomy'))
     assets_by_taxo.idxs = numpy.argsort(numpy.concatenate([
         a['ordinal'] for a in assets_by_taxo.values()]))
     assets_by_taxo.eps = {}
+    assets_by_taxo.epsgetter = None
     if tempname is None:  # no epsilons
         return assets_by_taxo
+    elif isinstance(tempname, EpsilonGetter):  # generated on the fly
+        assets_by_taxo.epsgetter = tempname
+        return assets_by_taxo
     # otherwise read the epsilons and group them by taxonomy
     with hdf5.File(tempname, 'r') as h5:
         dset = h5['epsilon_matrix']
@@ -82,7 +123,9 @@ def get_output(crmodel, assets_by_taxo, haz, rlzi=None):
     for l, lt in enumerate(crmodel.loss_types):
         ls = []
         for taxonomy, assets_ in assets_by_taxo.items():
-            if len(assets_by_taxo.eps):
+            if assets_by_taxo.epsgetter:  # only the needed epsilons
+                epsilons = assets_by_taxo.epsgetter.get(assets_, eids)
+            elif len(assets_by_taxo.eps):
                 epsilons = assets_by_taxo.eps[taxonomy][:, eids]
             else:  # no CoVs
                 epsilons = ()
@@ -181,11 +224,19 @@ def make_eps(asset_array, num_samples, seed, correlation):
 def cache_epsilons(dstore, oq, assetcol, crmodel, E):
     """
     Do nothing if there are no coefficients of variation of ignore_covs is
-    set. Otherwise, generate an epsilon matrix of shape (A, E) and save it
-    in the cache file, by returning the path to it.
+    set. With the counter-based generator return an EpsilonGetter, since
+    the epsilons can be generated on the fly inside the tasks. Otherwise,
+    generate an epsilon matrix of shape (A, E) and save it in the cache
+    file, by returning the path to it.
     """
     if oq.ignore_covs or not crmodel.covs or 'LN' not in crmodel.distributions:
         return
+    if oq.random_generator == 'philox':
+        # in scenario_risk the assets are correlated by taxonomy, like
+        # in make_eps; in event based the correlation is 0 or 1
+        by_taxonomy = oq.calculation_mode == 'scenario_risk'
+        return EpsilonGetter(
+            oq.master_seed, oq.asset_correlation, E, by_taxonomy)
     A = len(assetcol)
     logging.info('Storing the epsilon matrix in %s', dstore.tempname)
     if oq.calculation_mode == 'scenario_risk':
@@ -25,6 +25,7 @@ import numpy
 
 from openquake.baselib import hdf5
 from openquake.baselib.node import Node
+from openquake.baselib.rng import CounterRNG, VULNERABILITY
 from openquake.baselib.general import AccumDict, cached_property
 from openquake.hazardlib import valid, nrml, InvalidFile
 from openquake.hazardlib.sourcewriter import obj_to_node
@@ -285,6 +286,15 @@ class RiskModel(object):
         means, covs, idxs = vf.interpolate(gmvs)
         if len(means) == 0:  # all gmvs are below the minimum imls, 0 ratios
             pass
+        elif vf.rng is not None and (
+                vf.distribution_name == 'PM' or
+                not self.ignore_covs and covs.sum()):
+            # counter-based sampling, keyed by (asset, event); the PMF
+            # functions are always sampled, even if their covs are zero
+            for a, asset in enumerate(assets):
+                loss_ratios[a, idxs] = vf.sample(
+                    means, covs, idxs, epsilons[a] if len(epsilons) else None,
+                    (asset['ordinal'], eids))
         elif self.ignore_covs or covs.sum() == 0 or len(epsilons) == 0:
             # the ratios are equal for all assets
             ratios = vf.sample(means, covs, idxs, None)  # right shape
@@ -363,7 +373,13 @@ class RiskModel(object):
         vf = self.risk_functions[loss_type, 'vulnerability']
         means, covs, idxs = vf.interpolate(gmvs)
         loss_ratio_matrix = numpy.zeros((len(assets), E))
-        if len(epsilons):
+        if vf.rng is not None:  # counter-based sampling
+            zeros = numpy.zeros(E, F32)
+            for a, asset in enumerate(assets):
+                eps = epsilons[a] if len(epsilons) else zeros
+                loss_ratio_matrix[a, idxs] = vf.sample(
+                    means, covs, idxs, eps, (asset['ordinal'], eids))
+        elif len(epsilons):
             for a, eps in enumerate(epsilons):
                 loss_ratio_matrix[a, idxs] = vf.sample(means, covs, idxs, eps)
         else:
@@ -580,6 +596,9 @@ class CompositeRiskModel(collections.abc.Mapping):
                     self.distributions.add(rf.distribution_name)
                 if hasattr(rf, 'init'):  # vulnerability function
                     rf.seed = oqparam.master_seed  # setting the seed
+                    if oqparam.random_generator == 'philox':
+                        rf.rng = CounterRNG(oqparam.master_seed,
+                                            VULNERABILITY)
                     rf.init()
                 # save the number of nonzero coefficients of variation
                 if hasattr(rf, 'covs') and rf.covs.any():
@@ -32,6 +32,7 @@ from numpy.testing import assert_equal
 from scipy import interpolate, stats, random
 
 from openquake.baselib.general import CallableDict, cached_property
+from openquake.baselib.rng import CounterRNG, EPSILON, EPSILON_COMMON
 from openquake.hazardlib.stats import compute_stats2
 
 F64 = numpy.float64
@@ -78,6 +79,7 @@ def fine_graining(points, steps):
 
 class VulnerabilityFunction(object):
     dtype = numpy.dtype([('iml', F64), ('loss_ratio', F64), ('cov', F64)])
+    rng = None  # CounterRNG set by CompositeRiskModel.init, if any
     seed = None  # to be overridden
 
     def __init__(self, vf_id, imt, imls, mean_loss_ratios, covs=None,
@@ -145,13 +147,17 @@ class VulnerabilityFunction(object):
         self._covs_i1d = interpolate.interp1d(self.imls, self.covs)
         self.set_distribution(None)
 
-    def set_distribution(self, epsilons=None):
+    def set_distribution(self, epsilons=None, counters=None):
         if (self.covs > 0).any():
             self.distribution = DISTRIBUTIONS[self.distribution_name]()
         else:
             self.distribution = DegenerateDistribution()
         self.distribution.epsilons = (numpy.array(epsilons)
                                       if epsilons is not None else None)
+        if self.rng is not None:  # counter-based, no global state
+            self.distribution.rng = self.rng
+            self.distribution.counters = counters
+            return
         assert self.seed is not None, self
         numpy.random.seed(self.seed)  # set by CompositeRiskModel.init
 
@@ -169,7 +175,7 @@ class VulnerabilityFunction(object):
         gmvs_curve = gmvs_curve[idxs]
         return self._mlr_i1d(gmvs_curve), self._cov_for(gmvs_curve), idxs
 
-    def sample(self, means, covs, idxs, epsilons=None):
+    def sample(self, means, covs, idxs, epsilons=None, counters=None):
         """
         Sample the epsilons and apply the corrections to the means.
         This method is called only if there are nonzero covs.
@@ -182,12 +188,17 @@ class VulnerabilityFunction(object):
            array of E booleans with E >= E'
         :param epsilons:
            array of E floats (or None)
+        :param counters:
+           a pair (asset ordinal, array of E event IDs), used only
+           with a counter-based generator
         :returns:
            array of E' loss ratios
         """
         if self.distribution_name == 'LN' and epsilons is None:
             return means
-        self.set_distribution(epsilons)
+        if counters is not None:
+            counters = (counters[0], numpy.asarray(counters[1])[idxs])
+        self.set_distribution(epsilons, counters)
         res = self.distribution.sample(means, covs, means * covs, idxs)
         return res
 
@@ -267,7 +278,7 @@ class VulnerabilityFunction(object):
 
     def __getstate__(self):
         return (self.id, self.imt, self.imls, self.mean_loss_ratios,
-                self.covs, self.distribution_name, self.seed)
+                self.covs, self.distribution_name, self.seed, self.rng)
 
     def __setstate__(self, state):
         self.id = state[0]
@@ -277,6 +288,7 @@ class VulnerabilityFunction(object):
         self.covs = state[4]
         self.distribution_name = state[5]
         self.seed = state[6]
+        self.rng = state[7]
         self.init()
 
     def _check_vulnerability_data(self, imls, loss_ratios, covs, distribution):
@@ -374,14 +386,16 @@ class VulnerabilityFunctionWithPMF(VulnerabilityFunction):
         self._probs_i1d = interpolate.interp1d(self.imls, self.probs)
         self.set_distribution(None)
 
-    def set_distribution(self, epsilons=None):
+    def set_distribution(self, epsilons=None, counters=None):
         self.distribution = DISTRIBUTIONS[self.distribution_name]()
         self.distribution.epsilons = epsilons
         self.distribution.seed = self.seed  # needed only for PM
+        self.distribution.rng = self.rng
+        self.distribution.counters = counters
 
     def __getstate__(self):
         return (self.id, self.imt, self.imls, self.loss_ratios,
-                self.probs, self.distribution_name, self.seed)
+                self.probs, self.distribution_name, self.seed, self.rng)
 
     def __setstate__(self, state):
         self.id = state[0]
@@ -391,6 +405,7 @@ class VulnerabilityFunctionWithPMF(VulnerabilityFunction):
         self.probs = state[4]
         self.distribution_name = state[5]
         self.seed = state[6]
+        self.rng = state[7]
         self.init()
 
     def _check_vulnerability_data(self, imls, loss_ratios, probs):
@@ -416,7 +431,7 @@ class VulnerabilityFunctionWithPMF(VulnerabilityFunction):
         gmvs_curve = gmvs_curve[idxs]
         return self._probs_i1d(gmvs_curve), numpy.zeros_like(gmvs_curve), idxs
 
-    def sample(self, probs, _covs, idxs, epsilons):
+    def sample(self, probs, _covs, idxs, epsilons, counters=None):
         """
         Sample the .loss_ratios with the given probabilities.
 
@@ -428,10 +443,15 @@ class VulnerabilityFunctionWithPMF(VulnerabilityFunction):
            array of E booleans with E >= E'
         :param epsilons:
            array of E floats
+        :param counters:
+           a pair (asset ordinal, array of E event IDs), used only
+           with a counter-based generator
         :returns:
            array of E' probabilities
         """
-        self.set_distribution(epsilons)
+        if counters is not None:
+            counters = (counters[0], numpy.asarray(counters[1])[idxs])
+        self.set_distribution(epsilons, counters)
         return self.distribution.sample(self.loss_ratios, probs)
 
     @lru_cache(100)
@@ -745,8 +765,13 @@ class Distribution(metaclass=abc.ABCMeta):
     A Distribution class models continuous probability distribution of
     random variables used to sample losses of a set of assets. It is
     usually registered with a name (e.g. LN, BT, PM) by using
-    :class:`openquake.baselib.general.CallableDict`
+    :class:`openquake.baselib.general.CallableDict`. If the attribute
+    `rng` is set to a :class:`openquake.baselib.rng.CounterRNG`, the
+    sampling uses the `counters` (asset ordinal, event IDs) instead of
+    the global numpy generator.
     """
+    rng = None
+    counters = None
 
     @abc.abstractmethod
     def sample(self, means, covs, stddevs, idxs):
@@ -780,6 +805,32 @@ class DegenerateDistribution(Distribution):
             loss_ratio, [loss_ratio > mean or not mean], [0, 1])
 
 
+def make_counter_epsilons(aids, eids, seed, correlation, groups=None):
+    """
+    Build a matrix of epsilons of shape (A, E) with a counter-based
+    generator, so that each epsilon depends only on (seed, aid, eid)
+    and not on the way the assets and events are split in tasks.
+    The correlation is introduced with a factor common to all the
+    assets in the same group.
+
+    :param aids: an array of A asset ordinals
+    :param eids: an array of E event indices
+    :param seed: the master seed
+    :param correlation: the correlation coefficient in the range [0, 1]
+    :param groups: an array of A group indices (default all zeros)
+    :returns: an array of shape (A, E) of 32 bit floats
+    """
+    aids = numpy.asarray(aids)
+    eps = CounterRNG(seed, EPSILON).normal(aids[:, None], eids)
+    if correlation:
+        groups = (numpy.zeros_like(aids) if groups is None
+                  else numpy.asarray(groups))
+        common = CounterRNG(seed, EPSILON_COMMON).normal(groups[:, None], eids)
+        eps = (numpy.sqrt(correlation) * common +
+               numpy.sqrt(1. - correlation) * eps)
+    return eps.astype(F32)
+
+
 def make_epsilons(matrix, seed, correlation):
     """
     Given a matrix N * R returns a matrix of the same shape N * R
@@ -843,6 +894,9 @@ class BetaDistribution(Distribution):
     def sample(self, means, _covs, stddevs, _idxs=None):
         alpha = self._alpha(means, stddevs)
         beta = self._beta(means, stddevs)
+        if self.rng is not None:  # inverse transform sampling
+            return stats.beta.ppf(self.rng.uniform(*self.counters),
+                                  alpha, beta)
         res = numpy.random.beta(alpha, beta, size=None)
         return res
 
@@ -865,6 +919,12 @@ class DiscreteDistribution(Distribution):
     seed = None  # to be set
 
     def sample(self, loss_ratios, probs):
+        if self.rng is not None:  # inverse transform sampling
+            cumprobs = numpy.cumsum(probs, axis=0)  # shape (M, E')
+            us = self.rng.uniform(*self.counters) * cumprobs[-1]
+            idxs = numpy.minimum((cumprobs < us).sum(axis=0),
+                                 len(loss_ratios) - 1)
+            return list(numpy.asarray(loss_ratios)[idxs])
         ret = []
         r = numpy.arange(len(loss_ratios))
         for i in range(probs.shape[1]):
@@ -1344,6 +1404,47 @@ def losses_by_period(losses, return_periods, num_events=None, eff_time=None):
     return curve
 
 
+class TopLosses(object):
+    """
+    Keep only the K largest losses for each of N keys (for instance the
+    assets or the combinations loss type-tag). It can be updated with
+    new losses in any order and merged with the TopLosses coming from
+    other tasks; the memory occupation is bounded by N * K.
+
+    >>> top = TopLosses(1, 2)
+    >>> top.update(numpy.array([[3, 1, 4]]))
+    >>> other = TopLosses(1, 2)
+    >>> other.update(numpy.array([[1, 5, 9]]))
+    >>> top += other
+    >>> top.array, top.num_losses
+    (array([[5., 9.]], dtype=float32), 6)
+
+    :param N: the number of keys
+    :param K: the number of losses to keep for each key
+    :param shape: the shape of the keys, with product N (default (N,))
+    """
+    def __init__(self, N, K, dtype=F32, shape=None):
+        self.array = numpy.zeros((N, K), dtype)
+        self.num_losses = 0
+        self.shape = shape or (N,)
+
+    def update(self, losses):
+        """
+        :param losses: an array of shape (N, E) with nonnegative losses
+        """
+        K = self.array.shape[1]
+        arr = numpy.concatenate(
+            [self.array, losses.astype(self.array.dtype)], axis=1)
+        self.array = numpy.partition(arr, -K, axis=1)[:, -K:]
+        self.array.sort(axis=1)
+        self.num_losses += losses.shape[1]
+
+    def __iadd__(self, other):
+        self.update(other.array)
+        self.num_losses += other.num_losses - other.array.shape[1]
+        return self
+
+
 class LossCurvesMapsBuilder(object):
     """
     Build losses curves and maps for all loss types at the same time.
@@ -1369,6 +1470,59 @@ class LossCurvesMapsBuilder(object):
             self.poes = 1. - numpy.exp(
                 - risk_investigation_time / return_periods)
 
+    @cached_property
+    def num_top(self):
+        """
+        The number of largest losses needed to compute the loss curves,
+        since the losses with return period below the minimum return
+        period do not enter in the interpolation
+        """
+        rps = self.return_periods[self.return_periods > 0]
+        return int(self.eff_time // rps[0]) + 1 if len(rps) else 1
+
+    def top_losses(self, losses, shape=None):
+        """
+        :param losses: an array of shape (N, E)
+        :param shape: the shape of the keys (default (N,))
+        :returns: a TopLosses instance with the K largest losses per row
+        """
+        top = TopLosses(len(losses), self.num_top, shape=shape)
+        top.update(losses)
+        return top
+
+    def curves_from_top(self, top, rlzi):
+        """
+        Vectorized version of `losses_by_period` working on the largest
+        losses only.
+
+        :param top: a TopLosses instance with N rows
+        :param rlzi: the realization index
+        :returns: an array of shape (N, P), possibly with NaNs
+        """
+        N, P = len(top.array), len(self.return_periods)
+        if top.num_losses == 0:  # zero-curves
+            return numpy.zeros((N, P))
+        num_events = self.num_events[rlzi]
+        if num_events < top.num_losses:
+            raise ValueError(
+                'There are not enough events (%d) to compute the loss curve '
+                'from %d losses' % (num_events, top.num_losses))
+        k = min(self.num_top, num_events)
+        losses = top.array[:, -k:]  # sorted in ascending order
+        periods = self.eff_time / numpy.arange(k, 0., -1)
+        curves = numpy.zeros((N, P))
+        for p, rp in enumerate(self.return_periods):
+            if not (self.eff_time / num_events <= rp <= periods[-1]):
+                curves[:, p] = numpy.nan
+            elif k == 1:
+                curves[:, p] = losses[:, 0]
+            else:  # linear interpolation in the logarithm of the period
+                x = numpy.log(periods)
+                i = min(numpy.searchsorted(x, numpy.log(rp), 'right'), k - 1)
+                w = (numpy.log(rp) - x[i - 1]) / (x[i] - x[i - 1])
+                curves[:, p] = (1. - w) * losses[:, i - 1] + w * losses[:, i]
+        return curves
+
     def pair(self, array, stats):
         """
         :return (array, array_stats) if stats, else (array, None)
@@ -1394,14 +1548,11 @@ class LossCurvesMapsBuilder(object):
         L = len(self.loss_dt.names)
         array = numpy.zeros((P, R, L), F32)
         for r in losses_by_event:
-            num_events = self.num_events[r]
             losses = losses_by_event[r]
-            for l, lt in enumerate(self.loss_dt.names):
-                ls = losses[:, l].flatten()  # flatten only in ucerf
-                # NB: do not use squeeze or the gmf_ebrisk tests will break
-                lbp = losses_by_period(
-                    ls, self.return_periods, num_events, self.eff_time)
-                array[:, r, l] = lbp
+            # NB: flatten only in ucerf; do not use squeeze or the
+            # gmf_ebrisk tests will break
+            ls = numpy.array([losses[:, li].flatten() for li in range(L)])
+            array[:, r] = self.curves_from_top(self.top_losses(ls), r).T
         return self.pair(array, stats)
 
     # used in event_based_risk
@@ -1410,6 +1561,17 @@ class LossCurvesMapsBuilder(object):
             loss_ratios, self.return_periods,
             self.num_events[rlzi], self.eff_time)
 
+    # used in event_based_risk
+    def build_asset_curves(self, asset_values, loss_ratios, rlzi):
+        """
+        :param asset_values: an array of A values
+        :param loss_ratios: an array of shape (A, E)
+        :param rlzi: the realization index
+        :returns: an array of loss curves of shape (A, P)
+        """
+        top = self.top_losses(loss_ratios)
+        return asset_values[:, None] * self.curves_from_top(top, rlzi)
+
     # used in event_based_risk
     def build_maps(self, curves, clp, stats=()):
         """
@@ -1430,20 +1592,24 @@ class LossCurvesMapsBuilder(object):
 
     # used in ebrisk
     def build_curves(self, loss_arrays, rlzi):
-        if len(loss_arrays) == 0:
+        """
+        :param loss_arrays: an array of shape (E, L, T...) or a TopLosses
+        :param rlzi: the realization index
+        :returns: an array of loss curves of shape (P, L, T...)
+        """
+        if isinstance(loss_arrays, TopLosses):
+            if loss_arrays.num_losses == 0:
+                return ()
+            top = loss_arrays
+        elif len(loss_arrays) == 0:
             return ()
-        shp = loss_arrays[0].shape  # (L, T...)
-        P = len(self.return_periods)
-        curves = numpy.zeros((P,) + shp, F32)
-        num_events = self.num_events[rlzi]
-        acc = collections.defaultdict(list)
-        for loss_array in loss_arrays:
-            for idx, loss in numpy.ndenumerate(loss_array):
-                acc[idx].append(loss)
-        for idx, losses in acc.items():
-            curves[(slice(None),) + idx] = losses_by_period(
-                losses, self.return_periods, num_events, self.eff_time)
-        return curves
+        else:
+            loss_arrays = numpy.asarray(loss_arrays)
+            top = self.top_losses(
+                loss_arrays.reshape(len(loss_arrays), -1).T,
+                loss_arrays.shape[1:])
+        curves = self.curves_from_top(top, rlzi)  # shape (L*T..., P)
+        return curves.T.reshape((-1,) + top.shape).astype(F32)
 
 
 class LossesByAsset(object):
@@ -23,8 +23,9 @@ import unittest.mock as mock
 import numpy
 from numpy.testing import assert_almost_equal
 from openquake.baselib.general import gettemp
+from openquake.baselib.rng import CounterRNG, VULNERABILITY
 from openquake.hazardlib import InvalidFile, nrml
-from openquake.risklib import riskmodels, nrml_examples
+from openquake.risklib import riskmodels, scientific, nrml_examples
 from openquake.qa_tests_data.scenario_damage import case_4b
 
 FF_DIR = os.path.dirname(case_4b.__file__)
@@ -348,3 +349,25 @@ class ProbabilisticEventBasedTestCase(unittest.TestCase):
         ratios2 = rm('structural', assets, gmvs2, eids2, eps2)
         numpy.testing.assert_allclose(ratios1, self.expected_ratios[:, :2])
         numpy.testing.assert_allclose(ratios2, self.expected_ratios[:, 2:])
+
+    def test_pmf_philox(self):
+        # the PMF functions have zero covs but must be sampled anyway
+        vf = scientific.VulnerabilityFunctionWithPMF(
+            'RC/A', 'PGA', [.1, .2, .3], [0, .5, 1],
+            numpy.array([[.8, .4, .1], [.1, .4, .3], [.1, .2, .6]]))
+        vf.seed = 42
+        vf.rng = CounterRNG(42, VULNERABILITY)
+        vf.init()
+        rm = riskmodels.RiskModel(
+            'event_based_risk', 'RC/A', {('structural', 'vulnerability'): vf},
+            ignore_covs=False)
+        assets = numpy.zeros(2, [('ordinal', numpy.uint32)])
+        assets['ordinal'] = [0, 1]
+        eids = numpy.array([1, 2, 3, 4, 5])
+        gmvs = numpy.array([.1, .15, .2, .25, .3])
+        ratios = rm('structural', assets, gmvs, eids, ())
+        self.assertEqual(ratios.shape, (2, 5))
+        self.assertTrue(set(ratios.flat) <= {0, .5, 1})
+        # the ratios do not depend on how the events are split
+        ratios2 = rm('structural', assets, gmvs[2:], eids[2:], ())
+        numpy.testing.assert_equal(ratios[:, 2:], ratios2)
@@ -20,7 +20,8 @@ import unittest
 import pickle
 
 import numpy
-from openquake.risklib import scientific
+from openquake.baselib.rng import CounterRNG, VULNERABILITY
+from openquake.risklib import scientific, riskinput
 
 aaae = numpy.testing.assert_array_almost_equal
 
@@ -65,6 +66,55 @@ class BetaDistributionTestCase(unittest.TestCase):
                       str(ctx.exception))
 
 
+class CounterBasedSamplingTestCase(unittest.TestCase):
+    def test_beta(self):
+        vf = scientific.VulnerabilityFunction(
+            'v1', 'PGA', [.1, .2, .3], [.05, .1, .2], [.1, .2, .3], 'BT')
+        vf.seed = 42
+        vf.rng = CounterRNG(42, VULNERABILITY)
+        vf.init()
+        gmvs = numpy.array([.1, .15, .2, .25, .3])
+        means, covs, idxs = vf.interpolate(gmvs)
+        eids = numpy.arange(5)
+        ratios = vf.sample(means, covs, idxs, None, (7, eids))
+        # the same ratios are obtained in a different order and chunking
+        numpy.random.seed(0)  # the global state is irrelevant
+        ratios2 = vf.sample(means[2:], covs[2:], idxs[2:], None,
+                            (7, eids[2:]))
+        aaae(ratios[2:], ratios2)
+
+    def test_epsilons(self):
+        aids = numpy.arange(4)
+        eids = numpy.arange(10000)
+        eps = scientific.make_counter_epsilons(aids, eids, 42, 0)
+        self.assertEqual(eps.shape, (4, 10000))
+        aaae(eps[2:], scientific.make_counter_epsilons(aids[2:], eids, 42, 0))
+        corr = numpy.corrcoef(eps)[0, 1]
+        self.assertLess(abs(corr), .05)
+
+        # full correlation
+        eps = scientific.make_counter_epsilons(aids, eids, 42, 1)
+        aaae(eps[0], eps[3])
+
+        # partial correlation within groups
+        eps = scientific.make_counter_epsilons(
+            aids, eids, 42, .5, groups=[0, 0, 1, 1])
+        self.assertAlmostEqual(numpy.corrcoef(eps)[0, 1], .5, places=1)
+        self.assertLess(abs(numpy.corrcoef(eps)[0, 2]), .05)
+
+    def test_epsilon_getter(self):
+        assets = numpy.zeros(4, [('ordinal', numpy.uint32),
+                                 ('taxonomy', numpy.uint32)])
+        assets['ordinal'] = [0, 1, 2, 3]
+        assets['taxonomy'] = [1, 1, 2, 2]
+        getter = riskinput.EpsilonGetter(42, .5, 100, by_taxonomy=True)
+        full = getter.get(assets)
+        self.assertEqual(full.shape, (4, 100))
+        # the epsilons for a subset of assets and events are the same
+        eids = numpy.array([3, 50, 99])
+        aaae(getter.get(assets[2:], eids), full[2:, eids])
+
+
 epsilons = scientific.make_epsilons(
     numpy.zeros((1, 3)), seed=3, correlation=0)[0]
 
@@ -705,3 +755,24 @@ class ClassicalDamageTestCase(unittest.TestCase):
             fragility_functions, hazard_imls, hazard_poes,
             investigation_time, risk_investigation_time)
         aaae(poos, [0.56652127, 0.12513401, 0.1709355, 0.06555033, 0.07185889])
+
+
+class LossCurvesMapsBuilderTestCase(unittest.TestCase):
+    def test_top_losses(self):
+        # the curves built from the largest losses, accumulated in chunks,
+        # are the same as the curves built from all the losses
+        loss_dt = numpy.dtype([('structural', numpy.float32)])
+        builder = scientific.LossCurvesMapsBuilder(
+            [], numpy.array([5, 10, 20, 50]), loss_dt, [1], {0: 1000},
+            eff_time=500, risk_investigation_time=50)
+        self.assertEqual(builder.num_top, 101)
+        losses = numpy.random.RandomState(42).lognormal(size=(1000, 3))
+        top = scientific.TopLosses(3, builder.num_top)
+        for chunk in numpy.split(losses.T, 4, axis=1):
+            top += builder.top_losses(chunk)
+        self.assertEqual(top.num_losses, 1000)
+        expected = numpy.array(
+            [scientific.losses_by_period(losses[:, i],
+                                         builder.return_periods, 1000, 500)
+             for i in range(3)])
+        aaae(builder.curves_from_top(top, 0), expected, decimal=5)
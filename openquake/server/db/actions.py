@@ -391,6 +391,21 @@ def log(db, job_id, timestamp, level, process, message):
        'VALUES (?X)', (job_id, timestamp, level, process, message))
 
 
+def log_records(db, records):
+    """
+    Write several log records in the database with a single command.
+
+    :param db:
+        a :class:`openquake.server.dbapi.Db` instance
+    :param records:
+        a list of tuples (job_id, timestamp, level, process, message)
+    """
+    with db:  # commit once at the end
+        db('BEGIN')
+        db.insert('log', 'job_id timestamp level process message'.split(),
+                  records)
+
+
 def get_log(db, job_id):
     """
     Extract the logs as a big string
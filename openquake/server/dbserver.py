@@ -40,12 +40,19 @@ db.cmd = lambda action, *args: getattr(actions, action)(db, *args)
 # NB: I am increasing the timeout from 5 to 20 seconds to see if the random
 # OperationalError: "database is locked" disappear in the WebUI tests
 
+# the task streamer and the zworkers are managed by the DbServer both with
+# OQ_DISTRIBUTE=zmq and with the persistent workers of the processpool
 ZMQ = os.environ.get(
-    'OQ_DISTRIBUTE', config.distribution.oq_distribute) == 'zmq'
+    'OQ_DISTRIBUTE', config.distribution.oq_distribute) == 'zmq' or \
+    w.persistent_workers()
 
 DBSERVER_PORT = int(os.environ.get('OQ_DBSERVER_PORT') or config.dbserver.port)
 
 
+def no_zworkers(cmd):
+    raise RuntimeError('%s: the DbServer is not managing any zworkers' % cmd)
+
+
 class DbServer(object):
     """
     A server collecting the received commands into a queue
@@ -58,7 +65,8 @@ class DbServer(object):
         self.num_workers = num_workers
         self.pid = os.getpid()
         if ZMQ:
-            self.zmaster = w.WorkerMaster(address[0], **config.zworkers)
+            self.zmaster = w.WorkerMaster(
+                **w.get_zworkers(master_host=address[0]))
         else:
             self.zmaster = None
 
@@ -71,10 +79,13 @@ class DbServer(object):
                     sock.send(self.pid)
                     continue
                 elif cmd.startswith('zmq_') and self.zmaster:
-                    msg = getattr(self.zmaster, cmd[4:])()
+                    msg = getattr(self.zmaster, cmd[4:])(*args)
                     logging.info(msg)
                     sock.send(msg)
                     continue
+                elif cmd.startswith('zmq_'):
+                    sock.send(safely_call(no_zworkers, (cmd,)))
+                    continue
                 try:
                     func = getattr(actions, cmd)
                 except AttributeError:  # SQL string
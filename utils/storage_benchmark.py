@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2019 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare the write/read throughput and the file size of representative
+datasets (gmf_data, poes, losses_by_event) for the storage policies
+supported by the [storage] section of openquake.cfg.
+"""
+import os
+import time
+import numpy
+from openquake.baselib import sap, hdf5, config
+from openquake.calculators.views import rst_table
+
+U16 = numpy.uint16
+U32 = numpy.uint32
+F32 = numpy.float32
+F64 = numpy.float64
+BLOCKSIZE = 100000  # number of rows written/read at once
+
+
+def gmf_data(num_rows, M=3):
+    """Extendable dataset of ground motion values, sorted by site"""
+    dt = numpy.dtype([('sid', U32), ('eid', U32), ('gmv', (F32, (M,)))])
+    arr = numpy.zeros(num_rows, dt)
+    arr['sid'] = numpy.arange(num_rows) // 1000
+    arr['eid'] = numpy.random.randint(0, 100000, num_rows)
+    arr['gmv'] = numpy.random.lognormal(-3, 1, (num_rows, M))
+    return arr
+
+
+def poes(num_rows, L=200, G=4):
+    """Fixed-shape array of hazard curves, with many zeros"""
+    imls = numpy.linspace(0, 10, L)
+    rate = numpy.random.exponential(1, (num_rows, 1, G))
+    arr = 1. - numpy.exp(-rate * numpy.exp(-imls)[None, :, None] * 10)
+    arr[arr < 1E-6] = 0
+    return arr.round(4)
+
+
+def losses_by_event(num_rows, L=2):
+    """Extendable dataset of event losses, sorted by event"""
+    dt = numpy.dtype([('event_id', U32), ('rlzi', U16), ('loss', (F32, L))])
+    arr = numpy.zeros(num_rows, dt)
+    arr['event_id'] = numpy.arange(num_rows)
+    arr['rlzi'] = numpy.random.randint(0, 10, num_rows)
+    arr['loss'] = numpy.random.lognormal(8, 2, (num_rows, L)).round()
+    return arr
+
+
+def bench(fname, name, arr, compression):
+    """
+    :returns: (size in MB, write MB/s, read MB/s)
+    """
+    mb = arr.nbytes / 1024 ** 2
+    t0 = time.time()
+    with hdf5.File(fname, 'w') as f:
+        if arr.dtype.names:  # written in blocks, like the calculators
+            dset = hdf5.create(f, name, arr.dtype, (None,), compression)
+            for start in range(0, len(arr), BLOCKSIZE):
+                hdf5.extend(dset, arr[start:start + BLOCKSIZE])
+        else:  # written at once, like the probability maps
+            dset = hdf5.create(f, name, arr.dtype, arr.shape, compression)
+            dset[:] = arr
+    dt_write = time.time() - t0
+    size = os.path.getsize(fname) / 1024 ** 2
+    t0 = time.time()
+    with hdf5.File(fname, 'r') as f:
+        dset = f[name]
+        for start in range(0, len(dset), BLOCKSIZE):
+            dset[start:start + BLOCKSIZE]
+    dt_read = time.time() - t0
+    return size, mb / dt_write, mb / dt_read
+
+
+@sap.script
+def storage_benchmark(num_rows, compressions='none lzf gzip blosc',
+                      chunk_size=None, tmpdir='/tmp'):
+    """
+    Benchmark the storage policies on synthetic datasets
+    """
+    if chunk_size:
+        config.storage['chunk_size'] = chunk_size
+    fname = os.path.join(tmpdir, 'storage_benchmark.hdf5')
+    datasets = [('gmf_data', gmf_data(num_rows)),
+                ('poes', poes(num_rows // 10)),
+                ('losses_by_event', losses_by_event(num_rows))]
+    rows = []
+    for compression in compressions.split():
+        if compression == 'blosc' and hdf5.hdf5plugin is None:
+            print('Skipping blosc since hdf5plugin is not installed')
+            continue
+        for name, arr in datasets:
+            size, write, read = bench(fname, name, arr, compression)
+            rows.append((name, compression, arr.nbytes / 1024 ** 2, size,
+                         write, read))
+    os.remove(fname)
+    print(rst_table(rows, ['dataset', 'compression', 'data MB', 'file MB',
+                           'write MB/s', 'read MB/s']))
+
+
+storage_benchmark.arg('num_rows', 'number of rows of the datasets', type=int)
+storage_benchmark.opt('compressions', 'space-separated compressions to test')
+storage_benchmark.opt('chunk_size', 'chunk size in bytes', type=int)
+storage_benchmark.opt('tmpdir', 'directory where to write the test file')
+
+
+if __name__ == '__main__':
+    storage_benchmark.callfunc()